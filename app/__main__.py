@@ -1,15 +1,32 @@
+import gc
+import io
+import os
 import cv2
-import keras
 import base64
+import zipfile
+import threading
+import numpy as np
 from pathlib import Path
 from flask import Flask
+from flask import Response
 from flask import request
 from flask import redirect
 from flask import url_for
 from flask import render_template
 from flask import flash
+from flask import jsonify
+from flask import stream_with_context
 from werkzeug.utils import secure_filename
-from fruit_classifier.predict.__main__ import main
+from app.prefork import PreforkServer
+from fruit_classifier.predict.batch_predictor import BatchPredictor
+from fruit_classifier.predict.model_registry import ModelRegistry
+from fruit_classifier.predict.predict_utils import draw_class_on_image
+from fruit_classifier.predict.predict_utils import format_predictions
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    resize_image
+from fruit_classifier.utils.image_utils import decode_image
+from fruit_classifier.utils.image_utils import open_image
+from fruit_classifier.utils.profiling_utils import profiler
 
 
 app = Flask(__name__)
@@ -18,6 +35,7 @@ app = Flask(__name__)
 ROOT_DIR = Path(__file__).absolute().parents[1]
 UPLOAD_DIR = ROOT_DIR.joinpath('upload_dir')
 MODEL_FILES_DIR = ROOT_DIR.joinpath('model_files')
+MODEL_NAME = 'basic'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 if not UPLOAD_DIR.is_dir():
@@ -26,6 +44,34 @@ if not UPLOAD_DIR.is_dir():
 
 
 app.config['UPLOAD_DIR'] = str(UPLOAD_DIR)
+# Requests larger than MAX_CONTENT_LENGTH bytes are rejected with 413,
+# and the images unpacked from uploaded zip files larger than
+# MAX_IMAGE_SIZE bytes are skipped, so that a zip bomb can not exhaust
+# the memory of the app
+app.config['MAX_CONTENT_LENGTH'] = \
+    int(os.environ.get('FRUIT_MAX_CONTENT_LENGTH', 64 * 1024 ** 2))
+app.config['MAX_IMAGE_SIZE'] = \
+    int(os.environ.get('FRUIT_MAX_IMAGE_SIZE', 16 * 1024 ** 2))
+# Concurrent requests are collected in batches of at most
+# MAX_BATCH_SIZE images, waiting at most MAX_BATCH_WAIT seconds
+app.config['MAX_BATCH_SIZE'] = \
+    int(os.environ.get('FRUIT_MAX_BATCH_SIZE', 32))
+app.config['MAX_BATCH_WAIT'] = \
+    float(os.environ.get('FRUIT_MAX_BATCH_WAIT', 0.005))
+
+# The models are loaded on first use and kept in memory between the
+# requests
+# Setting FRUIT_BACKEND=tflite runs the model exported to TensorFlow
+# Lite, which starts faster and uses less memory
+# FRUIT_NUM_THREADS sets the number of threads of the TensorFlow Lite
+# interpreter
+registry = ModelRegistry(MODEL_FILES_DIR,
+                         backend=os.environ.get('FRUIT_BACKEND', 'keras'),
+                         num_threads=(int(os.environ['FRUIT_NUM_THREADS'])
+                                      if 'FRUIT_NUM_THREADS' in os.environ
+                                      else None))
+predictor = None
+predictor_lock = threading.Lock()
 
 # http://flask.pocoo.org/docs/latest/quickstart/#sessions
 # Secret needed for flash()
@@ -55,6 +101,28 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1] in ALLOWED_EXTENSIONS
 
 
+def get_predictor():
+    """
+    Returns the batch predictor, and creates it on first use
+
+    Returns
+    -------
+    BatchPredictor
+        The predictor which batches the concurrent requests
+    """
+    global predictor
+
+    with predictor_lock:
+        if predictor is None:
+            predictor = \
+                BatchPredictor(registry,
+                               MODEL_NAME,
+                               max_batch_size=app.config['MAX_BATCH_SIZE'],
+                               max_wait=app.config['MAX_BATCH_WAIT'])
+
+    return predictor
+
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     """
@@ -155,9 +223,18 @@ def classify_file(filename):
     """
     path = Path(app.config['UPLOAD_DIR']).joinpath(filename)
 
-    # Clear any existing keras sessions and predict
-    keras.backend.clear_session()
-    output = main(path, MODEL_FILES_DIR, model_name='basic')
+    with profiler.stage('decode'):
+        image = open_image(path)
+    with profiler.stage('resize'):
+        resized_image = resize_image(image)
+    with profiler.stage('predict'):
+        prediction = get_predictor().predict(resized_image)
+
+    probability_text = \
+        '{}: {:.2f}%'.format(prediction['label'],
+                             prediction['probability'] * 100)
+    with profiler.stage('draw'):
+        output = draw_class_on_image(image, probability_text)
 
     # Store the output image after converting to GBR
     cv2.imwrite(str(path), output[..., ::-1])
@@ -167,10 +244,259 @@ def classify_file(filename):
     return render_template('prediction.html', result_b64=result_b64)
 
 
+@app.route('/api/predict', methods=['POST'])
+def api_predict():
+    """
+    Classifies an image and returns the result as json
+
+    The image is decoded in memory, and can either be sent as the
+    `file` part of a multipart form, or as the raw request body.
+    Example:
+    `curl -F "file=@banana.png" localhost:5000/api/predict`
+
+    Returns
+    -------
+    Response
+        Json containing `label`, `probability` and `probabilities`
+        (the probability of each label)
+        Json with an `error` and status 400 if no valid image is
+        given
+    """
+    if 'file' in request.files:
+        image_bytes = request.files['file'].read()
+    else:
+        image_bytes = request.get_data()
+
+    if len(image_bytes) == 0:
+        return jsonify(error='No image given'), 400
+
+    with profiler.stage('decode'):
+        image = decode_image(image_bytes)
+    if image is None:
+        return jsonify(error='Could not decode the image'), 400
+
+    with profiler.stage('resize'):
+        resized_image = resize_image(image)
+    # Includes the wait for the batch to be collected
+    with profiler.stage('predict'):
+        prediction = get_predictor().predict(resized_image)
+
+    return jsonify(prediction)
+
+
+def get_encoded_images(files):
+    """
+    Returns the encoded images of the uploaded files
+
+    Zip files are unpacked in memory one image at a time, and images
+    larger than MAX_IMAGE_SIZE bytes once unpacked are skipped
+
+    Parameters
+    ----------
+    files : list
+        List of tuples of (filename, file_bytes) of the uploaded files
+
+    Yields
+    ------
+    name : str
+        The name of the image
+    image_bytes : bytes
+        The encoded image
+    """
+    max_image_size = app.config['MAX_IMAGE_SIZE']
+    for filename, file_bytes in files:
+        if zipfile.is_zipfile(io.BytesIO(file_bytes)):
+            with zipfile.ZipFile(io.BytesIO(file_bytes)) as zip_file:
+                for info in zip_file.infolist():
+                    if info.is_dir():
+                        continue
+                    # NOTE: zipfile stops decompressing at file_size,
+                    #       so the size in the header can be trusted
+                    if info.file_size > max_image_size:
+                        app.logger.warning(f'{info.filename} is larger '
+                                           f'than {max_image_size} '
+                                           f'bytes, skipping')
+                        continue
+                    yield info.filename, zip_file.read(info)
+        else:
+            yield filename, file_bytes
+
+
+def predict_encoded_images(encoded_images):
+    """
+    Classifies the encoded images chunk by chunk
+
+    Each chunk is submitted to the batch predictor at once, so that it
+    is classified in as few forward passes as possible.
+    Images which can not be decoded are skipped.
+
+    Parameters
+    ----------
+    encoded_images : iterable
+        Iterable of tuples of (name, image_bytes)
+
+    Yields
+    ------
+    prediction : dict
+        The prediction with the name of the image stored under `image`
+    """
+    chunk_size = app.config['MAX_BATCH_SIZE']
+    chunk = list()
+    for name, image_bytes in encoded_images:
+        with profiler.stage('decode'):
+            image = decode_image(image_bytes)
+        if image is None:
+            app.logger.warning(f'Could not decode {name}, skipping')
+            continue
+
+        with profiler.stage('resize'):
+            resized_image = resize_image(image)
+        chunk.append((name, get_predictor().submit(resized_image)))
+        if len(chunk) == chunk_size:
+            for name_, future in chunk:
+                yield dict(image=name_, **future.result())
+            chunk = list()
+
+    for name_, future in chunk:
+        yield dict(image=name_, **future.result())
+
+
+@app.route('/api/predict_batch', methods=['POST'])
+def api_predict_batch():
+    """
+    Classifies several images and streams the result
+
+    The images are sent as one or more `files` parts of a multipart
+    form. Zip files containing images are unpacked in memory.
+    Requests larger than MAX_CONTENT_LENGTH are rejected with status
+    413, and unpacked images larger than MAX_IMAGE_SIZE are skipped.
+    Example:
+    `curl -F "files=@images.zip" localhost:5000/api/predict_batch?format=csv`
+
+    Returns
+    -------
+    Response
+        The predictions as json lines (default) or as csv if the query
+        parameter `format=csv` is given
+        Json with an `error` and status 400 if no files are given or if
+        the format is not valid
+    """
+    output_format = request.args.get('format', 'jsonl')
+    if output_format not in ('jsonl', 'csv'):
+        return jsonify(error=f'Not a valid format: {output_format}'), 400
+
+    # NOTE: The files are read before the response is streamed, as
+    #       the uploaded files are closed when the request ends
+    files = [(file.filename, file.read())
+             for file in request.files.getlist('files')]
+    if len(files) == 0:
+        return jsonify(error='No files part'), 400
+
+    predictions = predict_encoded_images(get_encoded_images(files))
+    lines = format_predictions(predictions, output_format)
+    mimetype = 'text/csv' if output_format == 'csv' \
+        else 'application/x-ndjson'
+
+    return Response(stream_with_context(lines), mimetype=mimetype)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Exposes the latencies of the prediction stages to Prometheus
+
+    The latencies are only recorded when the app is started with the
+    environment variable FRUIT_PROFILE=1
+    Every worker process records its own latencies, so the samples are
+    labelled with the pid of the `worker` which answered the scrape.
+    With FRUIT_WORKERS > 1 each scrape reaches one of the workers, and
+    the series of the workers are aggregated in Prometheus, for example
+    with `sum by (stage, le) (rate(..._bucket[5m]))`
+
+    Returns
+    -------
+    Response
+        The latency histograms and quantiles of each stage in the
+        Prometheus text format
+    """
+    labels = dict(worker=os.getpid())
+    return Response(profiler.to_prometheus(labels=labels),
+                    mimetype='text/plain; version=0.0.4')
+
+
+def warm_up_worker():
+    """
+    Builds the model of a forked worker before it serves any request
+
+    One image is classified, so that the model is loaded (and
+    TensorFlow is initialized) in the thread of the BatchPredictor.
+    A model which cannot be loaded fails the worker, so that the master
+    backs off and stops rather than serving errors
+    """
+    get_predictor().predict(resize_image(np.zeros((28, 28, 3))))
+
+
+def serve_prefork(n_workers=None, host='0.0.0.0', port=5000):
+    """
+    Serves the app from several forked worker processes
+
+    The model file and the label encoder are read once before forking,
+    and are shared by the workers through copy-on-write.
+    With the keras backend only these file bytes are shared: each
+    worker builds its own model, weights and TensorFlow runtime from
+    them after the fork, so every worker costs the memory of a full
+    TensorFlow process.
+    With the TensorFlow Lite backends the weights are read from the
+    shared bytes in place, so they are only held once in memory (unless
+    a delegate such as XNNPACK repacks them in each worker).
+
+    Parameters
+    ----------
+    n_workers : None or int
+        Number of worker processes
+        If None, the number of CPUs is used
+    host : str
+        The host to listen on
+    port : int
+        The port to listen on
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+
+    # Split the cores between the workers rather than letting each
+    # worker use all of them
+    # The environment variables are read by TensorFlow when it is
+    # imported in the workers
+    threads_per_worker = max(1, os.cpu_count() // n_workers)
+    for variable in ('OMP_NUM_THREADS',
+                     'TF_NUM_INTRAOP_THREADS',
+                     'TF_NUM_INTEROP_THREADS'):
+        os.environ.setdefault(variable, str(threads_per_worker))
+    if registry.num_threads is None:
+        registry.num_threads = threads_per_worker
+
+    registry.preload(MODEL_NAME)
+
+    # Keep the garbage collector of the workers from writing to (and
+    # thereby copying) the pages of the objects loaded by the master
+    # gc.freeze is only available from Python 3.7
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    server = PreforkServer(app,
+                           host=host,
+                           port=port,
+                           n_workers=n_workers,
+                           post_fork=warm_up_worker)
+    server.serve_forever()
+
+
 if __name__ == '__main__':
-    # NOTE: Threaded is set to False to have the loaded model on the
-    #       same thread
-    #       See
-    #       https://stackoverflow.com/questions/49400440/using-keras-model-in-flask-app-with-threading
-    #       for details
-    app.run(debug=False, host='0.0.0.0', port='5000', threaded=False)
+    # FRUIT_WORKERS > 1 serves the app from that many forked worker
+    # processes, and FRUIT_WORKERS=0 from one worker per CPU
+    n_workers_ = int(os.environ.get('FRUIT_WORKERS', 1))
+    if n_workers_ == 1:
+        # NOTE: The model is loaded and run in the thread of the
+        #       BatchPredictor, so the app can safely be threaded
+        app.run(debug=False, host='0.0.0.0', port='5000', threaded=True)
+    else:
+        serve_prefork(n_workers_ if n_workers_ > 1 else None)
@@ -0,0 +1,383 @@
+"""
+Contains the pre-forking server of the app
+"""
+
+import os
+import sys
+import time
+import socket
+import signal
+import threading
+from werkzeug.serving import make_server
+
+
+def get_listening_socket(host='0.0.0.0', port=5000, backlog=128):
+    """
+    Returns a socket listening on the given address
+
+    Parameters
+    ----------
+    host : str
+        The host to listen on
+    port : int
+        The port to listen on
+        If 0, a free port is chosen
+    backlog : int
+        Maximum number of connections waiting to be accepted
+
+    Returns
+    -------
+    sock : socket.socket
+        The listening socket
+    """
+
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    # The socket is inherited by the forked workers
+    sock.set_inheritable(True)
+    # All the workers are woken up by a new connection, but only one of
+    # them gets it, so the others must not block in accept
+    sock.setblocking(False)
+
+    return sock
+
+
+class PreforkServer(object):
+    """
+    Serves a WSGI app from several forked worker processes
+
+    The master process binds the socket and forks the workers, which
+    all accept connections on the same socket, so the kernel spreads
+    the connections over the workers.
+    Everything the master loads before calling `serve_forever` (such as
+    the bytes of a model preloaded in a `ModelRegistry`) is shared by
+    the workers through copy-on-write.
+    Workers which die are replaced, and SIGTERM or SIGINT shuts down
+    the workers and the master.
+    Workers stop by themselves if the master dies.
+    Workers which die before `post_fork` returned, or within
+    `min_uptime` seconds after it returned, are replaced with an
+    exponential backoff, and the master stops after `max_failures` such
+    failures in a row.
+
+    Notes
+    -----
+    TensorFlow must not be imported by the master, as its thread pools
+    and sessions do not survive a fork.
+    Each worker imports TensorFlow itself when it builds its model,
+    and thereby gets its own session.
+    Only available on platforms with `os.fork`.
+    """
+
+    def __init__(self,
+                 app,
+                 host='0.0.0.0',
+                 port=5000,
+                 n_workers=None,
+                 post_fork=None,
+                 threaded=True,
+                 min_uptime=5.0,
+                 max_failures=5,
+                 max_backoff=30.0):
+        """
+        Sets up the server
+
+        Parameters
+        ----------
+        app : callable
+            The WSGI app to serve
+        host : str
+            The host to listen on
+        port : int
+            The port to listen on
+            If 0, a free port is chosen
+        n_workers : None or int
+            Number of worker processes
+            If None, the number of CPUs is used
+        post_fork : None or callable
+            Called without arguments in each worker right after the
+            fork, for example to load the model of the worker
+            The worker only counts as started once it returns, however
+            long it takes
+        threaded : bool
+            Whether each worker handles the requests in threads
+        min_uptime : float
+            Workers which die within this number of seconds after
+            `post_fork` returned count as failed to start
+        max_failures : int
+            Number of workers in a row failing to start before the
+            master stops
+        max_backoff : float
+            Maximum number of seconds to wait before replacing a worker
+            which failed to start
+            The wait starts at one second and doubles with every
+            failure in a row
+        """
+
+        if not hasattr(os, 'fork'):
+            msg = 'Pre-forking is not available on this platform'
+            raise NotImplementedError(msg)
+
+        self.app = app
+        self.host = host
+        self.port = port
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.post_fork = post_fork
+        self.threaded = threaded
+        self.min_uptime = min_uptime
+        self.max_failures = max_failures
+        self.max_backoff = max_backoff
+
+        self.socket = None
+        self.pid = None
+        self.workers = dict()
+        # The read ends of the pipes of the workers still running
+        # post_fork, which write to them when done
+        self._starting = dict()
+        self._stopping = False
+        self._n_failures = 0
+        self._last_failure = -float('inf')
+        self._next_spawn = -float('inf')
+
+    def serve_forever(self, poll_interval=0.5):
+        """
+        Forks the workers and replaces them until shut down
+
+        Parameters
+        ----------
+        poll_interval : float
+            Number of seconds between checks for dead workers
+
+        Raises
+        ------
+        RuntimeError
+            If `max_failures` workers in a row failed to start
+        """
+
+        if 'tensorflow' in sys.modules:
+            print('[WARN] TensorFlow was imported before forking the '
+                  'workers, which may hang the workers')
+
+        self.pid = os.getpid()
+        self.socket = get_listening_socket(self.host, self.port)
+        self.port = self.socket.getsockname()[1]
+        print(f'[INFO] Serving on {self.host}:{self.port} with '
+              f'{self.n_workers} workers')
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        try:
+            while not self._stopping:
+                if self._n_failures >= self.max_failures:
+                    msg = f'{self._n_failures} workers in a row died ' \
+                          f'within {self.min_uptime} s of starting'
+                    raise RuntimeError(msg)
+                while len(self.workers) < self.n_workers and \
+                        time.monotonic() >= self._next_spawn and \
+                        not self._stopping:
+                    self._spawn_worker()
+                self._reap_workers()
+                time.sleep(poll_interval)
+        finally:
+            self._stop_workers()
+            self.socket.close()
+
+        print('[INFO] Server stopped')
+
+    def _handle_stop(self, signum, frame):
+        """
+        Marks the server for shut down
+
+        Parameters
+        ----------
+        signum : int
+            The received signal
+        frame : frame
+            The interrupted frame
+        """
+
+        self._stopping = True
+
+    def _spawn_worker(self):
+        """
+        Forks a worker
+        """
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid != 0:
+            os.close(write_fd)
+            os.set_blocking(read_fd, False)
+            self.workers[pid] = time.monotonic()
+            self._starting[pid] = read_fd
+            return
+
+        # In the worker
+        os.close(read_fd)
+        for fd in self._starting.values():
+            os.close(fd)
+        self._starting.clear()
+
+        exit_code = 0
+        try:
+            if self.post_fork is not None:
+                self.post_fork()
+            # Tell the master that the worker has started
+            os.write(write_fd, b'1')
+            os.close(write_fd)
+            self._run_worker()
+        except BaseException as e:
+            print(f'[WARN] Worker {os.getpid()} failed: {e}')
+            exit_code = 1
+        finally:
+            # Skip the clean up of the master (such as the finally
+            # clause of serve_forever)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _run_worker(self, poll_interval=0.1):
+        """
+        Serves the app in the worker until SIGTERM, SIGINT or until
+        the master dies
+
+        Parameters
+        ----------
+        poll_interval : float
+            Number of seconds between checks for the shut down
+        """
+
+        server = make_server(self.host,
+                             self.port,
+                             self.app,
+                             threaded=self.threaded,
+                             fd=self.socket.fileno())
+
+        # The signal handlers of the master are inherited, and mark the
+        # worker for shut down
+        # NOTE: The server runs in its own thread, as the signal
+        #       handlers run in the main thread, where they could
+        #       interrupt the server while it holds the locks needed
+        #       to shut it down
+        thread = threading.Thread(target=server.serve_forever,
+                                  name='PreforkWorker',
+                                  daemon=True)
+        thread.start()
+        while not self._stopping and thread.is_alive() and \
+                os.getppid() == self.pid:
+            time.sleep(poll_interval)
+
+        server.shutdown()
+        server.server_close()
+
+    def _reap_workers(self):
+        """
+        Removes the dead workers, so that they are replaced
+
+        Workers which died while starting or within `min_uptime`
+        seconds after they started delay the next fork, and a worker
+        forked after the last such failure which survives `min_uptime`
+        seconds after starting resets the count of failures.
+        The uptime of a worker is counted from the end of its
+        `post_fork`
+        """
+
+        now = time.monotonic()
+        for pid in list(self.workers):
+            is_starting = pid in self._starting and \
+                not self._check_started(pid, now)
+
+            pid_, status = os.waitpid(pid, os.WNOHANG)
+            if pid_ == 0:
+                if not is_starting and \
+                        now - self.workers[pid] >= self.min_uptime and \
+                        self.workers[pid] > self._last_failure:
+                    self._n_failures = 0
+                continue
+
+            started = self.workers.pop(pid)
+            if is_starting:
+                os.close(self._starting.pop(pid))
+            if self._stopping:
+                continue
+
+            uptime = now - started
+            if is_starting or uptime < self.min_uptime:
+                self._n_failures += 1
+                self._last_failure = now
+                backoff = min(2.0 ** (self._n_failures - 1),
+                              self.max_backoff)
+                self._next_spawn = now + backoff
+                print(f'[WARN] Worker {pid} exited with status {status} '
+                      f'after {uptime:.1f} s, replacing it in '
+                      f'{backoff:.0f} s')
+            else:
+                print(f'[WARN] Worker {pid} exited with status {status} '
+                      f'after {uptime:.1f} s, replacing it')
+
+    def _check_started(self, pid, now):
+        """
+        Checks whether a starting worker has finished its post_fork
+
+        If so, the uptime of the worker is counted from now
+
+        Parameters
+        ----------
+        pid : int
+            The pid of the starting worker
+        now : float
+            The current time of time.monotonic
+
+        Returns
+        -------
+        is_started : bool
+            Whether the worker has started
+        """
+
+        try:
+            is_started = os.read(self._starting[pid], 1) == b'1'
+        except BlockingIOError:
+            is_started = False
+
+        if is_started:
+            os.close(self._starting.pop(pid))
+            self.workers[pid] = now
+
+        return is_started
+
+    def _stop_workers(self, timeout=10.0):
+        """
+        Stops the workers
+
+        The workers get `timeout` seconds to finish the current
+        requests before they are killed
+
+        Parameters
+        ----------
+        timeout : float
+            Number of seconds to wait for the workers to stop
+        """
+
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        while len(self.workers) > 0 and time.monotonic() < deadline:
+            self._reap_workers()
+            time.sleep(0.05)
+
+        for pid in self.workers:
+            print(f'[WARN] Killing worker {pid}')
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.clear()
+        for fd in self._starting.values():
+            os.close(fd)
+        self._starting.clear()
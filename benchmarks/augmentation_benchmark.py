@@ -0,0 +1,189 @@
+import argparse
+import time
+import numpy as np
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    get_batch_augmenter
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    get_image_generator
+
+
+def augment_with_image_generator(image_generator, x_batch):
+    """
+    Augments a batch one image at the time as done by the generator
+
+    Parameters
+    ----------
+    image_generator : ImageDataGenerator
+        The image generator to augment with
+    x_batch : np.array, shape (batch_size, height, width, channels)
+        The images to augment
+
+    Returns
+    -------
+    x_batch : np.array, shape (batch_size, height, width, channels)
+        The augmented images
+    """
+
+    x_batch = x_batch.copy()
+    for i in range(len(x_batch)):
+        x_batch[i] = image_generator.random_transform(x_batch[i])
+
+    return x_batch
+
+
+def time_augmentation(augment, images, batch_size=32, repeats=3):
+    """
+    Times the augmentation of all the images
+
+    Parameters
+    ----------
+    augment : callable
+        Function taking a batch and returning the augmented batch
+    images : np.array, shape (n_images, height, width, channels)
+        The images to augment
+    batch_size : int
+        Number of images per batch
+    repeats : int
+        Number of times to repeat the timing
+        The fastest repeat is reported
+
+    Returns
+    -------
+    images_per_second : float
+        Number of augmented images per second
+    augmented : np.array, shape (n_images, height, width, channels)
+        The augmented images of the last repeat
+    """
+
+    best = np.inf
+    augmented = None
+    for _ in range(repeats):
+        batches = list()
+        start = time.perf_counter()
+        for i in range(0, len(images), batch_size):
+            batches.append(augment(images[i:i + batch_size]))
+        best = min(best, time.perf_counter() - start)
+        augmented = np.concatenate(batches)
+
+    images_per_second = len(images) / best
+
+    return images_per_second, augmented
+
+
+def main(n_images=2048,
+         height=28,
+         width=28,
+         batch_size=32,
+         repeats=3,
+         seed=42):
+    """
+    Compares the throughput of the batch augmenter and image generator
+
+    The images are smooth random images, so that the statistics of the
+    augmented images can be compared as well
+
+    Parameters
+    ----------
+    n_images : int
+        Number of images to augment
+    height : int
+        Height of the images
+    width : int
+        Width of the images
+    batch_size : int
+        Number of images per batch
+    repeats : int
+        Number of times to repeat the timing
+    seed : int
+        Seed of the images and the augmentation
+
+    Returns
+    -------
+    results : dict
+        Dictionary with the images per second of the
+        `image_generator` and the `batch_augmenter`, and the
+        `speedup`
+    """
+
+    random_state = np.random.RandomState(seed)
+    rows = np.linspace(0, 1, height).reshape(1, -1, 1, 1)
+    cols = np.linspace(0, 1, width).reshape(1, 1, -1, 1)
+    images = random_state.rand(n_images, 1, 1, 3) * rows * cols
+    images = images.astype('float32')
+
+    image_generator = get_image_generator()
+    batch_augmenter = get_batch_augmenter()
+
+    np.random.seed(seed)
+    generator_speed, generator_augmented = \
+        time_augmentation(
+            lambda x: augment_with_image_generator(image_generator, x),
+            images,
+            batch_size,
+            repeats)
+    augmenter_random_state = np.random.RandomState(seed)
+    augmenter_speed, augmenter_augmented = \
+        time_augmentation(
+            lambda x: batch_augmenter.augment(x, augmenter_random_state),
+            images,
+            batch_size,
+            repeats)
+
+    results = dict(image_generator=generator_speed,
+                   batch_augmenter=augmenter_speed,
+                   speedup=augmenter_speed / generator_speed)
+
+    print(f'[INFO] Augmented {n_images} images of shape '
+          f'({height}, {width}, 3) in batches of {batch_size}')
+    for name, speed, augmented in \
+            (('ImageDataGenerator', generator_speed, generator_augmented),
+             ('BatchAugmenter', augmenter_speed, augmenter_augmented)):
+        print(f'[INFO] {name:<18}: {speed:10.0f} images/s, '
+              f'mean {augmented.mean():.4f}, std {augmented.std():.4f}')
+    print(f'[INFO] Speedup: {results["speedup"]:.1f}x')
+
+    return results
+
+
+if __name__ == '__main__':
+    # Construct the argument parse and parse the arguments
+    parser = argparse.ArgumentParser(
+        description='Benchmark the augmentation throughput')
+    parser.add_argument('-n',
+                        '--n_images',
+                        required=False,
+                        default=2048,
+                        type=int,
+                        help='Number of images to augment')
+    parser.add_argument('-e',
+                        '--height',
+                        required=False,
+                        default=28,
+                        type=int,
+                        help='Height of the images')
+    parser.add_argument('-w',
+                        '--width',
+                        required=False,
+                        default=28,
+                        type=int,
+                        help='Width of the images')
+    parser.add_argument('-b',
+                        '--batch_size',
+                        required=False,
+                        default=32,
+                        type=int,
+                        help='Number of images per batch')
+    parser.add_argument('-r',
+                        '--repeats',
+                        required=False,
+                        default=3,
+                        type=int,
+                        help='Number of times to repeat the timing')
+
+    args = parser.parse_args()
+
+    main(args.n_images,
+         args.height,
+         args.width,
+         args.batch_size,
+         args.repeats)
@@ -0,0 +1,176 @@
+"""
+Benchmarks the import time of the entry points
+
+Every entry point is imported in a fresh interpreter, so the modules
+already imported by the benchmark do not hide the cost of the import.
+The time of the interpreter start up is not included.
+
+Besides the time, the benchmark reports which of the slow to import
+third party packages (`HEAVY_MODULES`) were loaded by the import.
+The entry points which do not need these packages to start
+(`LAZY_ENTRY_POINTS`) should load none of them, as they are imported
+by the functions using them.
+
+For a detailed breakdown of a single import, use
+python -X importtime -c "import <module>"
+"""
+
+import sys
+import json
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+HEAVY_MODULES = ('tensorflow',
+                 'keras',
+                 'matplotlib',
+                 'sklearn',
+                 'skimage.io')
+
+# The entry points starting without any of HEAVY_MODULES
+LAZY_ENTRY_POINTS = ('fruit_classifier.preprocessing.__main__',
+                     'fruit_classifier.predict.__main__',
+                     'fruit_classifier.predict.model_registry',
+                     'fruit_classifier.predict.batch_predictor',
+                     'app.__main__')
+
+ENTRY_POINTS = (*LAZY_ENTRY_POINTS,
+                'fruit_classifier.quantize.__main__',
+                'fruit_classifier.train.__main__')
+
+IMPORT_CODE = """
+import sys
+import json
+import time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy_modules = [name for name in {heavy_modules!r} if name in sys.modules]
+print(json.dumps(dict(seconds=seconds, heavy_modules=heavy_modules)))
+"""
+
+
+def time_import(module, root_dir=None):
+    """
+    Times the import of a module in a fresh interpreter
+
+    Parameters
+    ----------
+    module : str
+        The name of the module to import
+    root_dir : None or Path
+        The directory to import from
+        If None, the root of the repository is used
+
+    Returns
+    -------
+    result : dict
+        The `seconds` spent importing the module and the
+        `heavy_modules` loaded by the import
+    """
+
+    if root_dir is None:
+        root_dir = Path(__file__).absolute().parents[1]
+
+    code = IMPORT_CODE.format(module=module, heavy_modules=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code],
+                            cwd=str(root_dir),
+                            stdout=subprocess.PIPE,
+                            check=True,
+                            universal_newlines=True).stdout
+
+    # The json is the last line, anything printed by the import comes
+    # before
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(output_path=None, repeats=3, modules=ENTRY_POINTS):
+    """
+    Times the imports of the entry points
+
+    Parameters
+    ----------
+    output_path : None or Path
+        Where to store the results
+        If None, the results are stored in
+        reports/benchmarks/import_time_<timestamp>.json
+    repeats : int
+        Number of imports of each module
+        The fastest import is reported
+    modules : tuple
+        The modules to import
+
+    Returns
+    -------
+    report : dict
+        The `results` of the modules and the `environment` of the run
+    """
+
+    root_dir = Path(__file__).absolute().parents[1]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if output_path is None:
+        output_path = root_dir.joinpath('reports',
+                                        'benchmarks',
+                                        f'import_time_{timestamp}.json')
+
+    results = dict()
+    for module in modules:
+        runs = [time_import(module, root_dir) for _ in range(repeats)]
+        results[module] = min(runs, key=lambda run: run['seconds'])
+
+    report = dict(results=results,
+                  environment=dict(timestamp=timestamp,
+                                   python=platform.python_version(),
+                                   platform=platform.platform(),
+                                   repeats=repeats))
+
+    print(f'[INFO] {"Module":<42}{"Seconds":>8}  Heavy modules')
+    for module, result in results.items():
+        heavy_modules = ', '.join(result['heavy_modules']) or '-'
+        print(f'[INFO] {module:<42}{result["seconds"]:>8.3f}  '
+              f'{heavy_modules}')
+
+    for module in LAZY_ENTRY_POINTS:
+        if module in results and results[module]['heavy_modules']:
+            print(f'[WARN] {module} should start without '
+                  f'{", ".join(results[module]["heavy_modules"])}')
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w') as f:
+        json.dump(report, f, indent=2)
+    print(f'[INFO] Saved to {output_path}')
+
+    return report
+
+
+if __name__ == '__main__':
+    # Construct the argument parse and parse the arguments
+    parser = argparse.ArgumentParser(
+        description='Benchmark the import time of the entry points')
+    parser.add_argument('-o',
+                        '--output_path',
+                        required=False,
+                        default=None,
+                        help='Where to store the results. Defaults to '
+                             'reports/benchmarks/import_time_<time>.json')
+    parser.add_argument('-r',
+                        '--repeats',
+                        required=False,
+                        default=3,
+                        type=int,
+                        help='Number of imports of each module')
+    parser.add_argument('-m',
+                        '--modules',
+                        required=False,
+                        default=ENTRY_POINTS,
+                        nargs='+',
+                        help='The modules to import. Defaults to the '
+                             'entry points')
+
+    args = parser.parse_args()
+
+    main(None if args.output_path is None else Path(args.output_path),
+         args.repeats,
+         tuple(args.modules))
@@ -0,0 +1,297 @@
+"""
+Load tests a running app
+
+Start the app first, for example with
+FRUIT_WORKERS=0 FRUIT_BACKEND=tflite python -m app
+
+The load test sends the same image to /api/predict from `concurrency`
+client threads for `duration` seconds, and reports the throughput,
+the latency quantiles and the number of failed requests.
+Comparing the report of the single process app (FRUIT_WORKERS=1) to
+the pre-forked app shows how the serving scales with the cores.
+"""
+
+import json
+import time
+import argparse
+import platform
+import threading
+import urllib.error
+import urllib.request
+import cv2
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def get_test_image(height=128, width=128, seed=42):
+    """
+    Returns an encoded synthetic image
+
+    Parameters
+    ----------
+    height : int
+        Height of the image
+    width : int
+        Width of the image
+    seed : int
+        Seed of the random image
+
+    Returns
+    -------
+    image_bytes : bytes
+        The image encoded as png
+    """
+
+    random_state = np.random.RandomState(seed)
+    image = random_state.randint(0, 256, (height, width, 3), dtype='uint8')
+    _, encoded = cv2.imencode('.png', image)
+
+    return encoded.tobytes()
+
+
+def send_request(url, image_bytes, timeout=30.0):
+    """
+    Posts an image to the app
+
+    Parameters
+    ----------
+    url : str
+        The url of the prediction endpoint
+    image_bytes : bytes
+        The encoded image
+    timeout : float
+        Number of seconds to wait for the response
+
+    Returns
+    -------
+    ok : bool
+        Whether the request succeeded
+    """
+
+    request = urllib.request.Request(
+        url,
+        data=image_bytes,
+        headers={'Content-Type': 'application/octet-stream'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def get_summary(latencies, n_errors, seconds):
+    """
+    Returns the summary of a load test
+
+    Parameters
+    ----------
+    latencies : list
+        The latencies of the successful requests in seconds
+    n_errors : int
+        Number of failed requests
+    seconds : float
+        The duration of the load test
+
+    Returns
+    -------
+    summary : dict
+        The number of `requests`, the number of `errors`, the
+        `requests_per_sec` of the successful requests, and the
+        latency quantiles `p50_ms`, `p95_ms`, `p99_ms` and `max_ms`
+        The latencies are None if no request succeeded
+    """
+
+    summary = dict(requests=len(latencies) + n_errors,
+                   errors=n_errors,
+                   requests_per_sec=len(latencies) / seconds
+                   if seconds > 0 else None)
+
+    for quantile in QUANTILES:
+        summary[f'p{int(quantile * 100)}_ms'] = \
+            1e3 * float(np.quantile(latencies, quantile)) \
+            if len(latencies) > 0 else None
+    summary['max_ms'] = 1e3 * max(latencies) if len(latencies) > 0 \
+        else None
+
+    return summary
+
+
+def run_load_test(url, image_bytes, concurrency=8, duration=10.0):
+    """
+    Sends requests from several threads until the duration has passed
+
+    Parameters
+    ----------
+    url : str
+        The url of the prediction endpoint
+    image_bytes : bytes
+        The encoded image to send
+    concurrency : int
+        Number of client threads, each with one request in flight
+    duration : float
+        Number of seconds to send requests for
+
+    Returns
+    -------
+    summary : dict
+        The summary of the load test (see `get_summary`)
+    """
+
+    latencies = list()
+    errors = list()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def send_requests():
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            ok = send_request(url, image_bytes)
+            latency = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(latency)
+                else:
+                    errors.append(latency)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=send_requests)
+               for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    return get_summary(latencies, len(errors), seconds)
+
+
+def main(url='http://localhost:5000/api/predict',
+         image_path=None,
+         concurrency=8,
+         duration=10.0,
+         warm_up=2.0,
+         output_path=None):
+    """
+    Load tests the app and stores the report
+
+    Parameters
+    ----------
+    url : str
+        The url of the prediction endpoint
+    image_path : None or Path
+        The image to send
+        If None, a synthetic image is sent
+    concurrency : int
+        Number of client threads
+    duration : float
+        Number of seconds to send requests for
+    warm_up : float
+        Number of seconds to send requests for before the measurement,
+        so that all the workers have loaded their models
+    output_path : None or Path
+        Where to store the report
+        If None, the report is stored in
+        reports/benchmarks/load_test_<timestamp>.json
+
+    Returns
+    -------
+    report : dict
+        The `summary` of the load test and the `environment` of the run
+    """
+
+    root_dir = Path(__file__).absolute().parents[1]
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if output_path is None:
+        output_path = root_dir.joinpath('reports',
+                                        'benchmarks',
+                                        f'load_test_{timestamp}.json')
+
+    image_bytes = get_test_image() if image_path is None \
+        else image_path.read_bytes()
+
+    if warm_up > 0:
+        print(f'[INFO] Warming up for {warm_up} s...')
+        run_load_test(url, image_bytes, concurrency, warm_up)
+
+    print(f'[INFO] Sending requests from {concurrency} threads for '
+          f'{duration} s...')
+    summary = run_load_test(url, image_bytes, concurrency, duration)
+
+    report = dict(summary=summary,
+                  environment=dict(timestamp=timestamp,
+                                   url=url,
+                                   python=platform.python_version(),
+                                   platform=platform.platform(),
+                                   concurrency=concurrency,
+                                   duration=duration))
+
+    if summary['requests_per_sec'] is not None and \
+            summary['p50_ms'] is not None:
+        print(f'[INFO] {summary["requests_per_sec"]:.1f} requests/s, '
+              f'latency p50 {summary["p50_ms"]:.1f} ms, '
+              f'p95 {summary["p95_ms"]:.1f} ms, '
+              f'p99 {summary["p99_ms"]:.1f} ms')
+    if summary['errors'] > 0:
+        print(f'[WARN] {summary["errors"]} of {summary["requests"]} '
+              f'requests failed')
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w') as f:
+        json.dump(report, f, indent=2)
+    print(f'[INFO] Saved to {output_path}')
+
+    return report
+
+
+if __name__ == '__main__':
+    # Construct the argument parse and parse the arguments
+    parser = argparse.ArgumentParser(description='Load test the app')
+    parser.add_argument('-u',
+                        '--url',
+                        required=False,
+                        default='http://localhost:5000/api/predict',
+                        help='The url of the prediction endpoint')
+    parser.add_argument('-i',
+                        '--image',
+                        required=False,
+                        default=None,
+                        help='The image to send. Defaults to a synthetic '
+                             'image')
+    parser.add_argument('-c',
+                        '--concurrency',
+                        required=False,
+                        default=8,
+                        type=int,
+                        help='Number of client threads')
+    parser.add_argument('-d',
+                        '--duration',
+                        required=False,
+                        default=10.0,
+                        type=float,
+                        help='Number of seconds to send requests for')
+    parser.add_argument('-w',
+                        '--warm_up',
+                        required=False,
+                        default=2.0,
+                        type=float,
+                        help='Number of seconds to send requests for '
+                             'before the measurement')
+    parser.add_argument('-o',
+                        '--output_path',
+                        required=False,
+                        default=None,
+                        help='Where to store the report. Defaults to '
+                             'reports/benchmarks/load_test_<time>.json')
+
+    args = parser.parse_args()
+
+    main(args.url,
+         None if args.image is None else Path(args.image),
+         args.concurrency,
+         args.duration,
+         args.warm_up,
+         None if args.output_path is None else Path(args.output_path))
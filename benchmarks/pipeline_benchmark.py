@@ -0,0 +1,589 @@
+"""
+Benchmarks the stages of the pipeline end to end
+
+The benchmark generates synthetic fruit-like images (coloured ellipses
+on a noisy background, one colour per class) in a temporary
+directory, and times
+
+- copy_valid_images: Copying the raw images and removing the
+  unreadable ones
+- resize_images: Resizing the cleaned images in place
+- get_data_and_labels: Loading the resized images into an array
+- store_data_sets: Storing the split data sets
+- load_data_sets: Memory mapping the data sets and reading them
+- train_epoch: Training one epoch with train_model (including saving
+  the model)
+- predict_cold: predict.__main__.main on a single image, loading the
+  model from disk
+- predict_warm: predict.__main__.main on a single image, with the
+  model in a ModelRegistry
+- predict_cold_tflite: predict_cold with the TensorFlow Lite backend
+- classify_many: Classifying the test set in one batch
+- classify_many_tflite: classify_many with the TensorFlow Lite
+  backend
+
+The tflite stages are skipped if the model could not be exported to
+TensorFlow Lite.
+
+Every stage reports the fastest of `repeats` runs, which is the least
+noisy estimate of the cost of the stage.
+The results are stored as json, and can be compared to a baseline
+stored by an earlier run, in which case the exit code is 1 if any
+stage is more than `tolerance` slower than its baseline
+"""
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import cv2
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from fruit_classifier.predict.__main__ import main as predict_main
+from fruit_classifier.predict.model_registry import ModelRegistry
+from fruit_classifier.predict.predict_utils import classify_many
+from fruit_classifier.predict.predict_utils import get_model_path
+from fruit_classifier.predict.predict_utils import load_classifier
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    copy_valid_images
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    get_batch_augmenter
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    resize_images
+from fruit_classifier.train.export_utils import export_tflite
+from fruit_classifier.train.train_utils import encode_labels
+from fruit_classifier.train.train_utils import get_data_and_labels
+from fruit_classifier.train.train_utils import get_data_split
+from fruit_classifier.train.train_utils import get_model
+from fruit_classifier.train.train_utils import load_data_sets
+from fruit_classifier.train.train_utils import store_data_sets
+from fruit_classifier.train.train_utils import train_model
+from fruit_classifier.utils.image_utils import get_image_paths
+
+# The hues of the synthetic classes (in the OpenCV range [0, 180))
+CLASSES = dict(apples=0, bananas=25, limes=50, blueberries=115)
+
+
+def make_synthetic_images(raw_dir,
+                          n_images_per_class=64,
+                          height=128,
+                          width=128,
+                          seed=42):
+    """
+    Writes synthetic fruit-like images to raw_dir/<class>/
+
+    Each class has its own hue, and the images are jpg files of
+    ellipses with random position, size, orientation and shade on a
+    noisy background.
+    One unreadable file is added to each class, which is removed by
+    copy_valid_images
+
+    Parameters
+    ----------
+    raw_dir : Path
+        Directory of the images
+    n_images_per_class : int
+        Number of images of each class
+    height : int
+        Height of the images
+    width : int
+        Width of the images
+    seed : int
+        Seed of the images
+    """
+
+    random_state = np.random.RandomState(seed)
+
+    for class_name, hue in CLASSES.items():
+        class_dir = raw_dir.joinpath(class_name)
+        class_dir.mkdir(parents=True, exist_ok=True)
+
+        for i in range(n_images_per_class):
+            image = random_state.randint(0, 64, (height, width, 3))
+            image = image.astype('uint8')
+
+            center = (int(width * random_state.uniform(0.3, 0.7)),
+                      int(height * random_state.uniform(0.3, 0.7)))
+            axes = (int(width * random_state.uniform(0.15, 0.35)),
+                    int(height * random_state.uniform(0.15, 0.35)))
+            angle = random_state.uniform(0, 180)
+            hsv = np.uint8([[[hue,
+                              random_state.randint(150, 256),
+                              random_state.randint(150, 256)]]])
+            color = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0]
+            cv2.ellipse(image,
+                        center,
+                        axes,
+                        angle,
+                        0,
+                        360,
+                        tuple(int(c) for c in color),
+                        -1)
+            cv2.imwrite(str(class_dir.joinpath(f'{class_name}_{i:04d}.jpg')),
+                        image)
+
+        class_dir.joinpath(f'{class_name}_unreadable.jpg').write_bytes(
+            b'not an image')
+
+
+def time_stage(stage, repeats=3, setup=None):
+    """
+    Times a stage of the pipeline
+
+    Parameters
+    ----------
+    stage : callable
+        The stage to time
+        Called with the output of setup if given, else without
+        arguments
+    repeats : int
+        Number of times to run the stage
+    setup : None or callable
+        Function run (untimed) before each run of the stage
+
+    Returns
+    -------
+    seconds : float
+        The time of the fastest run
+    output : object
+        The output of the last run of the stage
+    """
+
+    best = np.inf
+    output = None
+    for _ in range(repeats):
+        if setup is None:
+            start = time.perf_counter()
+            output = stage()
+        else:
+            setup_output = setup()
+            start = time.perf_counter()
+            output = stage(setup_output)
+        best = min(best, time.perf_counter() - start)
+
+    return best, output
+
+
+def get_result(seconds, n_items):
+    """
+    Returns the result of a stage
+
+    Parameters
+    ----------
+    seconds : float
+        The time of the stage
+    n_items : int
+        Number of items (images) processed by the stage
+
+    Returns
+    -------
+    result : dict
+        The `seconds`, the `n_items` and the `items_per_sec`
+    """
+
+    return dict(seconds=seconds,
+                n_items=n_items,
+                items_per_sec=n_items / seconds if seconds > 0 else None)
+
+
+def run_benchmark(work_dir,
+                  n_images_per_class=64,
+                  image_size=128,
+                  height=28,
+                  width=28,
+                  batch_size=32,
+                  repeats=3,
+                  n_workers=None,
+                  seed=42):
+    """
+    Times the stages of the pipeline on synthetic images
+
+    Parameters
+    ----------
+    work_dir : Path
+        Directory for the images, data sets and model files
+    n_images_per_class : int
+        Number of synthetic images of each class
+    image_size : int
+        Height and width of the synthetic images
+    height : int
+        Height of the resized images
+    width : int
+        Width of the resized images
+    batch_size : int
+        The batch size of the training
+    repeats : int
+        Number of runs of each stage
+    n_workers : None or int
+        Number of processes of the preprocessing
+        If None, the number of CPUs is used
+    seed : int
+        Seed of the images and the training
+
+    Returns
+    -------
+    results : dict
+        The result of each stage as returned by `get_result`
+    """
+
+    raw_dir = work_dir.joinpath('raw', 'synthetic')
+    interim_dir = work_dir.joinpath('interim', 'synthetic')
+    resized_dir = work_dir.joinpath('resized', 'synthetic')
+    processed_dir = work_dir.joinpath('processed', 'synthetic')
+    model_files_dir = work_dir.joinpath('model_files')
+    model_name = 'benchmark'
+
+    make_synthetic_images(raw_dir,
+                          n_images_per_class,
+                          image_size,
+                          image_size,
+                          seed)
+    n_raw = len(get_image_paths(raw_dir))
+    n_images = n_images_per_class * len(CLASSES)
+
+    results = dict()
+
+    def clear(directory):
+        if directory.is_dir():
+            shutil.rmtree(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+
+    def copy_interim():
+        clear(resized_dir)
+        shutil.copytree(str(interim_dir), str(resized_dir))
+
+    seconds, _ = time_stage(
+        lambda _: copy_valid_images(raw_dir, interim_dir, n_workers),
+        repeats,
+        setup=lambda: clear(interim_dir))
+    results['copy_valid_images'] = get_result(seconds, n_raw)
+
+    seconds, _ = time_stage(
+        lambda _: resize_images(resized_dir, height, width, n_workers),
+        repeats,
+        setup=copy_interim)
+    results['resize_images'] = get_result(seconds, n_images)
+
+    image_paths = get_image_paths(resized_dir)
+    seconds, (data, labels) = time_stage(
+        lambda: get_data_and_labels(image_paths),
+        repeats)
+    results['get_data_and_labels'] = get_result(seconds, n_images)
+
+    labels = encode_labels(labels, model_files_dir, model_name)
+    x_train, x_test, y_train, y_test = get_data_split(data, labels)
+    x_train, x_val, y_train, y_val = get_data_split(x_train, y_train)
+
+    seconds, _ = time_stage(
+        lambda _: store_data_sets(x_train,
+                                  x_val,
+                                  x_test,
+                                  y_train,
+                                  y_val,
+                                  y_test,
+                                  processed_dir,
+                                  classes=sorted(CLASSES)),
+        repeats,
+        setup=lambda: clear(processed_dir))
+    results['store_data_sets'] = get_result(seconds, n_images)
+
+    def read_data_sets():
+        data_sets = load_data_sets(processed_dir)
+        # Touch the pages of the memory maps
+        return [np.array(data_set) for data_set in data_sets]
+
+    seconds, _ = time_stage(read_data_sets, repeats)
+    results['load_data_sets'] = get_result(seconds, n_images)
+
+    optimizer_setup = dict(initial_learning_rate=1e-3,
+                           epochs=1,
+                           batch_size=batch_size)
+    model_setup = dict(model_type='leNet',
+                       height=height,
+                       width=width,
+                       channels=x_train.shape[-1])
+
+    def get_seeded_model():
+        np.random.seed(seed)
+        return get_model(y_train.shape[1], model_setup, optimizer_setup)
+
+    # The first epoch includes building the training function, as for
+    # every training run
+    seconds, history = time_stage(
+        lambda model: train_model(model,
+                                  get_batch_augmenter(),
+                                  model_files_dir,
+                                  x_train,
+                                  y_train,
+                                  x_val,
+                                  y_val,
+                                  model_name,
+                                  batch_size=batch_size,
+                                  epochs=1),
+        repeats,
+        setup=get_seeded_model)
+    results['train_epoch'] = get_result(seconds, len(x_train))
+
+    # The export is not part of the timed training, as train_model
+    # only exports on request
+    try:
+        export_tflite(history.model,
+                      get_model_path(model_files_dir, model_name))
+    except Exception as e:
+        print(f'[WARN] Could not export {model_name} to TensorFlow '
+              f'Lite: {e}')
+
+    image_path = get_image_paths(raw_dir.joinpath('apples'))[0]
+    seconds, _ = time_stage(
+        lambda: predict_main(image_path, model_files_dir, model_name),
+        repeats)
+    results['predict_cold'] = get_result(seconds, 1)
+
+    is_tflite_exported = \
+        get_model_path(model_files_dir, model_name, 'tflite').is_file()
+    if is_tflite_exported:
+        seconds, _ = time_stage(
+            lambda: predict_main(image_path,
+                                 model_files_dir,
+                                 model_name,
+                                 backend='tflite'),
+            repeats)
+        results['predict_cold_tflite'] = get_result(seconds, 1)
+    else:
+        print('[WARN] The model was not exported to TensorFlow Lite, '
+              'skipping the tflite stages')
+
+    registry = ModelRegistry(model_files_dir)
+    registry.get(model_name)
+    # Warm up the predict function of the model
+    predict_main(image_path, model_files_dir, model_name, registry=registry)
+    seconds, _ = time_stage(
+        lambda: predict_main(image_path,
+                             model_files_dir,
+                             model_name,
+                             registry=registry),
+        repeats)
+    results['predict_warm'] = get_result(seconds, 1)
+
+    model = load_classifier(model_files_dir, model_name)
+    classify_many(model, x_test[:1])
+    seconds, _ = time_stage(lambda: classify_many(model, x_test), repeats)
+    results['classify_many'] = get_result(seconds, len(x_test))
+
+    if is_tflite_exported:
+        model = load_classifier(model_files_dir, model_name, 'tflite')
+        classify_many(model, x_test[:1])
+        seconds, _ = time_stage(lambda: classify_many(model, x_test),
+                                repeats)
+        results['classify_many_tflite'] = get_result(seconds, len(x_test))
+
+    return results
+
+
+def compare_to_baseline(results,
+                        baseline,
+                        tolerance=0.25,
+                        min_difference=0.01):
+    """
+    Compares the results to a baseline
+
+    Parameters
+    ----------
+    results : dict
+        The results of each stage as returned by `run_benchmark`
+    baseline : dict
+        The results of the baseline
+    tolerance : float
+        A stage regresses if it is more than this fraction slower than
+        in the baseline
+    min_difference : float
+        A stage only regresses if it is also more than this number of
+        seconds slower than in the baseline, as the ratios of the
+        fastest stages are dominated by noise
+
+    Returns
+    -------
+    comparison : dict
+        For each stage of both the results and the baseline, the
+        `ratio` of the time to the baseline time and whether it
+        `regressed`
+    """
+
+    comparison = dict()
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        difference = result['seconds'] - baseline[stage]['seconds']
+        ratio = result['seconds'] / baseline[stage]['seconds']
+        comparison[stage] = dict(ratio=ratio,
+                                 regressed=(ratio > 1 + tolerance and
+                                            difference > min_difference))
+
+    return comparison
+
+
+def main(output_path=None,
+         baseline_path=None,
+         save_baseline=False,
+         tolerance=0.25,
+         n_images_per_class=64,
+         repeats=3,
+         n_workers=None):
+    """
+    Runs the benchmark and compares it to the baseline
+
+    Parameters
+    ----------
+    output_path : None or Path
+        Where to store the results
+        If None, the results are stored in
+        reports/benchmarks/pipeline_<timestamp>.json
+    baseline_path : None or Path
+        The baseline to compare to
+        If None, benchmarks/pipeline_baseline.json is used
+    save_baseline : bool
+        Whether to store the results as the new baseline
+    tolerance : float
+        A stage regresses if it is more than this fraction slower than
+        in the baseline
+    n_images_per_class : int
+        Number of synthetic images of each class
+    repeats : int
+        Number of runs of each stage
+    n_workers : None or int
+        Number of processes of the preprocessing
+        If None, the number of CPUs is used
+
+    Returns
+    -------
+    report : dict
+        The `results` of the stages, the `comparison` to the baseline
+        and the `environment` of the run
+    """
+
+    root_dir = Path(__file__).absolute().parents[1]
+    if baseline_path is None:
+        baseline_path = root_dir.joinpath('benchmarks',
+                                          'pipeline_baseline.json')
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if output_path is None:
+        output_path = root_dir.joinpath('reports',
+                                        'benchmarks',
+                                        f'pipeline_{timestamp}.json')
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_benchmark(Path(work_dir),
+                                n_images_per_class=n_images_per_class,
+                                repeats=repeats,
+                                n_workers=n_workers)
+
+    if baseline_path.is_file():
+        with baseline_path.open('r') as f:
+            baseline = json.load(f)['results']
+        comparison = compare_to_baseline(results, baseline, tolerance)
+    else:
+        print(f'[INFO] No baseline found in {baseline_path}')
+        comparison = dict()
+
+    report = dict(results=results,
+                  comparison=comparison,
+                  environment=dict(timestamp=timestamp,
+                                   python=platform.python_version(),
+                                   platform=platform.platform(),
+                                   processor=platform.processor(),
+                                   n_images_per_class=n_images_per_class,
+                                   repeats=repeats,
+                                   n_workers=n_workers))
+
+    print(f'[INFO] {"Stage":<20}{"Seconds":>10}{"Items/s":>12}'
+          f'{"Baseline":>10}')
+    for stage, result in results.items():
+        if stage in comparison:
+            ratio = f'{comparison[stage]["ratio"]:.2f}x'
+            status = ' REGRESSED' if comparison[stage]['regressed'] \
+                else ''
+        else:
+            ratio = '-'
+            status = ''
+        print(f'[INFO] {stage:<20}{result["seconds"]:>10.4f}'
+              f'{result["items_per_sec"] or 0:>12.1f}{ratio:>10}'
+              f'{status}')
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open('w') as f:
+        json.dump(report, f, indent=2)
+    print(f'[INFO] Saved to {output_path}')
+
+    if save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with baseline_path.open('w') as f:
+            json.dump(report, f, indent=2)
+        print(f'[INFO] Saved baseline to {baseline_path}')
+
+    return report
+
+
+if __name__ == '__main__':
+    # Construct the argument parse and parse the arguments
+    parser = argparse.ArgumentParser(
+        description='Benchmark the stages of the pipeline')
+    parser.add_argument('-o',
+                        '--output_path',
+                        required=False,
+                        default=None,
+                        help='Where to store the results. Defaults to '
+                             'reports/benchmarks/pipeline_<time>.json')
+    parser.add_argument('-b',
+                        '--baseline_path',
+                        required=False,
+                        default=None,
+                        help='The baseline to compare to. Defaults to '
+                             'benchmarks/pipeline_baseline.json')
+    parser.add_argument('-s',
+                        '--save_baseline',
+                        action='store_true',
+                        help='Store the results as the new baseline')
+    parser.add_argument('-t',
+                        '--tolerance',
+                        required=False,
+                        default=0.25,
+                        type=float,
+                        help='Fraction a stage may be slower than the '
+                             'baseline before it counts as a regression')
+    parser.add_argument('-n',
+                        '--n_images_per_class',
+                        required=False,
+                        default=64,
+                        type=int,
+                        help='Number of synthetic images of each class')
+    parser.add_argument('-r',
+                        '--repeats',
+                        required=False,
+                        default=3,
+                        type=int,
+                        help='Number of runs of each stage')
+    parser.add_argument('-j',
+                        '--n_workers',
+                        required=False,
+                        default=None,
+                        type=int,
+                        help='Number of processes of the preprocessing')
+
+    args = parser.parse_args()
+
+    report_ = main(None if args.output_path is None
+                   else Path(args.output_path),
+                   None if args.baseline_path is None
+                   else Path(args.baseline_path),
+                   args.save_baseline,
+                   args.tolerance,
+                   args.n_images_per_class,
+                   args.repeats,
+                   args.n_workers)
+
+    if any(stage['regressed'] for stage in report_['comparison'].values()):
+        sys.exit(1)
@@ -1,14 +1,23 @@
 import argparse
 from experiments.recipe import ex as ex_
+from experiments.observers import OBSERVERS
+from experiments.observers import set_observer
 from experiments.utils import reset_config
 from experiments.utils import get_configuration
 from experiments.utils import add_to_sacred
 
 
-def run_experiment(ex, experiment_file='first_experiment.ini'):
+def run_experiment(ex,
+                   experiment_file='first_experiment.ini',
+                   overrides=None,
+                   preprocess=True):
     """
     Sets up the experiment and run it them
 
+    The Keras session is cleared after the run, so that consecutive
+    runs in the same process (such as the trials of a sweep worker) do
+    not keep adding their models to the same graph
+
     Parameters
     ----------
     ex : Experiment
@@ -17,18 +26,69 @@ def run_experiment(ex, experiment_file='first_experiment.ini'):
         The name of the experiment file which contains the parameters of
         the experiment.
         The file must be found in experiment_files/
+    overrides : None or dict
+        Options overriding the ones in the experiment file
+        See experiments.utils.get_configuration for details
+    preprocess : bool
+        Whether or not to run the preprocessing
+        Set to False if the dataset is already preprocessed (for
+        example by the sweep driver)
+
+    Returns
+    -------
+    run : Run
+        The sacred run
     """
 
-    config = get_configuration(experiment_file)
+    config = get_configuration(experiment_file, overrides)
 
     ex = reset_config(ex)
     ex.path = experiment_file
+    ex.overrides = overrides
+    ex.preprocess = preprocess
 
     # Add the information to sacred
     for section in config.keys():
+        # The search space of sweeps is not part of a single run
+        if section in ('sweep', 'sweep_space'):
+            continue
         add_to_sacred(ex, config[section])
 
-    ex.run()
+    # Imported here to keep the start up of the entry point fast
+    from keras import backend as K
+
+    try:
+        return ex.run()
+    finally:
+        K.clear_session()
+
+
+def run_experiments(ex, experiment_files):
+    """
+    Runs the experiments one after another in this process
+
+    The datasets are only preprocessed once, and TensorFlow is only
+    initialized once for all the experiments.
+    The Keras session is cleared between the experiments by
+    `run_experiment`
+
+    Parameters
+    ----------
+    ex : Experiment
+        The experiment object to use
+    experiment_files : list
+        The names of the experiment files (located in experiment_files/)
+
+    Returns
+    -------
+    runs : list
+        The sacred runs
+    """
+
+    runs = [run_experiment(ex, experiment_file)
+            for experiment_file in experiment_files]
+
+    return runs
 
 
 if __name__ == '__main__':
@@ -38,14 +98,27 @@ if __name__ == '__main__':
                         '--experiment_file_name',
                         required=False,
                         default=None,
+                        nargs='+',
                         help='Name of experiment file (located in '
-                             'experiment_files/)')
+                             'experiment_files/). Several files are '
+                             'run one after another')
+    parser.add_argument('-o',
+                        '--observer',
+                        required=False,
+                        default=None,
+                        choices=OBSERVERS,
+                        help='Where to store the runs. Defaults to the '
+                             'SACRED_OBSERVER environment variable, or '
+                             'mongo if not set')
 
     args = parser.parse_args()
 
+    if args.observer is not None:
+        set_observer(ex_, args.observer)
+
     if args.experiment_file_name is None:
-        experiment_file_ = 'first_experiment.ini'
+        experiment_files_ = ['first_experiment.ini']
     else:
-        experiment_file_ = args.experiment_file_name
+        experiment_files_ = args.experiment_file_name
 
-    run_experiment(ex_, experiment_file_)
+    run_experiments(ex_, experiment_files_)
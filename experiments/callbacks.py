@@ -0,0 +1,171 @@
+"""
+Contains the streaming of the training metrics to sacred
+
+The metrics are logged while training, so long runs show their
+progress and throughput live.
+Logging a scalar through sacred takes a lock and looks up the current
+run, so the metrics are buffered and only handed to sacred every
+`flush_interval` seconds, keeping the overhead of each batch to
+appending to a list
+"""
+
+import time
+from fruit_classifier.train.callbacks import TimingCallback
+
+# The names of the epoch metrics in sacred, kept from log_history
+EPOCH_METRICS = dict(loss='loss',
+                     accuracy='acc',
+                     val_loss='val_loss',
+                     val_accuracy='val_acc')
+
+
+class MetricsStreamer(TimingCallback):
+    """
+    Streams the batch and epoch metrics of the training to sacred
+
+    Each batch logs
+    - batch.loss and batch.accuracy
+    - batch.step_time: The time of the training step in seconds
+    - batch.data_wait: The time spent waiting for the batch in seconds
+    - batch.samples_per_sec: The samples per second of the batch,
+      including the wait for data
+
+    with the number of batches trained so far as step, and each epoch
+    logs
+    - loss, acc, val_loss and val_acc
+    - epoch.time: The time of the epoch in seconds
+    - epoch.data_wait: The fraction of the epoch spent waiting for
+      data
+    - epoch.samples_per_sec: The training samples per second
+
+    with the epoch number as step
+    """
+
+    def __init__(self,
+                 ex,
+                 batch_size=None,
+                 flush_interval=10.0,
+                 log_batches=True):
+        """
+        Sets up the callback
+
+        Parameters
+        ----------
+        ex : Experiment
+            The experiment to log the metrics to
+        batch_size : None or int
+            The batch size
+            Only used if the size of the batch is not given in the logs
+            of the batch
+        flush_interval : float
+            Minimum number of seconds between the flushes of the
+            buffered metrics to sacred
+        log_batches : bool
+            Whether to log the metrics of each batch, or only of the
+            epochs
+        """
+
+        super().__init__(batch_size)
+        self.ex = ex
+        self.flush_interval = flush_interval
+        self.log_batches = log_batches
+
+        self.buffer = list()
+        self.n_batches = 0
+        self.last_flush = time.perf_counter()
+
+    def on_batch_end(self, batch, logs=None):
+        """
+        Buffers the metrics of the batch
+
+        Parameters
+        ----------
+        batch : int
+            The index of the batch in the epoch
+        logs : dict
+            The logs of the batch
+        """
+
+        super().on_batch_end(batch, logs)
+        self.n_batches += 1
+
+        if not self.log_batches:
+            return
+
+        logs = logs or dict()
+        step = self.n_batches
+        for name in ('loss', 'accuracy'):
+            if name in logs:
+                self.buffer.append((f'batch.{name}', logs[name], step))
+        self.buffer.append(('batch.step_time', self.step_time, step))
+        self.buffer.append(('batch.data_wait', self.data_wait, step))
+        if self.samples is not None:
+            batch_time = self.step_time + self.data_wait
+            self.buffer.append(('batch.samples_per_sec',
+                                self.samples / batch_time,
+                                step))
+
+        self.flush_if_due()
+
+    def on_epoch_end(self, epoch, logs=None):
+        """
+        Buffers the metrics of the epoch
+
+        Parameters
+        ----------
+        epoch : int
+            The index of the epoch
+        logs : dict
+            The logs of the epoch
+        """
+
+        logs = logs or dict()
+        step = epoch + 1
+        for name, sacred_name in EPOCH_METRICS.items():
+            if name in logs:
+                self.buffer.append((sacred_name, logs[name], step))
+
+        # Includes the validation
+        epoch_time = self.get_epoch_time()
+        self.buffer.append(('epoch.time', epoch_time, step))
+        train_time = self.epoch_step_time + self.epoch_data_wait
+        if train_time > 0:
+            self.buffer.append(('epoch.data_wait',
+                                self.epoch_data_wait / train_time,
+                                step))
+            self.buffer.append(('epoch.samples_per_sec',
+                                self.epoch_samples / train_time,
+                                step))
+
+        self.flush_if_due()
+
+    def on_train_end(self, logs=None):
+        """
+        Flushes the remaining metrics
+
+        Parameters
+        ----------
+        logs : dict
+            The logs of the training
+        """
+
+        self.flush()
+
+    def flush_if_due(self):
+        """
+        Flushes the buffered metrics if flush_interval has passed
+        """
+
+        if time.perf_counter() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Logs the buffered metrics to sacred
+        """
+
+        for name, value, step in self.buffer:
+            self.ex.log_scalar(name, float(value), step)
+
+        self.buffer = list()
+        self.last_flush = time.perf_counter()
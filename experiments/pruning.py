@@ -0,0 +1,214 @@
+"""
+Contains the early stopping of losing trials in sweeps
+
+The trials are pruned with asynchronous successive halving (ASHA) [1]_:
+At the rungs min_epochs, min_epochs * reduction_factor,
+min_epochs * reduction_factor**2, ... a trial reports its validation
+accuracy, and is stopped unless it is among the best
+1 / reduction_factor of the trials which have reached the same rung.
+As the trials run in different processes, the reported values are
+shared through files.
+
+References
+----------
+[1] Li et al., A System for Massively Parallel Hyperparameter Tuning,
+https://arxiv.org/abs/1810.05934
+"""
+
+import json
+from keras.callbacks import Callback
+
+
+class RungStore(object):
+    """
+    Stores the values reported at the rungs by all the trials
+
+    The value of a trial at a rung is stored in
+    store_dir/rung_<epochs>/<trial>.json
+    """
+
+    def __init__(self, store_dir):
+        """
+        Sets up the store
+
+        Parameters
+        ----------
+        store_dir : Path
+            Directory of the stored values
+        """
+
+        self.store_dir = store_dir
+
+    def report(self, rung, trial, value):
+        """
+        Stores the value of a trial at a rung
+
+        Parameters
+        ----------
+        rung : int
+            Number of epochs of the rung
+        trial : str
+            Name of the trial
+        value : float
+            The value reached by the trial at the rung
+        """
+
+        rung_dir = self.store_dir.joinpath(f'rung_{rung:04d}')
+        rung_dir.mkdir(parents=True, exist_ok=True)
+
+        # Write atomically so readers never see partial files
+        tmp_path = rung_dir.joinpath(f'{trial}.json.tmp')
+        with tmp_path.open('w') as f:
+            json.dump(dict(trial=trial, value=value), f)
+        tmp_path.replace(rung_dir.joinpath(f'{trial}.json'))
+
+    def get_values(self, rung):
+        """
+        Returns the values of all the trials which reached a rung
+
+        Parameters
+        ----------
+        rung : int
+            Number of epochs of the rung
+
+        Returns
+        -------
+        values : dict
+            The values keyed by the trial names
+        """
+
+        rung_dir = self.store_dir.joinpath(f'rung_{rung:04d}')
+
+        values = dict()
+        for path in sorted(rung_dir.glob('*.json')):
+            with path.open('r') as f:
+                reported = json.load(f)
+            values[reported['trial']] = reported['value']
+
+        return values
+
+
+def get_rungs(max_epochs, min_epochs=1, reduction_factor=3):
+    """
+    Returns the number of epochs of the rungs
+
+    Parameters
+    ----------
+    max_epochs : int
+        Maximum number of epochs of a trial
+    min_epochs : int
+        Number of epochs of the first rung
+    reduction_factor : int
+        Factor between the number of epochs of consecutive rungs
+
+    Returns
+    -------
+    rungs : list
+        The number of epochs of the rungs (less than max_epochs)
+    """
+
+    rungs = list()
+    rung = min_epochs
+    while rung < max_epochs:
+        rungs.append(rung)
+        rung *= reduction_factor
+
+    return rungs
+
+
+def is_promising(value, values, reduction_factor=3):
+    """
+    Checks whether a value is among the best 1 / reduction_factor
+
+    Parameters
+    ----------
+    value : float
+        The value of the trial
+    values : list
+        The values of all the trials at the rung (including the trial)
+    reduction_factor : int
+        Only the best 1 / reduction_factor of the trials are promising
+
+    Returns
+    -------
+    bool
+        True if the value is among the best, or if too few trials have
+        reached the rung to tell
+    """
+
+    n_promoted = len(values) // reduction_factor
+    if n_promoted == 0:
+        return True
+
+    threshold = sorted(values, reverse=True)[n_promoted - 1]
+
+    return value >= threshold
+
+
+class PruningCallback(Callback):
+    """
+    Stops the training of a trial which is not promising at a rung
+    """
+
+    def __init__(self,
+                 trial,
+                 store_dir,
+                 max_epochs,
+                 min_epochs=1,
+                 reduction_factor=3,
+                 monitor='val_accuracy'):
+        """
+        Sets up the callback
+
+        Parameters
+        ----------
+        trial : str
+            Name of the trial
+        store_dir : Path
+            Directory of the values reported by the trials of the sweep
+        max_epochs : int
+            Maximum number of epochs of the trial
+        min_epochs : int
+            Number of epochs of the first rung
+        reduction_factor : int
+            Factor between the number of epochs of consecutive rungs
+            Only the best 1 / reduction_factor of the trials are kept
+            at each rung
+        monitor : str
+            The metric to compare (larger is better)
+        """
+
+        super().__init__()
+        self.trial = trial
+        self.store = RungStore(store_dir)
+        self.rungs = get_rungs(max_epochs, min_epochs, reduction_factor)
+        self.reduction_factor = reduction_factor
+        self.monitor = monitor
+
+        self.pruned_epoch = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        """
+        Reports the value at the rungs and stops losing trials
+
+        Parameters
+        ----------
+        epoch : int
+            The index of the epoch
+        logs : dict
+            The metrics of the epoch
+        """
+
+        n_epochs = epoch + 1
+        if n_epochs not in self.rungs:
+            return
+
+        value = float(logs[self.monitor])
+        self.store.report(n_epochs, self.trial, value)
+        values = list(self.store.get_values(n_epochs).values())
+
+        if not is_promising(value, values, self.reduction_factor):
+            print(f'[INFO] Pruning {self.trial} after {n_epochs} epochs '
+                  f'({self.monitor} {value:.4f})')
+            self.pruned_epoch = n_epochs
+            self.model.stop_training = True
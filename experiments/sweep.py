@@ -0,0 +1,391 @@
+"""
+Runs hyperparameter sweeps
+
+The search space is given in the experiment file, e.g.
+
+    [sweep]
+    method = 'random'
+    n_trials = 8
+    n_workers = 2
+
+    [sweep_space]
+    model_setup.dropout = [0.0, 0.25, 0.5]
+    optimizer_setup.initial_learning_rate = ('loguniform', 1e-4, 1e-2)
+    optimizer_setup.batch_size = [16, 32, 64]
+
+where the keys of the search space are `section.keyword` of the option
+to vary.
+Lists are the values to choose from (all of them for grid searches),
+and tuples of ('uniform', low, high), ('loguniform', low, high) or
+('randint', low, high) are distributions to sample from (random
+searches only).
+
+Notes
+-----
+This module must not import TensorFlow at import time, as the thread
+limits of the workers are set before TensorFlow is first imported
+"""
+
+import os
+import json
+import shutil
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from experiments.observers import OBSERVERS
+from experiments.utils import get_configuration
+from fruit_classifier.utils.parallel_utils import get_n_workers
+
+
+def get_trials(config, method='grid', n_trials=10, seed=42):
+    """
+    Returns the options of the trials of the sweep
+
+    Parameters
+    ----------
+    config : dict
+        The configuration of the sweep as returned by
+        `get_configuration`
+        The search space is read from the `sweep_space` section
+    method : ["grid"|"random"]
+        How to search the space
+        - grid: All the combinations of the values
+        - random: `n_trials` random samples of the space
+    n_trials : int
+        Number of trials of random searches
+    seed : int
+        Seed of random searches
+
+    Returns
+    -------
+    trials : list
+        List of the options of each trial on the form
+        {section: {keyword: value}}
+    """
+
+    space = config.get('sweep_space', dict())
+    keys = sorted(space.keys())
+
+    for key in keys:
+        if '.' not in key:
+            msg = f'The search space key {key} must be on the form ' \
+                  f'section.keyword'
+            raise ValueError(msg)
+
+    if method == 'grid':
+        for key in keys:
+            if not isinstance(space[key], list):
+                msg = f'Grid searches only supports lists of values, ' \
+                      f'got {space[key]} for {key}'
+                raise ValueError(msg)
+        samples = list(itertools.product(*[space[key] for key in keys]))
+    elif method == 'random':
+        random_state = np.random.RandomState(seed)
+        samples = [[sample_value(space[key], random_state)
+                    for key in keys]
+                   for _ in range(n_trials)]
+    else:
+        msg = f'{method} is not a valid search method, choose from ' \
+              f'(\'grid\', \'random\')'
+        raise NotImplementedError(msg)
+
+    trials = list()
+    for sample in samples:
+        trial = dict()
+        for key, value in zip(keys, sample):
+            section, keyword = key.split('.', 1)
+            trial.setdefault(section, dict())[keyword] = value
+        trials.append(trial)
+
+    return trials
+
+
+def sample_value(values, random_state):
+    """
+    Samples a value from the search space of an option
+
+    Parameters
+    ----------
+    values : list or tuple
+        Either a list of values to choose from, or a tuple of
+        ('uniform', low, high), ('loguniform', low, high) or
+        ('randint', low, high)
+    random_state : np.random.RandomState
+        The random state to sample with
+
+    Returns
+    -------
+    value : object
+        The sampled value
+    """
+
+    if isinstance(values, list):
+        return values[random_state.randint(len(values))]
+
+    distribution, low, high = values
+    if distribution == 'uniform':
+        value = float(random_state.uniform(low, high))
+    elif distribution == 'loguniform':
+        value = float(np.exp(random_state.uniform(np.log(low),
+                                                  np.log(high))))
+    elif distribution == 'randint':
+        value = int(random_state.randint(low, high + 1))
+    else:
+        msg = f'{distribution} is not a valid distribution, choose ' \
+              f'from (\'uniform\', \'loguniform\', \'randint\')'
+        raise NotImplementedError(msg)
+
+    return value
+
+
+def limit_threads(n_threads):
+    """
+    Limits the number of threads used by TensorFlow and numpy
+
+    Used as initializer of the worker processes, so it must run before
+    TensorFlow is imported
+
+    Parameters
+    ----------
+    n_threads : int
+        Number of threads per process
+    """
+
+    for variable in ('OMP_NUM_THREADS',
+                     'MKL_NUM_THREADS',
+                     'OPENBLAS_NUM_THREADS',
+                     'TF_NUM_INTRAOP_THREADS'):
+        os.environ[variable] = str(n_threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+
+
+def prepare_data(config):
+    """
+    Preprocesses the dataset and stores the data sets once for all trials
+
+    The trials then memory map the same data sets instead of each
+    preprocessing and loading the images
+
+    Parameters
+    ----------
+    config : dict
+        The configuration of the experiment
+    """
+
+    # Imported here to keep TensorFlow out of the driver until needed
+    from fruit_classifier.preprocessing.__main__ import main as pre_main
+    from fruit_classifier.train.__main__ import get_augmentation
+    from fruit_classifier.train.__main__ import get_data
+
+    dataset_name = config['preprocessing']['dataset_name']
+    pre_main(dataset_name,
+             config['preprocessing']['height'],
+             config['preprocessing']['width'])
+
+    x_train, *_ = get_data(dataset_name, config['train']['model_name'])
+    get_augmentation(dataset_name,
+                     x_train,
+                     config['train'].get('augmentation_cache_epochs', 0))
+
+
+def run_trial(experiment_file, overrides):
+    """
+    Runs one trial of the sweep as a sacred run
+
+    Parameters
+    ----------
+    experiment_file : str
+        The name of the experiment file (located in experiment_files/)
+    overrides : dict
+        The options of the trial
+
+    Returns
+    -------
+    result : float
+        The result of the run (the accuracy on the test set)
+    pruned_epoch : None or int
+        The number of epochs after which the trial was pruned
+        None if the trial was not pruned
+    """
+
+    # Imported here so that TensorFlow is imported after limit_threads
+    from experiments.__main__ import run_experiment
+    from experiments.recipe import ex
+
+    run = run_experiment(ex, experiment_file, overrides, preprocess=False)
+
+    return run.result, run.info.get('pruned_epoch', None)
+
+
+def run_sweep(experiment_file,
+              n_workers=None,
+              threads_per_worker=None):
+    """
+    Runs the trials of a sweep in parallel
+
+    Each trial is logged as a separate sacred run, and trains a model
+    named `<model_name>_trial_<number>`
+
+    Parameters
+    ----------
+    experiment_file : str
+        The name of the experiment file (located in experiment_files/)
+        The search space is given in the `sweep_space` section, and the
+        `sweep` section can contain
+        - method: "grid" or "random" (default "grid")
+        - n_trials: Number of random trials (default 10)
+        - seed: Seed of the random search (default 42)
+        - n_workers: Number of trials run in parallel
+        - pruning: Whether to stop losing trials early with
+          asynchronous successive halving (default False)
+          See experiments.pruning for details
+        - min_epochs: Epochs before the first pruning (default 1)
+        - reduction_factor: Only the best 1 / reduction_factor of
+          the trials continue at each rung (default 3)
+    n_workers : None or int
+        Number of trials run in parallel
+        If None, the value of the experiment file is used, and if not
+        given there, the number of CPUs
+    threads_per_worker : None or int
+        Number of TensorFlow threads per trial
+        If None, the CPUs are divided between the workers
+
+    Returns
+    -------
+    results : list
+        The trials sorted by decreasing result, where each trial is a
+        dictionary with the `model_name`, the `overrides`, the
+        `result`, the `pruned_epoch` and the `error`
+        Failed trials have the result None and the message of the
+        exception as error, and are sorted last
+    """
+
+    config = get_configuration(experiment_file)
+    sweep = config.get('sweep', dict())
+
+    trials = get_trials(config,
+                        method=sweep.get('method', 'grid'),
+                        n_trials=sweep.get('n_trials', 10),
+                        seed=sweep.get('seed', 42))
+
+    base_model_name = config['train']['model_name']
+    for number, trial in enumerate(trials):
+        trial.setdefault('train', dict())['model_name'] = \
+            f'{base_model_name}_trial_{number:03d}'
+
+    sweep_dir = Path(__file__).absolute().parents[1].joinpath(
+        'reports', 'sweeps')
+
+    if sweep.get('pruning', False):
+        # Start from a clean slate, as the trials compare against the
+        # values reported in the store
+        store_dir = sweep_dir.joinpath(f'{base_model_name}_rungs')
+        if store_dir.is_dir():
+            shutil.rmtree(store_dir)
+        pruning = dict(store_dir=str(store_dir),
+                       min_epochs=sweep.get('min_epochs', 1),
+                       reduction_factor=sweep.get('reduction_factor', 3))
+        for trial in trials:
+            trial['pruning'] = pruning
+
+    if n_workers is None:
+        n_workers = sweep.get('n_workers', None)
+    n_workers = min(get_n_workers(n_workers), max(len(trials), 1))
+    if threads_per_worker is None:
+        threads_per_worker = max(get_n_workers() // n_workers, 1)
+
+    print(f'[INFO] Running {len(trials)} trials with {n_workers} '
+          f'workers of {threads_per_worker} threads')
+
+    prepare_data(config)
+
+    # Spawned workers import TensorFlow after the thread limits are set
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(n_workers,
+                             mp_context=context,
+                             initializer=limit_threads,
+                             initargs=(threads_per_worker,)) as executor:
+        futures = [executor.submit(run_trial, experiment_file, trial)
+                   for trial in trials]
+        results = list()
+        for trial, future in zip(trials, futures):
+            model_name = trial['train']['model_name']
+            # A failing trial must not lose the results of the others
+            try:
+                result, pruned_epoch = future.result()
+                error = None
+            except Exception as e:
+                print(f'[WARN] Trial {model_name} failed: {e}')
+                result, pruned_epoch, error = None, None, str(e)
+            results.append(dict(model_name=model_name,
+                                overrides=trial,
+                                result=result,
+                                pruned_epoch=pruned_epoch,
+                                error=error))
+
+    results = sorted(results,
+                     key=lambda r: -np.inf if r['result'] is None
+                     else r['result'],
+                     reverse=True)
+
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    results_path = sweep_dir.joinpath(f'{base_model_name}.json')
+    with results_path.open('w') as f:
+        json.dump(results, f, indent=2)
+
+    for result in results:
+        if result['error'] is not None:
+            status = f' (failed: {result["error"]})'
+        elif result['pruned_epoch'] is None:
+            status = ''
+        else:
+            status = f' (pruned after {result["pruned_epoch"]} epochs)'
+        print(f'[INFO] {result["model_name"]}: {result["result"]}'
+              f'{status}')
+    print(f'[INFO] Results stored in {results_path}')
+
+    return results
+
+
+if __name__ == '__main__':
+    # Construct the argument parse and parse the arguments
+    parser = argparse.ArgumentParser(description='Run a sweep')
+    parser.add_argument('-e',
+                        '--experiment_file_name',
+                        required=False,
+                        default='sweep_experiment.ini',
+                        help='Name of experiment file (located in '
+                             'experiment_files/)')
+    parser.add_argument('-j',
+                        '--n_workers',
+                        required=False,
+                        default=None,
+                        type=int,
+                        help='Number of trials run in parallel')
+    parser.add_argument('-t',
+                        '--threads_per_worker',
+                        required=False,
+                        default=None,
+                        type=int,
+                        help='Number of TensorFlow threads per trial')
+    parser.add_argument('-o',
+                        '--observer',
+                        required=False,
+                        default=None,
+                        choices=OBSERVERS,
+                        help='Where to store the runs. Defaults to the '
+                             'SACRED_OBSERVER environment variable, or '
+                             'mongo if not set')
+
+    args = parser.parse_args()
+
+    if args.observer is not None:
+        # Inherited by the worker processes
+        os.environ['SACRED_OBSERVER'] = args.observer
+
+    run_sweep(args.experiment_file_name,
+              args.n_workers,
+              args.threads_per_worker)
@@ -0,0 +1,224 @@
+"""
+Copies the runs of the file backend to MongoDB
+
+The runs are replayed through a sacred MongoObserver, so they are
+stored exactly as if they had been observed by MongoDB directly.
+A synchronized run is marked with a `synced.json` file in its
+directory, and is skipped by later synchronizations
+"""
+
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+from sacred.observers import MongoObserver
+from experiments.observers import MONGO_DB_NAME
+from experiments.observers import MONGO_URL
+from experiments.observers import get_runs_dir
+
+
+def load_json(path, default=None):
+    """
+    Loads a json file
+
+    Parameters
+    ----------
+    path : Path
+        Path to the json file
+    default : object
+        Returned if the file does not exist
+
+    Returns
+    -------
+    content : object
+        The content of the file
+    """
+
+    if not path.is_file():
+        return default
+
+    with path.open('r') as f:
+        return json.load(f)
+
+
+def parse_time(time_str):
+    """
+    Parses a time stored by the file backend
+
+    Parameters
+    ----------
+    time_str : None or str
+        The time in ISO format
+
+    Returns
+    -------
+    time : None or datetime
+        The parsed time
+    """
+
+    if time_str is None:
+        return None
+
+    time_format = '%Y-%m-%dT%H:%M:%S.%f' if '.' in time_str \
+        else '%Y-%m-%dT%H:%M:%S'
+
+    return datetime.strptime(time_str, time_format)
+
+
+def get_run_dirs(runs_dir):
+    """
+    Returns the directories of the finished runs which are not synced
+
+    Parameters
+    ----------
+    runs_dir : Path
+        The directory of the file backend
+
+    Returns
+    -------
+    run_dirs : list
+        The run directories sorted by run id
+    """
+
+    run_dirs = list()
+    for run_dir in runs_dir.iterdir():
+        if not run_dir.name.isdigit() or \
+                run_dir.joinpath('synced.json').is_file():
+            continue
+        run = load_json(run_dir.joinpath('run.json'), dict())
+        if run.get('status') in ('COMPLETED', 'FAILED', 'INTERRUPTED'):
+            run_dirs.append(run_dir)
+
+    return sorted(run_dirs, key=lambda path: int(path.name))
+
+
+def sync_run(run_dir, observer):
+    """
+    Replays a run of the file backend to an observer
+
+    Parameters
+    ----------
+    run_dir : Path
+        The directory of the run
+    observer : RunObserver
+        The observer to replay the run to
+
+    Returns
+    -------
+    _id : object
+        The id of the run given by the observer
+    """
+
+    run = load_json(run_dir.joinpath('run.json'))
+    config = load_json(run_dir.joinpath('config.json'), dict())
+    info = load_json(run_dir.joinpath('info.json'), dict())
+    metrics = load_json(run_dir.joinpath('metrics.json'), dict())
+
+    # The file backend stores the sources in runs_dir/_sources, named
+    # by their md5 sum
+    ex_info = dict(run['experiment'])
+    ex_info['base_dir'] = str(run_dir.parent)
+    ex_info['sources'] = \
+        [[stored_path, Path(stored_path).stem.rsplit('_', 1)[-1]]
+         for _, stored_path in ex_info.get('sources', list())]
+
+    _id = observer.started_event(ex_info,
+                                 run['command'],
+                                 run['host'],
+                                 parse_time(run['start_time']),
+                                 config,
+                                 run['meta'],
+                                 None)
+
+    if len(metrics) > 0:
+        metrics_by_name = dict()
+        for name, metric in metrics.items():
+            metrics_by_name[name] = \
+                dict(steps=metric['steps'],
+                     values=metric['values'],
+                     timestamps=[parse_time(timestamp)
+                                 for timestamp in metric['timestamps']])
+        # Adds the metric ids to info
+        observer.log_metrics(metrics_by_name, info)
+
+    for name in run.get('artifacts', list()):
+        observer.artifact_event(name, str(run_dir.joinpath(name)))
+
+    cout_path = run_dir.joinpath('cout.txt')
+    captured_out = cout_path.read_text() if cout_path.is_file() else ''
+    observer.heartbeat_event(info,
+                             captured_out,
+                             parse_time(run.get('heartbeat')),
+                             run.get('result'))
+
+    stop_time = parse_time(run.get('stop_time'))
+    if run['status'] == 'COMPLETED':
+        observer.completed_event(stop_time, run.get('result'))
+    elif run['status'] == 'FAILED':
+        observer.failed_event(stop_time, run.get('fail_trace'))
+    else:
+        observer.interrupted_event(stop_time, run['status'])
+
+    return _id
+
+
+def sync_runs(runs_dir, observer):
+    """
+    Replays the finished runs which are not yet synced
+
+    Parameters
+    ----------
+    runs_dir : Path
+        The directory of the file backend
+    observer : RunObserver
+        The observer to replay the runs to
+
+    Returns
+    -------
+    synced : dict
+        The ids given by the observer keyed by the run directories
+    """
+
+    synced = dict()
+    for run_dir in get_run_dirs(runs_dir):
+        _id = sync_run(run_dir, observer)
+        with run_dir.joinpath('synced.json').open('w') as f:
+            json.dump(dict(_id=_id), f)
+        synced[run_dir] = _id
+        print(f'[INFO] Synced {run_dir} as run {_id}')
+
+    print(f'[INFO] Synced {len(synced)} runs')
+
+    return synced
+
+
+if __name__ == '__main__':
+    # Construct the argument parse and parse the arguments
+    parser = argparse.ArgumentParser(
+        description='Copy the runs of the file backend to MongoDB')
+    parser.add_argument('-r',
+                        '--runs_dir',
+                        required=False,
+                        default=None,
+                        help='Directory of the file backend. Defaults '
+                             'to reports/sacred_runs')
+    parser.add_argument('-u',
+                        '--url',
+                        required=False,
+                        default=MONGO_URL,
+                        help='The MongoDB url')
+    parser.add_argument('-b',
+                        '--db_name',
+                        required=False,
+                        default=MONGO_DB_NAME,
+                        help='The MongoDB database')
+
+    args = parser.parse_args()
+
+    if args.runs_dir is None:
+        runs_dir_ = get_runs_dir()
+    else:
+        runs_dir_ = Path(args.runs_dir)
+
+    sync_runs(runs_dir_,
+              MongoObserver.create(url=args.url, db_name=args.db_name))
@@ -48,7 +48,7 @@ def add_to_sacred(ex, options):
         ex.add_config({keyword: value})
 
 
-def get_configuration(experiment_file):
+def get_configuration(experiment_file, overrides=None):
     """
     Returns the configuration
 
@@ -58,6 +58,10 @@ def get_configuration(experiment_file):
         The name of the experiment file which contains the parameters of
         the experiment.
         The file must be found in experiment_files/
+    overrides : None or dict
+        Dictionary of sections, where each section is a dictionary of
+        keywords and values which overrides the ones of the experiment
+        file
 
     Returns
     -------
@@ -82,6 +86,10 @@ def get_configuration(experiment_file):
             config_dict[section][keyword] = \
                 ast.literal_eval(config[section][keyword])
 
+    if overrides is not None:
+        for section, options in overrides.items():
+            config_dict.setdefault(section, dict()).update(options)
+
     return config_dict
 
 
@@ -89,7 +97,8 @@ def log_history(ex, history):
     """
     Logs the history after the run
 
-    For real time logging, see for example [1]_
+    For real time logging, see experiments.callbacks.MetricsStreamer
+    and for example [1]_
 
     Parameters
     ----------
@@ -1,7 +1,5 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
-from fruit_classifier.predict.predict_utils import inverse_encode
+from fruit_classifier.predict.predict_utils import load_label_encoder
 
 
 def plot_confusion_matrix(y_true_sorted,
@@ -10,7 +8,7 @@ def plot_confusion_matrix(y_true_sorted,
                           plot_name='last',
                           normalize=False,
                           title='Confusion matrix',
-                          cmap=plt.cm.Blues,
+                          cmap=None,
                           figsize=None):
     """
     Plots the confusion matrix
@@ -29,8 +27,9 @@ def plot_confusion_matrix(y_true_sorted,
         Whether to have absolute count or percentage
     title : str
         The title of the plot
-    cmap : Colormap
+    cmap : None or Colormap
         The colormap to use
+        If None, plt.cm.Blues is used
     figsize : None or tuple
         Width and height of the figure
 
@@ -49,6 +48,14 @@ def plot_confusion_matrix(y_true_sorted,
     https://matplotlib.org/gallery/images_contours_and_fields/image_annotated_heatmap.html#sphx-glr-gallery-images-contours-and-fields-image-annotated-heatmap-py
     """
 
+    # Imported here as matplotlib and scikit-learn are slow to import,
+    # and are only needed when plotting
+    import matplotlib.pyplot as plt
+    from sklearn.metrics import confusion_matrix
+
+    if cmap is None:
+        cmap = plt.cm.Blues
+
     conf_mat = confusion_matrix(y_pred_sorted, y_true_sorted)
 
     class_names = set(y_pred_sorted)
@@ -101,7 +108,8 @@ def plot_confusion_matrix(y_true_sorted,
 def get_y_true_and_y_pred_sorted(model_files_dir,
                                  model_name,
                                  y_true_inv,
-                                 y_pred_inv):
+                                 y_pred_inv,
+                                 label_encoder=None):
     """
     Returns the sorted version of the ground truth and prediction
 
@@ -115,6 +123,9 @@ def get_y_true_and_y_pred_sorted(model_files_dir,
         The ground truth labels
     y_pred_inv : np.array, shape (n, n_classes)
         The predicted labels
+    label_encoder : None or OneHotEncoder
+        The label encoder of the model
+        If None, it is loaded from the model files
 
     Returns
     -------
@@ -124,8 +135,11 @@ def get_y_true_and_y_pred_sorted(model_files_dir,
         The predicted labels sorted after y_true_sorted
     """
 
-    y_true_inv = inverse_encode(y_true_inv, model_files_dir, model_name)
-    y_pred_inv = inverse_encode(y_pred_inv, model_files_dir, model_name)
+    if label_encoder is None:
+        label_encoder = load_label_encoder(model_files_dir, model_name)
+
+    y_true_inv = label_encoder.inverse_transform(y_true_inv)
+    y_pred_inv = label_encoder.inverse_transform(y_pred_inv)
 
     # Sort in alphabetical order
     y_true_sorted, y_pred_sorted =\
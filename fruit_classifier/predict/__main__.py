@@ -1,17 +1,28 @@
+import json
 import argparse
 import cv2
 import numpy as np
 from pathlib import Path
+from fruit_classifier.predict.predict_utils import BACKENDS
 from fruit_classifier.predict.predict_utils import classify_many
 from fruit_classifier.predict.predict_utils import draw_class_on_image
-from fruit_classifier.predict.predict_utils import inverse_encode
+from fruit_classifier.predict.predict_utils import format_predictions
+from fruit_classifier.predict.predict_utils import get_input_image_paths
 from fruit_classifier.predict.predict_utils import load_classifier
+from fruit_classifier.predict.predict_utils import load_label_encoder
+from fruit_classifier.predict.predict_utils import predict_image_paths
 from fruit_classifier.utils.image_utils import open_image
+from fruit_classifier.utils.profiling_utils import profiler
 from fruit_classifier.preprocessing.preprocessing_utils import \
     resize_image
 
 
-def main(image_path, model_files_dir, model_name, show_image=False):
+def main(image_path,
+         model_files_dir,
+         model_name,
+         show_image=False,
+         registry=None,
+         backend='keras'):
     """
     Predict the class of an image
 
@@ -27,6 +38,12 @@ def main(image_path, model_files_dir, model_name, show_image=False):
         model_files_dir/models/model_name/model.h5
     show_image : bool
         Whether or not to use cv2.imshow to display the image
+    registry : None or ModelRegistry
+        Registry holding the loaded models
+        If None, the model and the encoder are loaded from disk
+    backend : str
+        The backend to run the model with if no registry is given
+        See `load_classifier` for details
 
     Returns
     -------
@@ -35,17 +52,27 @@ def main(image_path, model_files_dir, model_name, show_image=False):
     """
 
     # Load the image
-    image = open_image(Path(image_path))
+    with profiler.stage('decode'):
+        image = open_image(Path(image_path))
     orig = image.copy()
 
     # Pre-process the image for classification
-    image = resize_image(image)
+    with profiler.stage('resize'):
+        image = resize_image(image)
     # Expand the dimension (i.e. make the batch size = 1)
     image = np.expand_dims(image, axis=0)
 
-    model = load_classifier(model_files_dir, model_name)
-    labels, probabilities = classify_many(model, image)
-    labels = inverse_encode(labels, model_files_dir, model_name)
+    with profiler.stage('load_classifier'):
+        if registry is None:
+            model = load_classifier(model_files_dir, model_name, backend)
+            label_encoder = load_label_encoder(model_files_dir, model_name)
+        else:
+            model, label_encoder = registry.get(model_name)
+
+    with profiler.stage('classify'):
+        labels, probabilities = classify_many(model, image)
+    with profiler.stage('inverse_encode'):
+        labels = label_encoder.inverse_transform(labels)
 
     label = labels[0]
     probability = np.max(probabilities[0])
@@ -53,7 +80,8 @@ def main(image_path, model_files_dir, model_name, show_image=False):
     probability_text = '{}: {:.2f}%'.format(label, probability * 100)
 
     # Draw the label on the image
-    output = draw_class_on_image(orig, probability_text)
+    with profiler.stage('draw'):
+        output = draw_class_on_image(orig, probability_text)
 
     if show_image:
         # Show the output image (convert from RGB to GBR)
@@ -63,6 +91,60 @@ def main(image_path, model_files_dir, model_name, show_image=False):
     return output
 
 
+def batch_main(input_path,
+               model_files_dir,
+               model_name,
+               output_path='predictions.jsonl',
+               chunk_size=256,
+               backend='keras'):
+    """
+    Predict the classes of all images in a directory or glob pattern
+
+    The model is loaded once, and the images are classified in chunks
+
+    Parameters
+    ----------
+    input_path : str
+        A directory (searched recursively) or a glob pattern
+    model_files_dir : Path
+        Directory to the model files
+    model_name : str
+        Name of model
+        Will be loaded from
+        model_files_dir/models/model_name/model.h5
+    output_path : str or Path
+        Path to the output file
+        The results are written as csv if the suffix is `.csv`, and
+        as json lines otherwise
+    chunk_size : int
+        Number of images to classify at the time
+    backend : str
+        The backend to run the model with
+        See `load_classifier` for details
+    """
+
+    image_paths = get_input_image_paths(input_path)
+    print(f'[INFO] Found {len(image_paths)} images in {input_path}')
+
+    model = load_classifier(model_files_dir, model_name, backend)
+    label_encoder = load_label_encoder(model_files_dir, model_name)
+    _, height, width, _ = model.input_shape
+
+    predictions = predict_image_paths(image_paths,
+                                      model,
+                                      label_encoder,
+                                      chunk_size=chunk_size,
+                                      height=height,
+                                      width=width)
+
+    output_path = Path(output_path)
+    output_format = 'csv' if output_path.suffix == '.csv' else 'jsonl'
+    with output_path.open('w', newline='') as f:
+        f.writelines(format_predictions(predictions, output_format))
+
+    print('[INFO] Saved to {}'.format(output_path))
+
+
 if __name__ == '__main__':
     # Construct the argument parse and parse the arguments
     parser = argparse.ArgumentParser(description='Predict the class '
@@ -70,7 +152,9 @@ if __name__ == '__main__':
     parser.add_argument('-i',
                         '--image',
                         required=True,
-                        help='Path to input image')
+                        help='Path to input image. If a directory or '
+                             'a glob pattern (in quotes) is given, all '
+                             'the matching images are classified')
     parser.add_argument('-m',
                         '--model_files_dir',
                         required=False,
@@ -80,18 +164,69 @@ if __name__ == '__main__':
                         '--model_name',
                         required=False,
                         help='Name of the resulting model')
+    parser.add_argument('-o',
+                        '--output',
+                        required=False,
+                        default='predictions.jsonl',
+                        help='Output file (.csv or .jsonl) when '
+                             'classifying several images')
+    parser.add_argument('-c',
+                        '--chunk_size',
+                        type=int,
+                        required=False,
+                        default=256,
+                        help='Number of images to classify at the time '
+                             'when classifying several images')
+    parser.add_argument('-b',
+                        '--backend',
+                        required=False,
+                        default='keras',
+                        choices=tuple(BACKENDS.keys()),
+                        help='Run the full Keras model (keras), the '
+                             'model exported to TensorFlow Lite '
+                             '(tflite) or its quantized versions')
+    parser.add_argument('-p',
+                        '--profile',
+                        nargs='?',
+                        const='profile.json',
+                        default=None,
+                        help='Record the latency of each stage of the '
+                             'prediction, print it and store it in the '
+                             'given json file (profile.json if no file '
+                             'is given)')
     args = parser.parse_args()
 
+    if args.profile is not None:
+        profiler.enabled = True
+
     if args.model_files_dir is None:
         model_files_dir_ = \
             Path(__file__).absolute().parents[2].\
             joinpath('model_files')
     else:
-        model_files_dir_ = args.model_files_dir
+        model_files_dir_ = Path(args.model_files_dir)
 
     if args.model_name is None:
         model_name_ = 'basic'
     else:
         model_name_ = args.model_name
 
-    main(args.image, model_files_dir_, model_name_, show_image=True)
+    if Path(args.image).is_file():
+        main(args.image,
+             model_files_dir_,
+             model_name_,
+             show_image=args.profile is None,
+             backend=args.backend)
+    else:
+        batch_main(args.image,
+                   model_files_dir_,
+                   model_name_,
+                   output_path=args.output,
+                   chunk_size=args.chunk_size,
+                   backend=args.backend)
+
+    if args.profile is not None:
+        profiler.print_summary()
+        with Path(args.profile).open('w') as f:
+            json.dump(profiler.get_summary(), f, indent=2)
+        print('[INFO] Saved to {}'.format(args.profile))
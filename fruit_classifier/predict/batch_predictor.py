@@ -0,0 +1,191 @@
+"""
+Contains the Batch Predictor class
+"""
+
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from fruit_classifier.predict.predict_utils import get_predictions
+from fruit_classifier.utils.profiling_utils import profiler
+
+
+class BatchPredictor(object):
+    """
+    Collects concurrent prediction requests into batches
+
+    The requests are put on a queue which is consumed by a single
+    worker thread.
+    The worker waits at most `max_wait` seconds after the first
+    request for more requests to arrive, runs one forward pass on the
+    collected batch, and hands each caller its own result.
+
+    Notes
+    -----
+    The model is both loaded and run in the worker thread, so Keras
+    models bound to the thread which created them can be used from a
+    threaded web server.
+    See
+    https://stackoverflow.com/questions/49400440/using-keras-model-in-flask-app-with-threading
+    for details
+    """
+
+    def __init__(self,
+                 registry,
+                 model_name='basic',
+                 max_batch_size=32,
+                 max_wait=0.005):
+        """
+        Sets up the predictor
+
+        Parameters
+        ----------
+        registry : ModelRegistry
+            The registry to get the model and the label encoder from
+        model_name : str
+            Name of the model
+        max_batch_size : int
+            Maximum number of images in one forward pass
+        max_wait : float
+            Maximum number of seconds to wait for a batch to fill up
+        """
+
+        self.registry = registry
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the worker thread (if not already started)
+        """
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run,
+                                                name='BatchPredictor',
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the worker thread after the queued requests are handled
+
+        Parameters
+        ----------
+        timeout : None or float
+            Number of seconds to wait for the worker thread to finish
+        """
+
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join(timeout)
+                self._thread = None
+
+    def submit(self, image):
+        """
+        Submits an image for classification
+
+        Parameters
+        ----------
+        image : np.array, shape (height, width, channels)
+            The resized image to classify
+
+        Returns
+        -------
+        future : Future
+            Future which resolves to the prediction dictionary
+            See `get_predictions` for details
+        """
+
+        self.start()
+
+        future = Future()
+        self._queue.put((image, future))
+
+        return future
+
+    def predict(self, image, timeout=None):
+        """
+        Classifies an image and waits for the result
+
+        Parameters
+        ----------
+        image : np.array, shape (height, width, channels)
+            The resized image to classify
+        timeout : None or float
+            Number of seconds to wait for the result
+
+        Returns
+        -------
+        prediction : dict
+            The prediction dictionary
+            See `get_predictions` for details
+        """
+
+        return self.submit(image).result(timeout)
+
+    def _run(self):
+        """
+        Collects and classifies batches until stopped
+        """
+
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._predict_batch(batch)
+
+    def _predict_batch(self, batch):
+        """
+        Classifies a batch and resolves the futures
+
+        Each future resolves to a prediction dictionary as returned by
+        `get_predictions`
+
+        Parameters
+        ----------
+        batch : list
+            List of tuples of (image, future)
+        """
+
+        batch = [(image, future) for image, future in batch
+                 if future.set_running_or_notify_cancel()]
+        if len(batch) == 0:
+            return
+
+        try:
+            model, label_encoder = self.registry.get(self.model_name)
+            images = np.stack([image for image, _ in batch])
+            with profiler.stage('classify_batch'):
+                predictions = get_predictions(model, label_encoder, images)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), prediction in zip(batch, predictions):
+            future.set_result(prediction)
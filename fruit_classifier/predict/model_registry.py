@@ -0,0 +1,213 @@
+"""
+Contains the Model Registry class
+"""
+
+import threading
+from pathlib import Path
+from fruit_classifier.predict.predict_utils import get_encoder_path
+from fruit_classifier.predict.predict_utils import get_model_path
+from fruit_classifier.predict.predict_utils import load_classifier
+from fruit_classifier.predict.predict_utils import load_label_encoder
+
+
+class ModelRegistry(object):
+    """
+    Keeps the models and label encoders resident in memory
+
+    Each model is loaded the first time it is requested (or when
+    calling `load`), and is kept until the model file or the encoder
+    file changes on disk.
+    A changed file triggers a reload on the next lookup.
+    If the reload fails (for example because the file is still being
+    written), the previously loaded model is kept and the reload is
+    retried on the next lookup.
+
+    The model files can also be read into memory without loading the
+    models (`preload`), which is used by the pre-forking server to
+    read the files once before forking the workers.
+    """
+
+    def __init__(self, model_files_dir, backend='keras', num_threads=None):
+        """
+        Sets up the registry
+
+        Parameters
+        ----------
+        model_files_dir : Path
+            Path to the model files directory
+        backend : str
+            The backend to run the models with
+            See `load_classifier` for details
+        num_threads : None or int
+            Number of threads of the TensorFlow Lite interpreters
+            If None, the default of the interpreter is used
+        """
+
+        self.model_files_dir = Path(model_files_dir)
+        self.backend = backend
+        self.num_threads = num_threads
+        self._entries = dict()
+        self._preloaded = dict()
+        self._lock = threading.Lock()
+
+    def get(self, model_name='basic'):
+        """
+        Returns the model and the label encoder
+
+        Parameters
+        ----------
+        model_name : str
+            Name of the model
+
+        Returns
+        -------
+        model : Sequential
+            The model to classify_many from
+        label_encoder : OneHotEncoder
+            The label encoder belonging to the model
+        """
+
+        signature = self._get_signature(model_name)
+
+        with self._lock:
+            entry = self._entries.get(model_name)
+            if entry is None or entry['signature'] != signature:
+                entry = self._load(model_name, signature, entry)
+
+        return entry['model'], entry['label_encoder']
+
+    def load(self, model_name='basic'):
+        """
+        Loads the model into the registry
+
+        Useful for loading the models at startup rather than at the
+        first lookup
+
+        Parameters
+        ----------
+        model_name : str
+            Name of the model
+        """
+
+        _ = self.get(model_name)
+
+    def preload(self, model_name='basic'):
+        """
+        Reads the model file and the label encoder into memory
+
+        The model itself is built from the bytes on the first lookup.
+        Neither Keras nor TensorFlow is imported, so the registry can
+        be preloaded in a process which forks afterwards: the forked
+        processes share the bytes through copy-on-write, and each
+        builds its own model (and TensorFlow session) from them.
+        The TensorFlow Lite backends read the weights from the bytes in
+        place, so the weights are shared as well (unless a delegate
+        repacks them).
+
+        Parameters
+        ----------
+        model_name : str
+            Name of the model
+        """
+
+        signature = self._get_signature(model_name)
+        model_path = get_model_path(self.model_files_dir,
+                                    model_name,
+                                    self.backend)
+        model_content = model_path.read_bytes()
+        label_encoder = load_label_encoder(self.model_files_dir,
+                                           model_name)
+
+        with self._lock:
+            self._preloaded[model_name] = \
+                dict(model_content=model_content,
+                     label_encoder=label_encoder,
+                     signature=signature)
+
+    def clear(self):
+        """
+        Removes all the models from the registry
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self._preloaded.clear()
+
+    def _get_signature(self, model_name):
+        """
+        Returns the modification times and sizes of the model files
+
+        Parameters
+        ----------
+        model_name : str
+            Name of the model
+
+        Returns
+        -------
+        signature : tuple
+            Tuple of (mtime_ns, size) for the model and the encoder
+        """
+
+        signature = list()
+        for path in (get_model_path(self.model_files_dir,
+                                    model_name,
+                                    self.backend),
+                     get_encoder_path(self.model_files_dir, model_name)):
+            stat = path.stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+
+        return tuple(signature)
+
+    def _load(self, model_name, signature, old_entry):
+        """
+        Loads the model and the encoder and stores them in the registry
+
+        Parameters
+        ----------
+        model_name : str
+            Name of the model
+        signature : tuple
+            The signature of the model files to be loaded
+        old_entry : dict or None
+            The currently loaded entry (if any)
+
+        Returns
+        -------
+        entry : dict
+            Dictionary containing `model`, `label_encoder` and
+            `signature`
+        """
+
+        # The preloaded files are only used if they are still up to date
+        preloaded = self._preloaded.pop(model_name, None)
+        if preloaded is not None and preloaded['signature'] != signature:
+            preloaded = None
+
+        try:
+            if preloaded is None:
+                model = load_classifier(self.model_files_dir,
+                                        model_name,
+                                        self.backend,
+                                        num_threads=self.num_threads)
+                label_encoder = load_label_encoder(self.model_files_dir,
+                                                   model_name)
+            else:
+                model = load_classifier(self.model_files_dir,
+                                        model_name,
+                                        self.backend,
+                                        preloaded['model_content'],
+                                        self.num_threads)
+                label_encoder = preloaded['label_encoder']
+        except (OSError, EOFError, ValueError) as e:
+            if old_entry is None:
+                raise
+            print(f'[WARN] Could not reload {model_name}, keeping the '
+                  f'previously loaded model: {e}')
+            return old_entry
+
+        entry = dict(model=model,
+                     label_encoder=label_encoder,
+                     signature=signature)
+        self._entries[model_name] = entry
+
+        return entry
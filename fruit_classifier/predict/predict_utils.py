@@ -1,9 +1,24 @@
+import csv
+import io
+import glob
+import json
 import pickle
 import cv2
 import numpy as np
 from pathlib import Path
-from keras.engine.saving import load_model
-from skimage.transform import resize
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    resize_image
+from fruit_classifier.utils.image_utils import decode_image
+from fruit_classifier.utils.image_utils import get_image_paths
+from fruit_classifier.utils.image_utils import normalize_images
+from fruit_classifier.utils.profiling_utils import profiler
+
+# The model file of each prediction backend
+# The quantized models are made by fruit_classifier.quantize
+BACKENDS = dict(keras='model.h5',
+                tflite='model.tflite',
+                tflite_int8='model_int8.tflite',
+                tflite_float16='model_float16.tflite')
 
 
 def draw_class_on_image(image, probability_text):
@@ -22,6 +37,8 @@ def draw_class_on_image(image, probability_text):
     output_image : np.array, shape (height, width, channels)
         The image with text
     """
+    from skimage.transform import resize
+
     orig_shape = np.array(image.shape)
     width = 400
     height = (orig_shape[1] * (width / orig_shape[0])).astype(int)
@@ -52,6 +69,7 @@ def classify_many(model, images):
         The model to predict from
     images : np.array (examples,  height, width, channels)
         The images to predict
+        uint8 images are scaled to [0, 1] as done during training
 
     Returns
     -------
@@ -62,6 +80,9 @@ def classify_many(model, images):
         encoder
     """
 
+    if images.dtype == np.uint8:
+        images = normalize_images(images)
+
     probabilities = model.predict(images)
     # Set the highest value in a row to 1, the rest to 0
     labels = (probabilities == probabilities.max(axis=1,
@@ -71,6 +92,123 @@ def classify_many(model, images):
     return labels, probabilities
 
 
+def get_predictions(model, label_encoder, images):
+    """
+    Classifies the images and returns one prediction per image
+
+    Parameters
+    ----------
+    model : Sequential
+        The model to predict from
+    label_encoder : OneHotEncoder
+        The label encoder belonging to the model
+    images : np.array (examples,  height, width, channels)
+        The images to predict
+
+    Returns
+    -------
+    predictions : list
+        List of dictionaries with the keys
+        - label: The predicted label
+        - probability: The probability of the predicted label
+        - probabilities: Dictionary of probabilities of all the labels
+    """
+
+    labels, probabilities = classify_many(model, images)
+    labels = label_encoder.inverse_transform(labels).ravel()
+    classes = label_encoder.categories_[0]
+
+    predictions = list()
+    for label, row in zip(labels, probabilities):
+        predictions.append(
+            dict(label=str(label),
+                 probability=float(np.max(row)),
+                 probabilities={str(c): float(p)
+                                for c, p in zip(classes, row)}))
+
+    return predictions
+
+
+def get_model_path(model_files_dir, model_name='basic', backend='keras'):
+    """
+    Returns the path to the stored model
+
+    Parameters
+    ----------
+    model_files_dir : Path
+        Path to the model files directory
+    model_name : str
+        Name of the model
+    backend : ["keras"|"tflite"|"tflite_int8"|"tflite_float16"]
+        The backend to run the model with (see BACKENDS)
+
+    Returns
+    -------
+    model_path : Path
+        Path to model_files_dir/models/model_name/model.h5 (or the
+        file of the backend)
+    """
+
+    if backend not in BACKENDS:
+        msg = f'{backend} is not a valid backend, choose from ' \
+              f'{tuple(BACKENDS.keys())}'
+        raise NotImplementedError(msg)
+
+    model_path = model_files_dir.joinpath('models',
+                                          model_name,
+                                          BACKENDS[backend])
+
+    return model_path
+
+
+def get_encoder_path(model_files_dir, model_name='basic'):
+    """
+    Returns the path to the stored label encoder
+
+    Parameters
+    ----------
+    model_files_dir : Path
+        Path to the model files directory
+    model_name : str
+        Name of the model
+
+    Returns
+    -------
+    encoder_path : Path
+        Path to model_files_dir/encoders/model_name/encoder.pkl
+    """
+
+    encoder_path = model_files_dir.joinpath('encoders',
+                                            model_name,
+                                            'encoder.pkl')
+
+    return encoder_path
+
+
+def load_label_encoder(model_files_dir, model_name='basic'):
+    """
+    Loads the label encoder
+
+    Parameters
+    ----------
+    model_files_dir : Path
+        Path to the model files directory
+    model_name : str
+        Name of the model
+
+    Returns
+    -------
+    label_encoder : OneHotEncoder
+        The label encoder fitted during training
+    """
+
+    encoder_path = get_encoder_path(model_files_dir, model_name)
+    with encoder_path.open('rb') as f:
+        label_encoder = pickle.load(f)
+
+    return label_encoder
+
+
 def inverse_encode(labels, model_files_dir, model_name):
     """
     Inverse encodes the labels
@@ -89,19 +227,18 @@ def inverse_encode(labels, model_files_dir, model_name):
     inverse_transformed_labels : np.array, shape (n,)
         The inverse transformed labels
     """
-    # Load the label encoder
-    encoder_path = model_files_dir.joinpath('encoders',
-                                            model_name,
-                                            'encoder.pkl')
-    with encoder_path.open('rb') as f:
-        label_encoder = pickle.load(f)
+    label_encoder = load_label_encoder(model_files_dir, model_name)
 
     inverse_transformed_labels = label_encoder.inverse_transform(labels)
 
     return inverse_transformed_labels
 
 
-def load_classifier(model_files_dir, model_name='basic'):
+def load_classifier(model_files_dir,
+                    model_name='basic',
+                    backend='keras',
+                    model_content=None,
+                    num_threads=None):
     """
     Loads the classifier
 
@@ -111,18 +248,194 @@ def load_classifier(model_files_dir, model_name='basic'):
         Path to the model files directory
     model_name : str
         Name of the model
+    backend : ["keras"|"tflite"|"tflite_int8"|"tflite_float16"]
+        The backend to run the model with
+        - keras: The full Keras model (model.h5)
+        - tflite: The model exported to TensorFlow Lite by
+          `python -m fruit_classifier.train -e` (model.tflite), which
+          loads faster, uses less memory and does not need Keras
+        - tflite_int8 and tflite_float16: The TensorFlow Lite model
+          quantized by `python -m fruit_classifier.quantize`
+    model_content : None or bytes
+        The content of the model file, if already read (see
+        `ModelRegistry.preload`)
+        If None, the model is read from model_files_dir
+    num_threads : None or int
+        Number of threads of the TensorFlow Lite interpreter
+        If None, the default of the interpreter is used
+        Not used by the keras backend
 
     Returns
     -------
-    model : Sequential
+    model : Sequential or TFLiteClassifier
         The model to classify_many from
     """
 
     print('[INFO] loading network...')
 
-    model_path = model_files_dir.joinpath('models',
-                                          model_name,
-                                          'model.h5')
-    model = load_model(str(model_path))
+    model_path = get_model_path(model_files_dir, model_name, backend)
+
+    # Imported here so that each backend only loads its own runtime
+    if backend.startswith('tflite'):
+        from fruit_classifier.predict.tflite_classifier import \
+            TFLiteClassifier
+        model = TFLiteClassifier(model_path, num_threads, model_content)
+    else:
+        from keras.engine.saving import load_model
+        if model_content is None:
+            model = load_model(str(model_path))
+        else:
+            import h5py
+            with h5py.File(io.BytesIO(model_content), 'r') as f:
+                model = load_model(f)
 
     return model
+
+
+def get_input_image_paths(input_path):
+    """
+    Returns the image paths of a directory or a glob pattern
+
+    Parameters
+    ----------
+    input_path : str or Path
+        A directory (searched recursively) or a glob pattern like
+        `data/raw/basic/**/*.jpg`
+
+    Returns
+    -------
+    image_paths : list
+        Sorted list of Paths of the image paths
+    """
+
+    if Path(input_path).is_dir():
+        return get_image_paths(Path(input_path))
+
+    image_paths = sorted(Path(p) for p in
+                         glob.glob(str(input_path), recursive=True))
+    image_paths = [p for p in image_paths if p.is_file()]
+
+    return image_paths
+
+
+def predict_image_paths(image_paths,
+                        model,
+                        label_encoder,
+                        chunk_size=256,
+                        height=28,
+                        width=28):
+    """
+    Classifies the images chunk by chunk
+
+    Only one chunk of images is held in memory at the time, and the
+    model is called once per chunk.
+    Images which can not be read are skipped.
+
+    Parameters
+    ----------
+    image_paths : list
+        List of Paths of the image paths
+    model : Sequential
+        The model to predict from
+    label_encoder : OneHotEncoder
+        The label encoder belonging to the model
+    chunk_size : int
+        Number of images to classify at the time
+    height : int
+        Height of the images fed to the model
+    width : int
+        Width of the images fed to the model
+
+    Yields
+    ------
+    prediction : dict
+        The prediction (see `get_predictions`) with the path of the
+        image stored under `image`
+    """
+
+    for start in range(0, len(image_paths), chunk_size):
+        paths = list()
+        images = list()
+        for image_path in image_paths[start:start + chunk_size]:
+            with profiler.stage('read'):
+                image_bytes = image_path.read_bytes()
+            with profiler.stage('decode'):
+                image = decode_image(image_bytes)
+            if image is None:
+                print(f'[WARN] Could not read {image_path}, skipping')
+                continue
+            paths.append(image_path)
+            with profiler.stage('resize'):
+                images.append(resize_image(image, height, width))
+
+        if len(images) == 0:
+            continue
+
+        # Timed per chunk
+        with profiler.stage('classify_chunk'):
+            predictions = get_predictions(model,
+                                          label_encoder,
+                                          np.stack(images))
+        for image_path, prediction in zip(paths, predictions):
+            yield dict(image=str(image_path), **prediction)
+
+
+def format_predictions(predictions, output_format='jsonl'):
+    """
+    Formats the predictions line by line
+
+    Parameters
+    ----------
+    predictions : iterable
+        Iterable of predictions (see `predict_image_paths`)
+    output_format : ["jsonl"|"csv"]
+        The output format
+        The csv has the columns `image`, `label`, `probability`
+        followed by one column per label
+
+    Yields
+    ------
+    line : str
+        The formatted line (including the line ending)
+    """
+
+    if output_format == 'jsonl':
+        for prediction in predictions:
+            yield json.dumps(prediction) + '\n'
+    elif output_format == 'csv':
+        header = None
+        for prediction in predictions:
+            if header is None:
+                header = ['image', 'label', 'probability',
+                          *prediction['probabilities'].keys()]
+                yield _format_csv_row(header)
+            yield _format_csv_row(
+                [prediction['image'],
+                 prediction['label'],
+                 prediction['probability'],
+                 *prediction['probabilities'].values()])
+    else:
+        msg = f'{output_format} is not a valid output format, choose ' \
+              f'from (\'jsonl\', \'csv\')'
+        raise NotImplementedError(msg)
+
+
+def _format_csv_row(row):
+    """
+    Formats a row as a csv line
+
+    Parameters
+    ----------
+    row : list
+        The values of the row
+
+    Returns
+    -------
+    line : str
+        The csv formatted line
+    """
+
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(row)
+
+    return buffer.getvalue()
@@ -0,0 +1,108 @@
+"""
+Contains the classifier running exported TensorFlow Lite models
+"""
+
+import threading
+import numpy as np
+
+
+def get_interpreter_class():
+    """
+    Returns the TensorFlow Lite interpreter class
+
+    The interpreter of the tflite_runtime package is preferred, as it
+    is a small fraction of the size of TensorFlow, which is only used
+    if tflite_runtime is not installed
+
+    Returns
+    -------
+    Interpreter : type
+        The interpreter class
+    """
+
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
+    return Interpreter
+
+
+class TFLiteClassifier(object):
+    """
+    Classifies images with an exported TensorFlow Lite model
+
+    The classifier mimics the parts of the Keras model used for
+    prediction (`predict` and `input_shape`), so it can be used
+    wherever the Keras model is used for prediction
+    """
+
+    def __init__(self, model_path=None, num_threads=None, model_content=None):
+        """
+        Loads the model
+
+        Parameters
+        ----------
+        model_path : None or Path
+            Path to the .tflite file
+            Only used if `model_content` is None
+        num_threads : None or int
+            Number of threads of the interpreter
+            If None, the default of the interpreter is used
+        model_content : None or bytes
+            The content of the .tflite file
+            The interpreter reads the weights from these bytes in
+            place, so processes forked after reading the file share the
+            weights through copy-on-write
+        """
+
+        if model_content is None:
+            kwargs = dict(model_path=str(model_path))
+        else:
+            kwargs = dict(model_content=model_content)
+        if num_threads is not None:
+            kwargs['num_threads'] = num_threads
+
+        Interpreter = get_interpreter_class()
+        self.interpreter = Interpreter(**kwargs)
+        self.interpreter.allocate_tensors()
+
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.input_shape = (None, *self.input_details['shape'][1:])
+        self._batch_size = self.input_details['shape'][0]
+
+        # The interpreter can only run one inference at the time
+        self._lock = threading.Lock()
+
+    def predict(self, x):
+        """
+        Returns the probabilities of the classes
+
+        Parameters
+        ----------
+        x : np.array, shape (n_images, height, width, channels)
+            The normalized images
+
+        Returns
+        -------
+        probabilities : np.array, shape (n_images, n_classes)
+            The probabilities of the classes
+        """
+
+        with self._lock:
+            if len(x) != self._batch_size:
+                self.interpreter.resize_tensor_input(
+                    self.input_details['index'],
+                    [len(x), *self.input_details['shape'][1:]])
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(x)
+
+            self.interpreter.set_tensor(
+                self.input_details['index'],
+                np.asarray(x, dtype=self.input_details['dtype']))
+            self.interpreter.invoke()
+
+            return self.interpreter.get_tensor(
+                self.output_details['index']).copy()
@@ -1,17 +1,19 @@
 import argparse
 from pathlib import Path
 from fruit_classifier.preprocessing.preprocessing_utils import \
-    copy_valid_images
-from fruit_classifier.preprocessing.preprocessing_utils import \
-    resize_images
+    process_images
 from fruit_classifier.utils.file_utils import truncate_filenames
 
 
-def main(dataset_name='basic', height=28, width=28):
+def main(dataset_name='basic', height=28, width=28, n_workers=None):
     """"
     Pre-processes the images in `data/raw`
 
-    The resulting images are stored in `data/interim/dataset_name`
+    The resulting images are stored in `data/interim/dataset_name`.
+    The processed images are recorded in
+    `data/interim/dataset_name.manifest.json`, so that re-runs only
+    process new or changed images, and remove the images whose raw
+    image has been deleted.
 
     Parameters
     ----------
@@ -21,24 +23,28 @@ def main(dataset_name='basic', height=28, width=28):
         Height of the resized image
     width : int
         Width of the resized image
+    n_workers : None or int
+        Number of processes used to process the images
+        If None, the number of CPUs is used
     """
 
     data_dir = \
         Path(__file__).absolute().parents[2].joinpath('data')
     raw_dir = data_dir.joinpath('raw', dataset_name)
     interim_dir = data_dir.joinpath('interim', dataset_name)
+    manifest_path = \
+        data_dir.joinpath('interim', f'{dataset_name}.manifest.json')
 
-    if not interim_dir.is_dir():
-
-        # Shorten filenames if they are so long that Windows protests
-        truncate_filenames(raw_dir)
+    # Shorten filenames if they are so long that Windows protests
+    truncate_filenames(raw_dir)
 
-        interim_dir.mkdir(parents=True, exist_ok=True)
-        copy_valid_images(raw_dir, interim_dir)
-        resize_images(interim_dir, height, width)
-    else:
-        print(f'[WARN] directory found in {interim_dir}, '
-              f'no preprocessing performed')
+    interim_dir.mkdir(parents=True, exist_ok=True)
+    process_images(raw_dir,
+                   interim_dir,
+                   height,
+                   width,
+                   n_workers=n_workers,
+                   manifest_path=manifest_path)
 
 
 if __name__ == '__main__':
@@ -50,12 +56,21 @@ if __name__ == '__main__':
                         help='Name of the resulting dataset')
     parser.add_argument('-e',
                         '--height',
+                        type=int,
                         default=28,
                         help='Height of the resized images')
     parser.add_argument('-w',
                         '--width',
+                        type=int,
                         default=28,
                         help='Width of the resized images')
+    parser.add_argument('-j',
+                        '--n_workers',
+                        type=int,
+                        required=False,
+                        default=None,
+                        help='Number of processes to use. Defaults to '
+                             'the number of CPUs')
     args = parser.parse_args()
 
     if args.dataset_name is None:
@@ -63,4 +78,4 @@ if __name__ == '__main__':
     else:
         dataset_name_ = args.dataset_name
 
-    main(dataset_name_, args.width, args.height)
+    main(dataset_name_, args.height, args.width, args.n_workers)
@@ -0,0 +1,346 @@
+"""
+Contains the batch augmentation
+"""
+
+import cv2
+import numpy as np
+
+
+class BatchAugmenter(object):
+    """
+    Randomly augments whole batches of images
+
+    The random transformations are the same as the ones of the Keras
+    ImageDataGenerator (rotation, shift, shear, zoom and horizontal
+    flip), but instead of transforming one image at the time, one
+    combined affine matrix is built for every image, and each image is
+    warped in a single bilinear OpenCV pass.
+
+    Notes
+    -----
+    The transformation parameters are drawn from the same
+    distributions as by the ImageDataGenerator, but the warped images
+    are not identical to the ones of the ImageDataGenerator:
+    - The shift ranges are always sampled uniformly, also when given
+      in pixels (the ImageDataGenerator samples integer shifts for
+      integer ranges)
+    - The images are transformed around the center of the pixel grid
+      (h / 2 - 0.5, w / 2 - 0.5), whereas the ImageDataGenerator uses
+      (h / 2 + 0.5, w / 2 + 0.5), which shifts its result by one pixel
+    - OpenCV interpolates with a fixed point precision of 1/32 pixel
+    - At the borders "wrap" and "constant" behave like the "grid-wrap"
+      and "grid-constant" modes of scipy.ndimage (used by the
+      ImageDataGenerator)
+    """
+
+    def __init__(self,
+                 rotation_range=30,
+                 width_shift_range=0.1,
+                 height_shift_range=0.1,
+                 shear_range=0.2,
+                 zoom_range=0.2,
+                 horizontal_flip=True,
+                 fill_mode='nearest',
+                 cval=0.0):
+        """
+        Sets up the augmenter
+
+        Parameters
+        ----------
+        rotation_range : int
+            Degree range for random rotations
+        width_shift_range : float
+            Fraction of total width, if < 1, or pixels if >= 1
+        height_shift_range : float
+            Fraction of total height, if < 1, or pixels if >= 1
+        shear_range : float
+            Shear angle in degrees
+        zoom_range : float or tuple
+            Range for random zoom
+            If a float, the range is [1 - zoom_range, 1 + zoom_range]
+        horizontal_flip : bool
+            Randomly flip inputs horizontally
+        fill_mode : ["constant"|"nearest"|"reflect"|"wrap"]
+            How points outside the boundaries of the input should be
+            filled
+        cval : float
+            Value used for the points outside the boundaries when
+            fill_mode is "constant"
+        """
+
+        if fill_mode not in FILL_MODES:
+            msg = f'{fill_mode} is not a valid fill mode, choose from ' \
+                  f'{tuple(FILL_MODES.keys())}'
+            raise NotImplementedError(msg)
+
+        if np.isscalar(zoom_range):
+            zoom_range = (1 - zoom_range, 1 + zoom_range)
+
+        self.rotation_range = rotation_range
+        self.width_shift_range = width_shift_range
+        self.height_shift_range = height_shift_range
+        self.shear_range = shear_range
+        self.zoom_range = tuple(zoom_range)
+        self.horizontal_flip = horizontal_flip
+        self.fill_mode = fill_mode
+        self.cval = cval
+
+    def get_config(self):
+        """
+        Returns the parameters of the augmenter
+
+        Returns
+        -------
+        config : dict
+            The parameters given to the constructor
+        """
+
+        config = dict(rotation_range=self.rotation_range,
+                      width_shift_range=self.width_shift_range,
+                      height_shift_range=self.height_shift_range,
+                      shear_range=self.shear_range,
+                      zoom_range=list(self.zoom_range),
+                      horizontal_flip=self.horizontal_flip,
+                      fill_mode=self.fill_mode,
+                      cval=self.cval)
+
+        return config
+
+    def get_random_transforms(self,
+                              n_images,
+                              height,
+                              width,
+                              random_state=None):
+        """
+        Draws random transformation parameters for a batch
+
+        Parameters
+        ----------
+        n_images : int
+            Number of images in the batch
+        height : int
+            Height of the images
+        width : int
+            Width of the images
+        random_state : None or np.random.RandomState
+            The random state to draw from
+            If None, the global numpy random state is used
+
+        Returns
+        -------
+        transforms : dict
+            Dictionary of arrays with shape (n_images,) with the keys
+            - theta: Rotation in degrees
+            - tx: Shift along the rows in pixels
+            - ty: Shift along the columns in pixels
+            - shear: Shear angle in degrees
+            - zx: Zoom along the rows
+            - zy: Zoom along the columns
+            - flip_horizontal: Whether or not to flip the image
+        """
+
+        if random_state is None:
+            random_state = np.random.mtrand._rand
+
+        def uniform(value_range, scale=1):
+            if value_range:
+                return scale * random_state.uniform(-value_range,
+                                                    value_range,
+                                                    n_images)
+            return np.zeros(n_images)
+
+        height_scale = height if self.height_shift_range < 1 else 1
+        width_scale = width if self.width_shift_range < 1 else 1
+
+        transforms = dict(
+            theta=uniform(self.rotation_range),
+            tx=uniform(self.height_shift_range, height_scale),
+            ty=uniform(self.width_shift_range, width_scale),
+            shear=uniform(self.shear_range))
+
+        if self.zoom_range[0] == 1 and self.zoom_range[1] == 1:
+            transforms['zx'] = np.ones(n_images)
+            transforms['zy'] = np.ones(n_images)
+        else:
+            transforms['zx'], transforms['zy'] = \
+                random_state.uniform(self.zoom_range[0],
+                                     self.zoom_range[1],
+                                     (2, n_images))
+
+        transforms['flip_horizontal'] = \
+            (random_state.random_sample(n_images) < 0.5) & \
+            bool(self.horizontal_flip)
+
+        return transforms
+
+    def augment(self, x_batch, random_state=None):
+        """
+        Randomly augments a batch of images
+
+        Parameters
+        ----------
+        x_batch : np.array, shape (n_images, height, width, channels)
+            The images to augment
+        random_state : None or np.random.RandomState
+            The random state to draw the transformations from
+            If None, the global numpy random state is used
+
+        Returns
+        -------
+        x_batch : np.array, shape (n_images, height, width, channels)
+            The float32 augmented images
+        """
+
+        n_images, height, width = x_batch.shape[:3]
+        transforms = self.get_random_transforms(n_images,
+                                                height,
+                                                width,
+                                                random_state)
+
+        return self.apply_transforms(x_batch, transforms)
+
+    def apply_transforms(self, x_batch, transforms):
+        """
+        Applies the transformations to a batch of images
+
+        Parameters
+        ----------
+        x_batch : np.array, shape (n_images, height, width, channels)
+            The images to transform
+        transforms : dict
+            The transformation parameters
+            See `get_random_transforms` for details
+
+        Returns
+        -------
+        x_batch : np.array, shape (n_images, height, width, channels)
+            The float32 transformed images
+        """
+
+        height, width = x_batch.shape[1:3]
+        matrices = get_transform_matrices(transforms, height, width)
+        x_batch = warp_images(x_batch,
+                              matrices,
+                              fill_mode=self.fill_mode,
+                              cval=self.cval)
+
+        flip = transforms['flip_horizontal']
+        x_batch[flip] = x_batch[flip, :, ::-1]
+
+        return x_batch
+
+
+def get_transform_matrices(transforms, height, width):
+    """
+    Returns the combined affine matrices of the transformations
+
+    The matrices are composed in the same order as by the Keras
+    ImageDataGenerator, and map output coordinates (row, column, 1) to
+    input coordinates.
+    Unlike the ImageDataGenerator, the transformations are centered at
+    the center of the pixel grid (see `BatchAugmenter`)
+
+    Parameters
+    ----------
+    transforms : dict
+        The transformation parameters
+        See `BatchAugmenter.get_random_transforms` for details
+    height : int
+        Height of the images
+    width : int
+        Width of the images
+
+    Returns
+    -------
+    matrices : np.array, shape (n_images, 3, 3)
+        The affine matrices
+    """
+
+    n_images = len(transforms['theta'])
+    theta = np.deg2rad(transforms['theta'])
+    shear = np.deg2rad(transforms['shear'])
+
+    def get_matrices():
+        return np.tile(np.eye(3), (n_images, 1, 1))
+
+    rotation = get_matrices()
+    rotation[:, 0, 0] = np.cos(theta)
+    rotation[:, 0, 1] = -np.sin(theta)
+    rotation[:, 1, 0] = np.sin(theta)
+    rotation[:, 1, 1] = np.cos(theta)
+
+    shift = get_matrices()
+    shift[:, 0, 2] = transforms['tx']
+    shift[:, 1, 2] = transforms['ty']
+
+    shearing = get_matrices()
+    shearing[:, 0, 1] = -np.sin(shear)
+    shearing[:, 1, 1] = np.cos(shear)
+
+    zoom = get_matrices()
+    zoom[:, 0, 0] = transforms['zx']
+    zoom[:, 1, 1] = transforms['zy']
+
+    # Transform around the center of the image
+    o_x = height / 2 - 0.5
+    o_y = width / 2 - 0.5
+    offset = np.array([[1, 0, o_x], [0, 1, o_y], [0, 0, 1]])
+    reset = np.array([[1, 0, -o_x], [0, 1, -o_y], [0, 0, 1]])
+
+    matrices = offset @ rotation @ shift @ shearing @ zoom @ reset
+
+    return matrices
+
+
+def warp_images(images, matrices, fill_mode='nearest', cval=0.0):
+    """
+    Warps a batch of images with bilinear interpolation
+
+    Each image is warped by a single OpenCV call with its combined
+    affine matrix
+
+    Parameters
+    ----------
+    images : np.array, shape (n_images, height, width, channels)
+        The images to warp
+    matrices : np.array, shape (n_images, 3, 3)
+        Affine matrices mapping output coordinates (row, column, 1) to
+        input coordinates
+    fill_mode : ["constant"|"nearest"|"reflect"|"wrap"]
+        How points outside the boundaries of the input should be filled
+    cval : float
+        Value used for the points outside the boundaries when fill_mode
+        is "constant"
+
+    Returns
+    -------
+    warped : np.array, shape (n_images, height, width, channels)
+        The float32 warped images
+    """
+
+    height, width = images.shape[1:3]
+    images = images.astype('float32', copy=False)
+    warped = np.empty(images.shape, 'float32')
+
+    # OpenCV uses (column, row) coordinates
+    swap = np.array([[0, 1, 0], [1, 0, 0], [0, 0, 1]])
+    matrices = swap @ matrices @ swap
+
+    for i, (image, matrix) in enumerate(zip(images, matrices)):
+        warped_image = \
+            cv2.warpAffine(image,
+                           matrix[:2],
+                           (width, height),
+                           flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                           borderMode=FILL_MODES[fill_mode],
+                           borderValue=(cval,) * 4)
+        # OpenCV drops the channel axis of single channel images
+        warped[i] = warped_image.reshape(warped[i].shape)
+
+    return warped
+
+
+FILL_MODES = dict(nearest=cv2.BORDER_REPLICATE,
+                  reflect=cv2.BORDER_REFLECT,
+                  wrap=cv2.BORDER_WRAP,
+                  constant=cv2.BORDER_CONSTANT)
@@ -1,16 +1,16 @@
 import cv2
+import json
 import imghdr
-from keras.preprocessing.image import ImageDataGenerator
-from tqdm import tqdm
-from skimage.transform import resize
-from skimage.io import imsave
-from pathlib import Path
+from functools import partial
+from fruit_classifier.preprocessing.augmentation import BatchAugmenter
 from fruit_classifier.utils.file_utils import copytree
+from fruit_classifier.utils.image_utils import decode_image
 from fruit_classifier.utils.image_utils import get_image_paths, \
     open_image
+from fruit_classifier.utils.parallel_utils import parallel_map
 
 
-def copy_valid_images(raw_dir, interim_dir):
+def copy_valid_images(raw_dir, interim_dir, n_workers=None, chunk_size=16):
     """
     Removes images which are not readable
 
@@ -20,35 +20,370 @@ def copy_valid_images(raw_dir, interim_dir):
         Path to the raw dataset
     interim_dir : Path
         Path for the cleaned dataset
+    n_workers : None or int
+        Number of processes used to check the images
+        If None, the number of CPUs is used
+    chunk_size : int
+        Number of images sent to a process at the time
     """
 
     copytree(raw_dir, interim_dir)
 
     # Find all image_paths
-    image_paths = sorted(interim_dir.glob('**/*'))
-    image_paths = [image_path for image_path in image_paths if
-                   image_path.is_file()]
+    image_paths = get_image_paths(interim_dir)
 
-    for image_path in tqdm(image_paths, desc='Checking images'):
-        image = cv2.imread(str(image_path))
+    removed = parallel_map(remove_unreadable_image,
+                           image_paths,
+                           n_workers=n_workers,
+                           chunk_size=chunk_size,
+                           desc='Checking images')
 
-        if image is None:
-            print('Un-linking {}'.format(image_path))
-            image_path.unlink()
+    for image_path, is_removed in zip(image_paths, removed):
+        if is_removed:
+            print('Un-linked {}'.format(image_path))
+
+    print_cleaning_summary(raw_dir, interim_dir)
+
+
+def print_cleaning_summary(raw_dir, interim_dir):
+    """
+    Prints how many images of each class survived the cleaning
+
+    Parameters
+    ----------
+    raw_dir : Path
+        Path to the raw dataset
+    interim_dir : Path
+        Path for the cleaned dataset
+    """
 
     raw_dirs = sorted(raw_dir.glob('*'))
     raw_dirs = [d for d in raw_dirs if d.is_dir()]
 
-    interim_dirs = sorted(interim_dir.glob('*'))
-    interim_dirs = [d for d in interim_dirs if d.is_dir()]
-
     print('\nResult of cleaning:')
-    for r, c in zip(raw_dirs, interim_dirs):
+    for r in raw_dirs:
+        c = interim_dir.joinpath(r.name)
         n_raw = len(list(r.glob('*')))
-        n_clean = len(list(c.glob('*')))
+        n_clean = len(list(c.glob('*'))) if c.is_dir() else 0
         print('    {}/{} remaining in {}'.format(n_clean, n_raw, c))
 
 
+def process_images(raw_dir,
+                   interim_dir,
+                   height=28,
+                   width=28,
+                   n_workers=None,
+                   chunk_size=16,
+                   manifest_path=None):
+    """
+    Validates and resizes the raw images in a single pass
+
+    Each raw image is read and decoded once, resized in memory, and
+    only the resized image is written to `interim_dir`.
+    Images which can not be decoded are skipped.
+
+    If a manifest is given, only the raw images which are new or have
+    changed since the last run are processed, and the processed images
+    whose raw image has been deleted are removed.
+
+    Parameters
+    ----------
+    raw_dir : Path
+        Path to the raw dataset
+    interim_dir : Path
+        Path for the cleaned and resized dataset
+    height : int
+        Height of the resized images
+    width : int
+        Width of the resized images
+    n_workers : None or int
+        Number of processes used to process the images
+        If None, the number of CPUs is used
+    chunk_size : int
+        Number of images sent to a process at the time
+    manifest_path : None or Path
+        Path to the manifest of the processed images
+        The manifest is updated after processing
+        If None, all the images are processed
+
+    Returns
+    -------
+    manifest : dict
+        The manifest entries keyed by the path of the raw image
+        relative to `raw_dir`
+        See `get_manifest_entry` for details
+    """
+
+    if manifest_path is not None:
+        old_manifest = load_manifest(manifest_path)
+    else:
+        old_manifest = dict()
+
+    manifest = dict()
+    raw_paths = list()
+    for raw_path in get_image_paths(raw_dir):
+        key = raw_path.relative_to(raw_dir).as_posix()
+        entry = get_manifest_entry(raw_path, key, height, width)
+        old_entry = old_manifest.pop(key, None)
+
+        if old_entry is not None:
+            is_output_present = \
+                old_entry['output'] is None or \
+                interim_dir.joinpath(old_entry['output']).is_file()
+            if old_entry == dict(entry, output=old_entry['output']) \
+                    and is_output_present:
+                manifest[key] = old_entry
+                continue
+            remove_output(interim_dir, old_entry)
+
+        manifest[key] = entry
+        raw_paths.append(raw_path)
+
+    # The remaining entries belong to deleted raw images
+    for old_entry in old_manifest.values():
+        remove_output(interim_dir, old_entry)
+
+    save_paths = [interim_dir.joinpath(p.relative_to(raw_dir))
+                  for p in raw_paths]
+
+    save_paths = parallel_map(partial(process_image_file,
+                                      height=height,
+                                      width=width),
+                              list(zip(raw_paths, save_paths)),
+                              n_workers=n_workers,
+                              chunk_size=chunk_size,
+                              desc='Processing images')
+
+    for raw_path, save_path in zip(raw_paths, save_paths):
+        key = raw_path.relative_to(raw_dir).as_posix()
+        if save_path is None:
+            print('Skipped unreadable {}'.format(raw_path))
+        else:
+            manifest[key]['output'] = \
+                save_path.relative_to(interim_dir).as_posix()
+
+    print(f'[INFO] Processed {len(raw_paths)} new or changed images, '
+          f'removed {len(old_manifest)} deleted images, '
+          f'{len(manifest) - len(raw_paths)} images were up to date')
+
+    if manifest_path is not None:
+        store_manifest(manifest, manifest_path)
+
+    print_cleaning_summary(raw_dir, interim_dir)
+
+    return manifest
+
+
+def get_manifest_entry(raw_path, key, height=28, width=28):
+    """
+    Returns the manifest entry of a raw image
+
+    Parameters
+    ----------
+    raw_path : Path
+        The path to the raw image
+    key : str
+        The path of the raw image relative to the raw dataset
+    height : int
+        Height of the resized image
+    width : int
+        Width of the resized image
+
+    Returns
+    -------
+    entry : dict
+        Dictionary with the keys
+        - source: The path of the raw image relative to the raw dataset
+        - size: The file size of the raw image
+        - mtime_ns: The modification time of the raw image
+        - height: Height of the resized image
+        - width: Width of the resized image
+        - output: The path of the processed image relative to the
+          interim dataset (None if not processed or unreadable)
+    """
+
+    stat = raw_path.stat()
+
+    entry = dict(source=key,
+                 size=stat.st_size,
+                 mtime_ns=stat.st_mtime_ns,
+                 height=height,
+                 width=width,
+                 output=None)
+
+    return entry
+
+
+def remove_output(interim_dir, entry):
+    """
+    Removes the processed image of a manifest entry (if any)
+
+    Parameters
+    ----------
+    interim_dir : Path
+        Path to the cleaned and resized dataset
+    entry : dict
+        The manifest entry
+    """
+
+    if entry['output'] is not None:
+        output_path = interim_dir.joinpath(entry['output'])
+        if output_path.is_file():
+            output_path.unlink()
+
+
+def load_manifest(manifest_path):
+    """
+    Loads the manifest
+
+    Parameters
+    ----------
+    manifest_path : Path
+        Path to the manifest
+
+    Returns
+    -------
+    manifest : dict
+        The manifest entries keyed by the path of the raw image
+        relative to the raw dataset
+        Empty if the manifest does not exist
+    """
+
+    if not manifest_path.is_file():
+        return dict()
+
+    with manifest_path.open('r') as f:
+        manifest = json.load(f)
+
+    return manifest['images']
+
+
+def store_manifest(manifest, manifest_path):
+    """
+    Stores the manifest
+
+    The manifest is first written to a temporary file, so that an
+    interrupted run does not leave a corrupt manifest behind
+
+    Parameters
+    ----------
+    manifest : dict
+        The manifest entries keyed by the path of the raw image
+        relative to the raw dataset
+    manifest_path : Path
+        Path to the manifest
+    """
+
+    tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with tmp_path.open('w') as f:
+        json.dump(dict(version=1, images=manifest), f, indent=1)
+    tmp_path.replace(manifest_path)
+
+    print('[INFO] Saved to {}'.format(manifest_path))
+
+
+def process_image_file(paths, height=28, width=28):
+    """
+    Reads, validates, resizes and stores a single image
+
+    Parameters
+    ----------
+    paths : tuple
+        Tuple of (raw_path, save_path) where raw_path is the Path of
+        the raw image and save_path is the Path to store the resized
+        image to
+        The extension of save_path is changed if it does not match the
+        image type
+    height : int
+        Height of the resized image
+    width : int
+        Width of the resized image
+
+    Returns
+    -------
+    save_path : None or Path
+        The path of the resized image
+        None if the image is empty or could not be decoded
+    """
+
+    raw_path, save_path = paths
+
+    image_bytes = raw_path.read_bytes()
+    if len(image_bytes) == 0:
+        return None
+    image_array = decode_image(image_bytes)
+    if image_array is None:
+        return None
+
+    resized_array = resize_image(image_array, height, width)
+    save_path = get_save_path(save_path,
+                              imghdr.what(None, h=image_bytes))
+
+    # Imported here as skimage.io is slow to import, and is not needed
+    # when only resizing images for prediction
+    from skimage.io import imsave
+
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    imsave(save_path, resized_array)
+
+    return save_path
+
+
+def get_save_path(image_path, image_type):
+    """
+    Returns the path with an extension matching the image type
+
+    imsave is sensitive to the file extension, so the extension must
+    match the image type
+
+    Parameters
+    ----------
+    image_path : Path
+        The path to the image
+    image_type : None or str
+        The image type as returned by imghdr.what
+        Images of unknown type are stored as png
+
+    Returns
+    -------
+    save_path : Path
+        The path with the correct extension
+    """
+
+    extension = f'.{image_type}' if image_type is not None else '.png'
+    if extension == image_path.suffix:
+        save_path = image_path
+    else:
+        save_path = \
+            image_path.parent.joinpath(image_path.stem + extension)
+
+    return save_path
+
+
+def remove_unreadable_image(image_path):
+    """
+    Un-links the image if it can not be read
+
+    Parameters
+    ----------
+    image_path : Path
+        The path to the image
+
+    Returns
+    -------
+    bool
+        Whether or not the image was un-linked
+    """
+
+    image = cv2.imread(str(image_path))
+
+    if image is None:
+        image_path.unlink()
+        return True
+
+    return False
+
+
 def resize_image(image, height=28, width=28):
     """
     Resize a single image
@@ -68,6 +403,10 @@ def resize_image(image, height=28, width=28):
         The resized image
     """
 
+    # Imported here as skimage.transform loads scipy, which slows down
+    # the start of the entry points not resizing any images
+    from skimage.transform import resize
+
     resized_image = resize(image,
                            output_shape=(height, width),
                            mode='reflect',
@@ -76,7 +415,7 @@ def resize_image(image, height=28, width=28):
     return resized_image.astype('uint8')
 
 
-def resize_images(path, height=28, width=28):
+def resize_images(path, height=28, width=28, n_workers=None, chunk_size=16):
     """
     Overwrites the images in `path` with the resized version
 
@@ -88,25 +427,51 @@ def resize_images(path, height=28, width=28):
         Height of the resized images
     width : int
         Width of the resized images
+    n_workers : None or int
+        Number of processes used to resize the images
+        If None, the number of CPUs is used
+    chunk_size : int
+        Number of images sent to a process at the time
     """
     image_paths = get_image_paths(path)
 
-    for image_path in tqdm(image_paths, desc='Resizing images'):
-        tqdm.write(str(image_path))
-        image_array = open_image(image_path)
-        resized_array = resize_image(image_array, height, width)
-        # Determine image type as imsave is sensitive to the file
-        # extension
-        extension = imghdr.what(image_path)
-        extension = f'.{extension}' if extension is not None else '.png'
-        if extension == image_path.suffix:
-            save_path = image_path
-        else:
-            save_path = \
-                image_path.parent.joinpath(image_path.stem + extension)
-            image_path.unlink()
+    parallel_map(partial(resize_image_file, height=height, width=width),
+                 image_paths,
+                 n_workers=n_workers,
+                 chunk_size=chunk_size,
+                 desc='Resizing images')
+
+
+def resize_image_file(image_path, height=28, width=28):
+    """
+    Overwrites the image with the resized version
+
+    Parameters
+    ----------
+    image_path : Path
+        The path to the image
+    height : int
+        Height of the resized image
+    width : int
+        Width of the resized image
+
+    Returns
+    -------
+    save_path : Path
+        The path of the resized image
+        The extension is changed if it does not match the image type
+    """
 
-        imsave(save_path, resized_array)
+    image_array = open_image(image_path)
+    resized_array = resize_image(image_array, height, width)
+    save_path = get_save_path(image_path, imghdr.what(image_path))
+    if save_path != image_path:
+        image_path.unlink()
+
+    from skimage.io import imsave
+    imsave(save_path, resized_array)
+
+    return save_path
 
 
 def get_image_generator(rotation_range=30,
@@ -142,6 +507,10 @@ def get_image_generator(rotation_range=30,
         Generator used for batches
     """
 
+    # Imported here as Keras (and TensorFlow) is slow to import, and is
+    # only needed when training
+    from keras.preprocessing.image import ImageDataGenerator
+
     image_generator =\
         ImageDataGenerator(rotation_range=rotation_range,
                            width_shift_range=width_shift_range,
@@ -152,3 +521,52 @@ def get_image_generator(rotation_range=30,
                            fill_mode=fill_mode)
 
     return image_generator
+
+
+def get_batch_augmenter(rotation_range=30,
+                        width_shift_range=0.1,
+                        height_shift_range=0.1,
+                        shear_range=0.2,
+                        zoom_range=0.2,
+                        horizontal_flip=True,
+                        fill_mode='nearest'):
+    """
+    Returns the vectorized batch augmenter
+
+    The augmentation is equivalent to the one of the image generator
+    returned by `get_image_generator`, but whole batches are warped at
+    once
+
+    Parameters
+    ----------
+    rotation_range : int
+        Degree range for random rotations
+    width_shift_range : float
+        Fraction of total width, if < 1, or pixels if >= 1
+    height_shift_range : float
+        Fraction of total height, if < 1, or pixels if >= 1
+    shear_range : float
+        Shear intensity
+    zoom_range : float
+        Range for random zoom
+    horizontal_flip : bool
+        Randomly flip inputs horizontally
+    fill_mode : ["constant"|"nearest"|"reflect"|"wrap"]
+        How points outside the boundaries of the input should be filled
+
+    Returns
+    -------
+    batch_augmenter : BatchAugmenter
+        Augmenter used for batches
+    """
+
+    batch_augmenter = \
+        BatchAugmenter(rotation_range=rotation_range,
+                       width_shift_range=width_shift_range,
+                       height_shift_range=height_shift_range,
+                       shear_range=shear_range,
+                       zoom_range=zoom_range,
+                       horizontal_flip=horizontal_flip,
+                       fill_mode=fill_mode)
+
+    return batch_augmenter
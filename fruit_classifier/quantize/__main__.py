@@ -0,0 +1,179 @@
+import json
+import argparse
+from pathlib import Path
+from fruit_classifier.predict.predict_utils import get_model_path
+from fruit_classifier.predict.predict_utils import load_classifier
+from fruit_classifier.predict.predict_utils import load_label_encoder
+from fruit_classifier.quantize.quantize_utils import QUANTIZATION_MODES
+from fruit_classifier.quantize.quantize_utils import evaluate_classifier
+from fruit_classifier.quantize.quantize_utils import get_calibration_data
+from fruit_classifier.quantize.quantize_utils import quantize_model
+from fruit_classifier.train.train_utils import is_data_sets_stored
+from fruit_classifier.train.train_utils import load_data_sets
+
+
+def main(dataset_name='basic',
+         model_name='basic',
+         mode='int8',
+         n_calibration=100):
+    """
+    Quantizes a trained model and compares it to the float model
+
+    This method will
+    1. Load the data sets stored in `data/processed/dataset_name`
+    2. Evaluate the float Keras model on the test set
+    3. Quantize the model with a random subset of the training set as
+       calibration data
+    4. Compare the accuracy and throughput on the test set of the
+       quantized model to the float model
+
+    The quantized model is stored in
+    model_files/models/model_name/model_<mode>.tflite, and is used by
+    the prediction backend tflite_<mode>.
+    The comparison is stored in
+    model_files/models/model_name/quantization_<mode>.json
+
+    Parameters
+    ----------
+    dataset_name : str
+        Dataset the model was trained on
+        The data sets must have been stored by training with the
+        "processed" data source
+    model_name : str
+        Name of the model to quantize
+    mode : ["int8"|"float16"]
+        The quantization mode
+        See `quantize_model` for details
+    n_calibration : int
+        Number of training images to calibrate the int8 quantization
+        with
+
+    Returns
+    -------
+    report : dict
+        The accuracies and throughputs of the float and quantized
+        models, the `accuracy_delta` and the sizes of the quantized
+        and the float model files
+    """
+
+    if mode not in QUANTIZATION_MODES:
+        msg = f'{mode} is not a valid quantization mode, choose from ' \
+              f'{QUANTIZATION_MODES}'
+        raise NotImplementedError(msg)
+
+    root_dir = Path(__file__).absolute().parents[2]
+    processed_dir = root_dir.joinpath('data', 'processed', dataset_name)
+    model_files_dir = root_dir.joinpath('model_files')
+
+    if not is_data_sets_stored(processed_dir):
+        msg = f'No data sets stored in {processed_dir}, train with ' \
+              f'`python -m fruit_classifier.train -d {dataset_name}` ' \
+              f'first'
+        raise FileNotFoundError(msg)
+
+    x_train, _, x_test, _, _, y_test = load_data_sets(processed_dir)
+
+    model = load_classifier(model_files_dir, model_name)
+    label_encoder = load_label_encoder(model_files_dir, model_name)
+    model_path = get_model_path(model_files_dir, model_name)
+
+    # The float model is evaluated before the conversion, so that its
+    # accuracy does not depend on the state the converter leaves the
+    # session in
+    float_accuracy, float_speed = \
+        evaluate_classifier(model,
+                            x_test,
+                            y_test,
+                            model_files_dir,
+                            model_name,
+                            label_encoder)
+
+    print(f'[INFO] Quantizing {model_name} to {mode}...')
+    calibration_data = get_calibration_data(x_train, n_calibration)
+    quantized_path = quantize_model(model,
+                                    model_path,
+                                    mode,
+                                    calibration_data)
+    quantized_model = load_classifier(model_files_dir,
+                                      model_name,
+                                      f'tflite_{mode}')
+
+    quantized_accuracy, quantized_speed = \
+        evaluate_classifier(quantized_model,
+                            x_test,
+                            y_test,
+                            model_files_dir,
+                            model_name,
+                            label_encoder)
+
+    # The float TensorFlow Lite export holds the same operations
+    # without the optimizer state of the Keras model, so it is a fair
+    # comparison of the sizes
+    float_path = get_model_path(model_files_dir, model_name, 'tflite')
+    if not float_path.is_file():
+        float_path = model_path
+
+    report = dict(mode=mode,
+                  n_calibration=len(calibration_data),
+                  n_test=len(x_test),
+                  float_accuracy=float_accuracy,
+                  quantized_accuracy=quantized_accuracy,
+                  accuracy_delta=quantized_accuracy - float_accuracy,
+                  float_images_per_sec=float_speed,
+                  quantized_images_per_sec=quantized_speed,
+                  float_model=float_path.name,
+                  float_size_bytes=float_path.stat().st_size,
+                  quantized_size_bytes=quantized_path.stat().st_size)
+
+    print(f'[INFO] Accuracy on {len(x_test)} test images: '
+          f'{float_accuracy:.4f} (float), '
+          f'{quantized_accuracy:.4f} ({mode}), '
+          f'delta {report["accuracy_delta"]:+.4f}')
+    print(f'[INFO] Throughput: {float_speed:.1f} images/s (float), '
+          f'{quantized_speed:.1f} images/s ({mode})')
+    print(f'[INFO] Size: {report["float_size_bytes"] / 1024:.1f} kB '
+          f'(float), {report["quantized_size_bytes"] / 1024:.1f} kB '
+          f'({mode})')
+
+    report_path = model_path.with_name(f'quantization_{mode}.json')
+    with report_path.open('w') as f:
+        json.dump(report, f, indent=2)
+    print('[INFO] Saved to {}'.format(report_path))
+
+    return report
+
+
+if __name__ == '__main__':
+    # Construct the argument parse and parse the arguments
+    parser = argparse.ArgumentParser(description='Quantize a model')
+    parser.add_argument('-d',
+                        '--dataset_name',
+                        required=False,
+                        default='basic',
+                        help='Name of the dataset the model was '
+                             'trained on')
+    parser.add_argument('-m',
+                        '--model_name',
+                        required=False,
+                        default='basic',
+                        help='Name of the model to quantize')
+    parser.add_argument('-q',
+                        '--mode',
+                        required=False,
+                        default='int8',
+                        choices=QUANTIZATION_MODES,
+                        help='The quantization mode')
+    parser.add_argument('-c',
+                        '--n_calibration',
+                        required=False,
+                        default=100,
+                        type=int,
+                        help='Number of training images to calibrate '
+                             'the int8 quantization with')
+
+    args = parser.parse_args()
+
+    main(args.dataset_name,
+         args.model_name,
+         args.mode,
+         args.n_calibration)
@@ -0,0 +1,174 @@
+import time
+import numpy as np
+from sklearn.metrics import accuracy_score
+from fruit_classifier.evaluate.evaluate import \
+    get_y_true_and_y_pred_sorted
+from fruit_classifier.predict.predict_utils import classify_many
+from fruit_classifier.train.export_utils import get_tflite_converter
+from fruit_classifier.utils.image_utils import normalize_images
+
+QUANTIZATION_MODES = ('int8', 'float16')
+
+
+def get_calibration_data(x, n_images=100, seed=42):
+    """
+    Returns a random subset of the images to calibrate the quantization
+
+    Parameters
+    ----------
+    x : np.array, shape (n_images, height, width, channels)
+        The uint8 images to sample from
+    n_images : int
+        Number of images in the subset
+    seed : int
+        Seed of the subset
+
+    Returns
+    -------
+    calibration_data : np.array, shape (n_images, height, width, channels)
+        The float32 images scaled to [0, 1] as during training
+    """
+
+    random_state = np.random.RandomState(seed)
+    n_images = min(n_images, len(x))
+    # Sorted indices read memory mapped data sequentially
+    indices = np.sort(random_state.choice(len(x), n_images, replace=False))
+
+    return normalize_images(np.asarray(x[indices]))
+
+
+def get_quantized_path(model_path, mode='int8'):
+    """
+    Returns the path of the quantized model
+
+    Parameters
+    ----------
+    model_path : Path
+        Path to the stored Keras model
+    mode : ["int8"|"float16"]
+        The quantization mode
+
+    Returns
+    -------
+    quantized_path : Path
+        Path to model_<mode>.tflite next to the Keras model
+    """
+
+    return model_path.with_name(f'model_{mode}.tflite')
+
+
+def quantize_model(model, model_path, mode='int8', calibration_data=None):
+    """
+    Quantizes the model with TensorFlow Lite post-training quantization
+
+    - int8: The weights and activations are quantized to 8 bits
+      integers, where the ranges of the activations are calibrated on
+      `calibration_data`
+    - float16: The weights are stored as 16 bits floats
+
+    The inputs and outputs of the quantized model stay float32, so it
+    is run exactly as the float model by `TFLiteClassifier`
+
+    Parameters
+    ----------
+    model : Sequential
+        The model to quantize
+    model_path : Path
+        Path to the stored Keras model
+    mode : ["int8"|"float16"]
+        The quantization mode
+    calibration_data : None or np.array
+        The normalized float32 images to calibrate with, as returned by
+        `get_calibration_data`
+        Required for int8 quantization
+
+    Returns
+    -------
+    quantized_path : Path
+        Path to the quantized model
+    """
+
+    # Imported here as TensorFlow is only needed when converting
+    import tensorflow as tf
+
+    converter = get_tflite_converter(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if mode == 'int8':
+        if calibration_data is None:
+            raise ValueError('int8 quantization needs calibration data')
+
+        def representative_dataset():
+            for image in calibration_data:
+                yield [image[np.newaxis].astype('float32')]
+
+        converter.representative_dataset = representative_dataset
+        # Fail rather than silently keeping float operations
+        converter.target_spec.supported_ops = \
+            [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        msg = f'{mode} is not a valid quantization mode, choose from ' \
+              f'{QUANTIZATION_MODES}'
+        raise NotImplementedError(msg)
+
+    quantized_path = get_quantized_path(model_path, mode)
+    quantized_path.write_bytes(converter.convert())
+    print('[INFO] Saved to {}'.format(quantized_path))
+
+    return quantized_path
+
+
+def evaluate_classifier(model,
+                        x_test,
+                        y_test,
+                        model_files_dir,
+                        model_name,
+                        label_encoder=None):
+    """
+    Returns the accuracy and the throughput of a classifier
+
+    Parameters
+    ----------
+    model : Sequential or TFLiteClassifier
+        The model to evaluate
+    x_test : np.array, shape (n_test, height, width, channels)
+        The uint8 test images
+    y_test : np.array, shape (n_test, n_classes)
+        The encoded test labels
+    model_files_dir : Path
+        Path to the model_files
+    model_name : str
+        Name of the model
+    label_encoder : None or OneHotEncoder
+        The label encoder of the model
+        If None, it is loaded from the model files
+
+    Returns
+    -------
+    accuracy : float
+        The accuracy on the test set
+    images_per_second : float
+        The number of classified images per second
+    """
+
+    x_test = np.asarray(x_test)
+
+    # Warm up, so that the first call does not count
+    classify_many(model, x_test[:1])
+
+    start = time.perf_counter()
+    y_pred, _ = classify_many(model, x_test)
+    seconds = time.perf_counter() - start
+
+    y_true_sorted, y_pred_sorted = \
+        get_y_true_and_y_pred_sorted(model_files_dir,
+                                     model_name,
+                                     y_test,
+                                     y_pred,
+                                     label_encoder=label_encoder)
+
+    accuracy = accuracy_score(y_true_sorted, y_pred_sorted)
+
+    return accuracy, len(x_test) / seconds
@@ -3,27 +3,137 @@ import random
 import json
 from pathlib import Path
 from fruit_classifier.utils.image_utils import get_image_paths
+from fruit_classifier.train.augmentation_cache import \
+    get_augmentation_cache
+from fruit_classifier.train.callbacks import ThroughputMonitor
+from fruit_classifier.train.train_utils import get_directory_data
 from fruit_classifier.train.train_utils import get_processed_data
 from fruit_classifier.train.train_utils import get_model
 from fruit_classifier.train.train_utils import train_model
+from fruit_classifier.train.train_utils import plot_throughput
 from fruit_classifier.train.train_utils import plot_training
 from fruit_classifier.preprocessing.preprocessing_utils import \
-    get_image_generator
+    get_batch_augmenter
+
+
+def get_data(dataset_name='basic',
+             model_name='basic',
+             data_source='processed'):
+    """
+    Returns the training, validation and test sets
+
+    Parameters
+    ----------
+    dataset_name : str
+        Dataset to train from
+    model_name : str
+        Name of model (the label encoder is stored for this model)
+    data_source : ["processed"|"directory"]
+        Where to read the training images from
+        See `main` for details
+
+    Returns
+    -------
+    x_train : np.array
+        The uint8 training images (or their Paths)
+    x_val : np.array
+        The uint8 validation images (or their Paths)
+    x_test : np.array, shape (n_test, height, width, channels)
+        The uint8 test images
+    y_train : np.array, shape (n_train, n_classes)
+        The encoded training labels
+    y_val : np.array, shape (n_val, n_classes)
+        The encoded validation labels
+    y_test : np.array, shape (n_test, n_classes)
+        The encoded test labels
+    """
+
+    root_dir = Path(__file__).absolute().parents[2]
+    data_dir = root_dir.joinpath('data')
+    interim_dir = data_dir.joinpath('interim', dataset_name)
+    processed_dir = data_dir.joinpath('processed', dataset_name)
+    model_files_dir = root_dir.joinpath('model_files')
+
+    # Grab the image paths and randomly shuffle them
+    image_paths = get_image_paths(interim_dir)
+    random.seed(42)
+    random.shuffle(image_paths)
+
+    if data_source == 'processed':
+        data_sets = get_processed_data(image_paths,
+                                       model_files_dir,
+                                       model_name,
+                                       processed_dir)
+    elif data_source == 'directory':
+        data_sets = \
+            get_directory_data(image_paths, model_files_dir, model_name)
+    else:
+        msg = f'{data_source} is not a valid data source, choose ' \
+              f'from (\'processed\', \'directory\')'
+        raise NotImplementedError(msg)
+
+    return data_sets
+
+
+def get_augmentation(dataset_name, x_train, augmentation_cache_epochs=0):
+    """
+    Returns the batch augmenter and the augmentation cache
+
+    Parameters
+    ----------
+    dataset_name : str
+        Dataset to train from
+    x_train : np.array
+        The uint8 training images (or their Paths)
+    augmentation_cache_epochs : int
+        Number of augmented epochs to precompute
+        See `main` for details
+
+    Returns
+    -------
+    image_generator : BatchAugmenter
+        The augmenter for the training images
+    augmentation_cache : None or np.memmap
+        The augmented epochs if augmentation_cache_epochs > 0
+    """
+
+    image_generator = get_batch_augmenter()
+
+    if augmentation_cache_epochs > 0:
+        cache_dir = Path(__file__).absolute().parents[2].joinpath(
+            'data', 'processed', dataset_name, 'augmentation_cache')
+        augmentation_cache = \
+            get_augmentation_cache(x_train,
+                                   image_generator,
+                                   cache_dir,
+                                   augmentation_cache_epochs)
+    else:
+        augmentation_cache = None
+
+    return image_generator, augmentation_cache
 
 
 def main(dataset_name='basic',
          model_name='basic',
          model_setup=None,
-         optimizer_setup=None):
+         optimizer_setup=None,
+         data_source='processed',
+         workers=1,
+         use_multiprocessing=False,
+         augmentation_cache_epochs=0,
+         callbacks=None,
+         export=False):
     """
     This is the main module for training the fruit-classifier
 
     This method will
-    1. Load all the images from the 'interim' directory
+    1. Load the images from the 'interim' directory (or from the
+       data sets stored in the 'processed' directory)
     2. Split the data in train and validate
     3. Initialize a model
     4. Train the model
-    5. Plot the training
+    5. Plot the training, and the time spent waiting for data and in
+       the training steps of each epoch
 
     Parameters
     ----------
@@ -46,6 +156,31 @@ def main(dataset_name='basic',
         Dictionary for optimizer setup.
         See input parameters of
         fruit_classifier.train.train_utils.get_model for details
+    data_source : ["processed"|"directory"]
+        Where to read the training images from
+        - processed: Memory mapped data sets stored in
+          data/processed/dataset_name (created on the first run)
+        - directory: The training and validation images are read
+          lazily from data/interim/dataset_name, so the dataset does
+          not need to fit in memory
+    workers : int
+        Number of threads (or processes) reading and augmenting the
+        batches
+    use_multiprocessing : bool
+        Whether to read and augment the batches in processes instead of
+        threads
+    augmentation_cache_epochs : int
+        If larger than 0, this number of augmented epochs is
+        precomputed (or reused if already computed for the same data,
+        augmentation and seed) in
+        data/processed/dataset_name/augmentation_cache, and the
+        training cycles through them instead of augmenting on the fly
+    callbacks : None or list
+        Keras callbacks to apply during training
+    export : bool
+        Whether to also export the model to TensorFlow Lite in
+        model_files/models/model_name/model.tflite, which is used by
+        the tflite prediction backend
 
     Returns
     -------
@@ -62,31 +197,16 @@ def main(dataset_name='basic',
     """
 
     root_dir = Path(__file__).absolute().parents[2]
-    data_dir = root_dir.joinpath('data')
-    interim_dir = data_dir.joinpath('interim', dataset_name)
-    processed_dir = data_dir.joinpath('processed', dataset_name)
     model_files_dir = root_dir.joinpath('model_files')
     plot_dir = root_dir.joinpath('reports', 'figures', model_name)
 
-    # Grab the image paths and randomly shuffle them
-    image_paths = get_image_paths(interim_dir)
-    random.seed(42)
-    random.shuffle(image_paths)
-
     # Get the data
-    x_train,\
-        x_val,\
-        x_test,\
-        y_train,\
-        y_val,\
-        y_test = \
-        get_processed_data(image_paths,
-                           model_files_dir,
-                           model_name,
-                           processed_dir)
-
-    # Construct the image generator for data augmentation
-    image_generator = get_image_generator()
+    x_train, x_val, x_test, y_train, y_val, y_test = \
+        get_data(dataset_name, model_name, data_source)
+
+    # Construct the batch augmenter for data augmentation
+    image_generator, augmentation_cache = \
+        get_augmentation(dataset_name, x_train, augmentation_cache_epochs)
 
     # Initialize the model
     if model_setup is None:
@@ -95,7 +215,7 @@ def main(dataset_name='basic',
     # Infer some of the setup to use in the models
     model_setup['height'],\
         model_setup['width'],\
-        model_setup['channels'] = x_train.shape[1:]
+        model_setup['channels'] = x_test.shape[1:]
 
     if optimizer_setup is None:
         optimizer_setup = dict(initial_learning_rate=1e-3,
@@ -104,6 +224,11 @@ def main(dataset_name='basic',
 
     model = get_model(y_train.shape[1], model_setup, optimizer_setup)
 
+    # Measure where the time of the epochs is spent
+    throughput_monitor = \
+        ThroughputMonitor(batch_size=optimizer_setup['batch_size'])
+    callbacks = [throughput_monitor, *(callbacks or list())]
+
     # Train the network
     history = train_model(model,
                           image_generator,
@@ -114,13 +239,23 @@ def main(dataset_name='basic',
                           y_val,
                           model_name,
                           batch_size=optimizer_setup['batch_size'],
-                          epochs=optimizer_setup['epochs'])
+                          epochs=optimizer_setup['epochs'],
+                          workers=workers,
+                          use_multiprocessing=use_multiprocessing,
+                          augmentation_cache=augmentation_cache,
+                          callbacks=callbacks,
+                          export=export)
 
     # Plot the training loss and accuracy
     plot_training(history,
                   plot_dir,
                   f'{dataset_name}_{model_name}')
 
+    # Report the throughput next to the training plot
+    plot_throughput(throughput_monitor.records,
+                    plot_dir,
+                    f'{dataset_name}_{model_name}')
+
     return history, x_test, y_test
 
 
@@ -151,6 +286,38 @@ if __name__ == '__main__':
                         type=json.loads,
                         help='Optimizer setup as a json string. I.e. '
                              'in the form {"key1": val1, "key2": val2}')
+    parser.add_argument('-r',
+                        '--data_source',
+                        required=False,
+                        default='processed',
+                        choices=('processed', 'directory'),
+                        help='Read the images from the stored data '
+                             'sets (processed) or lazily from the '
+                             'image files (directory)')
+    parser.add_argument('-j',
+                        '--workers',
+                        required=False,
+                        default=1,
+                        type=int,
+                        help='Number of workers reading and augmenting '
+                             'the batches')
+    parser.add_argument('-p',
+                        '--use_multiprocessing',
+                        action='store_true',
+                        help='Use processes instead of threads as '
+                             'workers')
+    parser.add_argument('-k',
+                        '--augmentation_cache_epochs',
+                        required=False,
+                        default=0,
+                        type=int,
+                        help='Number of augmented epochs to precompute '
+                             'and cache (0 augments on the fly)')
+    parser.add_argument('-e',
+                        '--export',
+                        action='store_true',
+                        help='Also export the model to TensorFlow Lite '
+                             'for the tflite prediction backend')
 
     args = parser.parse_args()
 
@@ -167,4 +334,9 @@ if __name__ == '__main__':
     main(dataset_name_,
          model_name_,
          args.model_setup,
-         args.optimizer_setup)
+         args.optimizer_setup,
+         args.data_source,
+         args.workers,
+         args.use_multiprocessing,
+         args.augmentation_cache_epochs,
+         export=args.export)
@@ -0,0 +1,201 @@
+"""
+Contains the cache of precomputed augmented epochs
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+from numpy.lib.format import open_memmap
+from fruit_classifier.train.sequences import get_batch_sequence
+
+
+def get_data_hash(x, chunk_size=1024):
+    """
+    Returns a hash of the data
+
+    Parameters
+    ----------
+    x : np.array
+        Either the uint8 images with shape
+        (n_images, height, width, channels), or the Paths of the images
+        (an object array with shape (n_images,))
+    chunk_size : int
+        Number of images hashed at the time
+
+    Returns
+    -------
+    data_hash : str
+        Hex digest of the images (or of the paths, sizes and
+        modification times of the image files) in the given order
+    """
+
+    sha = hashlib.sha1()
+    if x.dtype == object:
+        for image_path in x:
+            stat = image_path.stat()
+            sha.update(f'{image_path}:{stat.st_size}:'
+                       f'{stat.st_mtime_ns}\n'.encode())
+    else:
+        sha.update(f'{x.shape}:{x.dtype}\n'.encode())
+        for i in range(0, len(x), chunk_size):
+            sha.update(np.ascontiguousarray(x[i:i + chunk_size]))
+
+    return sha.hexdigest()
+
+
+def get_cache_key(x, batch_augmenter, n_epochs, seed=42, chunk_size=256):
+    """
+    Returns the key of the augmentation cache
+
+    Parameters
+    ----------
+    x : np.array
+        The images (or image Paths) to augment
+    batch_augmenter : BatchAugmenter
+        The augmenter to augment with
+    n_epochs : int
+        Number of augmented epochs
+    seed : int
+        Seed of the augmentation
+    chunk_size : int
+        Number of images augmented at the time
+        Part of the key, as the augmentation is seeded by the index of
+        the chunk
+
+    Returns
+    -------
+    key : str
+        Hex digest of the data, the augmentation parameters, the number
+        of epochs, the seed and the chunk size
+    """
+
+    key_dict = dict(data=get_data_hash(x),
+                    augmentation=batch_augmenter.get_config(),
+                    n_epochs=n_epochs,
+                    seed=seed,
+                    chunk_size=chunk_size)
+    key_str = json.dumps(key_dict, sort_keys=True)
+
+    return hashlib.sha1(key_str.encode()).hexdigest()
+
+
+def get_augmentation_cache(x,
+                           batch_augmenter,
+                           cache_dir,
+                           n_epochs,
+                           seed=42,
+                           chunk_size=256):
+    """
+    Returns the memory mapped augmented epochs, computing them if needed
+
+    The epochs are stored in cache_dir/<key>.npy, where the key is a
+    hash of the data, the augmentation parameters, the number of epochs,
+    the seed and the chunk size (see `get_cache_key`).
+    Repeated runs with the same inputs therefore read the augmented
+    images from disk instead of augmenting them again.
+    Processes building the same cache at once (such as the trials of a
+    sweep) each write their own temporary file, and the first finished
+    cache is the one kept
+
+    Parameters
+    ----------
+    x : np.array
+        Either the uint8 images with shape
+        (n_images, height, width, channels), or the Paths of the images
+        (an object array with shape (n_images,))
+    batch_augmenter : BatchAugmenter
+        The augmenter to augment with
+    cache_dir : Path
+        Directory of the cached epochs
+    n_epochs : int
+        Number of augmented epochs to precompute
+    seed : int
+        Seed of the augmentation
+    chunk_size : int
+        Number of images augmented at the time
+
+    Returns
+    -------
+    cache : np.memmap, shape (n_epochs, n_images, height, width, channels)
+        The uint8 augmented images
+        The images are in the same order as `x`
+    """
+
+    key = get_cache_key(x, batch_augmenter, n_epochs, seed, chunk_size)
+    cache_path = cache_dir.joinpath(f'{key}.npy')
+
+    if cache_path.is_file():
+        print(f'[INFO] Using the augmentation cache {cache_path}')
+    else:
+        print(f'[INFO] Precomputing {n_epochs} augmented epochs...')
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_dir.joinpath(f'{key}.{os.getpid()}.tmp.npy')
+        build_augmentation_cache(x,
+                                 batch_augmenter,
+                                 tmp_path,
+                                 n_epochs,
+                                 seed,
+                                 chunk_size)
+        if cache_path.is_file():
+            # Another process finished the same cache in the meantime
+            tmp_path.unlink()
+        else:
+            tmp_path.replace(cache_path)
+            print(f'[INFO] Saved the augmentation cache to {cache_path}')
+
+    return np.load(str(cache_path), mmap_mode='r')
+
+
+def build_augmentation_cache(x,
+                             batch_augmenter,
+                             cache_path,
+                             n_epochs,
+                             seed=42,
+                             chunk_size=256):
+    """
+    Augments the images for a number of epochs and stores them
+
+    The images are augmented as by the batch sequences (seeded by the
+    seed, the epoch and the index of the chunk)
+
+    Parameters
+    ----------
+    x : np.array
+        The images (or image Paths) to augment
+    batch_augmenter : BatchAugmenter
+        The augmenter to augment with
+    cache_path : Path
+        Path of the .npy file to store the augmented images in
+    n_epochs : int
+        Number of augmented epochs
+    seed : int
+        Seed of the augmentation
+    chunk_size : int
+        Number of images augmented at the time
+    """
+
+    sequence = get_batch_sequence(x,
+                                  np.zeros((len(x), 0)),
+                                  batch_size=chunk_size,
+                                  image_generator=batch_augmenter,
+                                  shuffle=False,
+                                  seed=seed)
+
+    cache = None
+    for epoch in range(n_epochs):
+        sequence.epoch = epoch
+        for index in range(len(sequence)):
+            x_batch, _ = sequence[index]
+            if cache is None:
+                cache = open_memmap(str(cache_path),
+                                    mode='w+',
+                                    dtype='uint8',
+                                    shape=(n_epochs, len(x),
+                                           *x_batch.shape[1:]))
+            cache[epoch, index * chunk_size:
+                  index * chunk_size + len(x_batch)] = \
+                np.clip(np.round(x_batch * 255), 0, 255)
+
+    cache.flush()
+    del cache
@@ -0,0 +1,217 @@
+"""
+Contains the callbacks which measure the training
+"""
+
+import sys
+import time
+from keras.callbacks import Callback
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class TimingCallback(Callback):
+    """
+    Measures the time of the training steps and of the waits for data
+
+    The step time is the time between the start and the end of a batch,
+    i.e. the forward and backward pass of the model.
+    The data wait is the time between the end of a batch and the start
+    of the next, which is mostly spent waiting for the batch to be
+    prepared by the data pipeline.
+    Subclasses read the timings of the last batch in `on_batch_end`
+    after calling `super().on_batch_end`
+    """
+
+    def __init__(self, batch_size=None):
+        """
+        Sets up the callback
+
+        Parameters
+        ----------
+        batch_size : None or int
+            The batch size
+            Only used if the size of the batch is not given in the logs
+            of the batch
+        """
+
+        super().__init__()
+        self.batch_size = batch_size
+
+        # The timings of the last batch
+        self.step_time = None
+        self.data_wait = None
+        self.samples = None
+
+        # The timings accumulated over the current epoch
+        self.epoch_start = None
+        self.epoch_step_time = 0.0
+        self.epoch_data_wait = 0.0
+        self.epoch_samples = 0
+        self.epoch_batches = 0
+
+        self._batch_start = None
+        self._batch_end = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        """
+        Resets the timings of the epoch
+
+        Parameters
+        ----------
+        epoch : int
+            The index of the epoch
+        logs : dict
+            The logs of the epoch
+        """
+
+        self.epoch_start = time.perf_counter()
+        self.epoch_step_time = 0.0
+        self.epoch_data_wait = 0.0
+        self.epoch_samples = 0
+        self.epoch_batches = 0
+
+        self._batch_end = self.epoch_start
+
+    def on_batch_begin(self, batch, logs=None):
+        """
+        Measures the wait for the batch
+
+        Parameters
+        ----------
+        batch : int
+            The index of the batch in the epoch
+        logs : dict
+            The logs of the batch
+        """
+
+        self._batch_start = time.perf_counter()
+        self.data_wait = self._batch_start - self._batch_end
+
+    def on_batch_end(self, batch, logs=None):
+        """
+        Measures the step time of the batch
+
+        Parameters
+        ----------
+        batch : int
+            The index of the batch in the epoch
+        logs : dict
+            The logs of the batch
+        """
+
+        self._batch_end = time.perf_counter()
+        self.step_time = self._batch_end - self._batch_start
+
+        logs = logs or dict()
+        self.samples = logs.get('size', self.batch_size)
+
+        self.epoch_step_time += self.step_time
+        self.epoch_data_wait += self.data_wait
+        self.epoch_samples += self.samples or 0
+        self.epoch_batches += 1
+
+    def get_epoch_time(self):
+        """
+        Returns the time elapsed since the start of the epoch
+
+        Returns
+        -------
+        epoch_time : float
+            The time in seconds
+        """
+
+        return time.perf_counter() - self.epoch_start
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident set size of the process
+
+    Returns
+    -------
+    peak_rss : None or float
+        The peak memory use of the process in MB so far
+        None if not available on the platform
+    """
+
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Given in bytes on macOS and in kB on Linux
+    if sys.platform == 'darwin':
+        return max_rss / 1024**2
+
+    return max_rss / 1024
+
+
+class ThroughputMonitor(TimingCallback):
+    """
+    Records where the time of each training epoch is spent
+
+    The records of each epoch contain
+    - epoch: The epoch number
+    - epoch_time: The time of the epoch in seconds
+    - data_wait: The time spent waiting for the training batches
+      (reading, decoding and augmenting the images which the workers
+      did not prepare in advance)
+    - compute: The time of the training steps (the copies of the
+      batches to the model and the forward and backward passes)
+    - other: The rest of the epoch, mostly the validation
+    - data_wait_fraction: The fraction of the training time spent
+      waiting for data
+    - samples_per_sec: The training samples per second
+    - peak_rss_mb: The peak memory use of the process so far
+    """
+
+    def __init__(self, batch_size=None):
+        """
+        Sets up the callback
+
+        Parameters
+        ----------
+        batch_size : None or int
+            The batch size
+            Only used if the size of the batch is not given in the logs
+            of the batch
+        """
+
+        super().__init__(batch_size)
+        self.records = list()
+
+    def on_epoch_end(self, epoch, logs=None):
+        """
+        Records the timings of the epoch
+
+        Parameters
+        ----------
+        epoch : int
+            The index of the epoch
+        logs : dict
+            The logs of the epoch
+        """
+
+        epoch_time = self.get_epoch_time()
+        train_time = self.epoch_step_time + self.epoch_data_wait
+
+        if train_time > 0:
+            data_wait_fraction = self.epoch_data_wait / train_time
+            samples_per_sec = self.epoch_samples / train_time
+        else:
+            data_wait_fraction = None
+            samples_per_sec = None
+
+        self.records.append(
+            dict(epoch=epoch + 1,
+                 epoch_time=epoch_time,
+                 data_wait=self.epoch_data_wait,
+                 compute=self.epoch_step_time,
+                 other=max(epoch_time - train_time, 0.0),
+                 data_wait_fraction=data_wait_fraction,
+                 samples_per_sec=samples_per_sec,
+                 peak_rss_mb=get_peak_rss()))
@@ -0,0 +1,72 @@
+"""
+Contains the export of trained models to inference only formats
+"""
+
+
+def get_tflite_converter(model):
+    """
+    Returns the TensorFlow Lite converter of a Keras model
+
+    On TensorFlow 1 the converter is built from the live session of
+    the model. Converting from the stored file instead clears the
+    Keras session, which leaves the in-memory model (and any model
+    built afterwards in the same process) on a discarded graph
+
+    Parameters
+    ----------
+    model : Sequential
+        The model to convert
+
+    Returns
+    -------
+    converter : TFLiteConverter
+        The converter of the model
+    """
+
+    # Imported here as TensorFlow is only needed when exporting
+    import tensorflow as tf
+
+    if hasattr(tf.lite.TFLiteConverter, 'from_keras_model'):
+        # TensorFlow 2
+        return tf.lite.TFLiteConverter.from_keras_model(model)
+
+    from keras import backend as K
+
+    return tf.lite.TFLiteConverter.from_session(K.get_session(),
+                                                model.inputs,
+                                                model.outputs)
+
+
+def export_tflite(model, model_path, tflite_path=None):
+    """
+    Exports the model to TensorFlow Lite
+
+    The exported model only contains the weights and the operations
+    needed for inference, and can be run by `TFLiteClassifier` without
+    Keras
+
+    Parameters
+    ----------
+    model : Sequential
+        The model to export
+    model_path : Path
+        Path to the stored Keras model
+    tflite_path : None or Path
+        Path of the exported model
+        If None, the model is stored next to the Keras model with the
+        suffix .tflite
+
+    Returns
+    -------
+    tflite_path : Path
+        Path to the exported model
+    """
+
+    if tflite_path is None:
+        tflite_path = model_path.with_suffix('.tflite')
+
+    converter = get_tflite_converter(model)
+    tflite_path.write_bytes(converter.convert())
+    print('[INFO] Saved to {}'.format(tflite_path))
+
+    return tflite_path
@@ -0,0 +1,330 @@
+"""
+Contains the Sequences which feed batches to the models
+"""
+
+import numpy as np
+from keras.utils import Sequence
+from fruit_classifier.utils.image_utils import normalize_images
+from fruit_classifier.utils.image_utils import open_image
+
+
+class ArrayBatchSequence(Sequence):
+    """
+    Sequence of batches from an array of uint8 images
+
+    The images are kept as uint8 (the array may be memory mapped), and
+    only the images of the requested batch are scaled to float32 in
+    the range [0, 1] and augmented
+    """
+
+    def __init__(self,
+                 x,
+                 y,
+                 batch_size=32,
+                 image_generator=None,
+                 shuffle=True,
+                 seed=42):
+        """
+        Sets up the sequence
+
+        Parameters
+        ----------
+        x : np.array, shape (n_images, height, width, channels)
+            The uint8 images
+        y : np.array, shape (n_images, n_classes)
+            The encoded labels
+        batch_size : int
+            The batch size
+        image_generator : None, BatchAugmenter or ImageDataGenerator
+            The augmenter used for augmentation
+            A BatchAugmenter augments the whole batch at once, an
+            ImageDataGenerator one image at the time
+            If None, the images are not augmented
+        shuffle : bool
+            Whether or not to shuffle the images every epoch
+        seed : int
+            Seed for the shuffling and the augmentation
+        """
+
+        self.x = x
+        self.y = y
+        self.batch_size = batch_size
+        self.image_generator = image_generator
+        self.shuffle = shuffle
+        self.seed = seed
+
+        self.epoch = 0
+        self.indices = np.arange(len(self.x))
+        self._shuffle_indices()
+
+    def __len__(self):
+        """
+        Returns the number of batches per epoch
+
+        Returns
+        -------
+        int
+            The number of batches
+        """
+
+        return int(np.ceil(len(self.indices) / self.batch_size))
+
+    def __getitem__(self, index):
+        """
+        Returns a batch
+
+        Parameters
+        ----------
+        index : int
+            The index of the batch
+
+        Returns
+        -------
+        x_batch : np.array, shape (batch_size, height, width, channels)
+            The float32 images of the batch
+        y_batch : np.array, shape (batch_size, n_classes)
+            The labels of the batch
+        """
+
+        # Sorting the indices gives sequential reads from memory maps
+        batch_indices = np.sort(
+            self.indices[index * self.batch_size:
+                         (index + 1) * self.batch_size])
+
+        x_batch = normalize_images(self.get_images(batch_indices))
+        y_batch = self.y[batch_indices]
+
+        random_state = self.get_random_state(index)
+        if hasattr(self.image_generator, 'augment'):
+            x_batch = self.image_generator.augment(x_batch, random_state)
+        elif self.image_generator is not None:
+            for i in range(len(x_batch)):
+                x_batch[i] = self.image_generator.random_transform(
+                    x_batch[i], seed=random_state.randint(2**31))
+
+        return x_batch, y_batch
+
+    def get_images(self, batch_indices):
+        """
+        Returns the uint8 images of a batch
+
+        Parameters
+        ----------
+        batch_indices : np.array, shape (batch_size,)
+            The indices of the images
+
+        Returns
+        -------
+        images : np.array, shape (batch_size, height, width, channels)
+            The uint8 images
+        """
+
+        return self.x[batch_indices]
+
+    def get_random_state(self, index):
+        """
+        Returns the random state used to augment a batch
+
+        The random state only depends on the seed, the epoch and the
+        batch index, so a batch is augmented identically regardless of
+        which worker thread or process prepares it
+
+        Parameters
+        ----------
+        index : int
+            The index of the batch
+
+        Returns
+        -------
+        random_state : np.random.RandomState
+            The random state of the batch
+        """
+
+        return np.random.RandomState([self.seed, self.epoch, index])
+
+    def on_epoch_end(self):
+        """
+        Reshuffles the images
+        """
+
+        self.epoch += 1
+        self._shuffle_indices()
+
+    def _shuffle_indices(self):
+        """
+        Shuffles the indices deterministically given the seed and epoch
+        """
+
+        if self.shuffle:
+            random_state = np.random.RandomState(self.seed + self.epoch)
+            random_state.shuffle(self.indices)
+
+
+class DirectoryBatchSequence(ArrayBatchSequence):
+    """
+    Sequence of batches read lazily from image files
+
+    Only the images of the requested batch are read and decoded, so the
+    dataset never has to fit in memory
+    """
+
+    def __init__(self,
+                 image_paths,
+                 y,
+                 batch_size=32,
+                 image_generator=None,
+                 shuffle=True,
+                 seed=42):
+        """
+        Sets up the sequence
+
+        Parameters
+        ----------
+        image_paths : array-like, shape (n_images,)
+            The Paths of the images
+            All the images must have the same shape
+        y : np.array, shape (n_images, n_classes)
+            The encoded labels
+        batch_size : int
+            The batch size
+        image_generator : None, BatchAugmenter or ImageDataGenerator
+            The augmenter used for augmentation
+            A BatchAugmenter augments the whole batch at once, an
+            ImageDataGenerator one image at the time
+            If None, the images are not augmented
+        shuffle : bool
+            Whether or not to shuffle the images every epoch
+        seed : int
+            Seed for the shuffling and the augmentation
+        """
+
+        super().__init__(np.array(image_paths, dtype=object),
+                         y,
+                         batch_size=batch_size,
+                         image_generator=image_generator,
+                         shuffle=shuffle,
+                         seed=seed)
+
+    def get_images(self, batch_indices):
+        """
+        Reads and returns the uint8 images of a batch
+
+        Parameters
+        ----------
+        batch_indices : np.array, shape (batch_size,)
+            The indices of the images
+
+        Returns
+        -------
+        images : np.array, shape (batch_size, height, width, channels)
+            The uint8 images
+        """
+
+        images = np.stack([open_image(image_path)
+                           for image_path in self.x[batch_indices]])
+
+        return images.astype('uint8')
+
+
+class CachedBatchSequence(ArrayBatchSequence):
+    """
+    Sequence of batches from precomputed augmented epochs
+
+    Epoch `e` reads the augmented images of the cached epoch
+    `e % n_epochs`, so no augmentation is computed while training
+    """
+
+    def __init__(self,
+                 cache,
+                 y,
+                 batch_size=32,
+                 shuffle=True,
+                 seed=42):
+        """
+        Sets up the sequence
+
+        Parameters
+        ----------
+        cache : np.array, shape (n_epochs, n_images, height, width, channels)
+            The uint8 augmented images (see `get_augmentation_cache`)
+        y : np.array, shape (n_images, n_classes)
+            The encoded labels
+        batch_size : int
+            The batch size
+        shuffle : bool
+            Whether or not to shuffle the images every epoch
+        seed : int
+            Seed for the shuffling
+        """
+
+        self.cache = cache
+        super().__init__(cache[0],
+                         y,
+                         batch_size=batch_size,
+                         shuffle=shuffle,
+                         seed=seed)
+
+    def get_images(self, batch_indices):
+        """
+        Returns the cached augmented uint8 images of a batch
+
+        Parameters
+        ----------
+        batch_indices : np.array, shape (batch_size,)
+            The indices of the images
+
+        Returns
+        -------
+        images : np.array, shape (batch_size, height, width, channels)
+            The uint8 images
+        """
+
+        return self.cache[self.epoch % len(self.cache), batch_indices]
+
+
+def get_batch_sequence(x,
+                       y,
+                       batch_size=32,
+                       image_generator=None,
+                       shuffle=True,
+                       seed=42):
+    """
+    Returns the sequence matching the type of the data
+
+    Parameters
+    ----------
+    x : np.array
+        Either the uint8 images with shape
+        (n_images, height, width, channels), or the Paths of the images
+        (an object array with shape (n_images,)) to be read lazily
+    y : np.array, shape (n_images, n_classes)
+        The encoded labels
+    batch_size : int
+        The batch size
+    image_generator : None, BatchAugmenter or ImageDataGenerator
+        The augmenter used for augmentation
+        If None, the images are not augmented
+    shuffle : bool
+        Whether or not to shuffle the images every epoch
+    seed : int
+        Seed for the shuffling and the augmentation
+
+    Returns
+    -------
+    sequence : ArrayBatchSequence or DirectoryBatchSequence
+        The sequence of batches
+    """
+
+    if x.dtype == object:
+        sequence_class = DirectoryBatchSequence
+    else:
+        sequence_class = ArrayBatchSequence
+
+    sequence = sequence_class(x,
+                              y,
+                              batch_size=batch_size,
+                              image_generator=image_generator,
+                              shuffle=shuffle,
+                              seed=seed)
+
+    return sequence
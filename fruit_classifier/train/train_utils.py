@@ -1,13 +1,10 @@
+import json
 import pickle
+import hashlib
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
-from keras.optimizers import Adam
-from keras.preprocessing.image import ImageDataGenerator
-from matplotlib import pyplot as plt
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder
-from fruit_classifier.models.factory import ModelFactory
+from fruit_classifier.train.export_utils import export_tflite
 from fruit_classifier.utils.image_utils import open_image
 
 
@@ -23,59 +20,38 @@ def get_data_and_labels(image_paths):
     Returns
     -------
     data : np.array, shape (len(image_paths), height, width, channels)
-        The images as numpy array
+        The images as an uint8 numpy array
     labels : np.array, shape (len(image_paths,))
         The corresponding labels
     """
 
-    data = list()
+    data = None
     labels = list()
     # Loop over the input images
-    for image_path in tqdm(image_paths, desc='Loading the images'):
+    for i, image_path in enumerate(tqdm(image_paths,
+                                        desc='Loading the images')):
         tqdm.write(str(image_path))
-        # Load the image, pre-process it, and store it in the data list
+        # Load the image and store it in the data array
         image_array = open_image(image_path)
-        data.append(image_array)
+        if data is None:
+            # The images are kept as uint8 in order to save memory
+            # They are scaled to [0, 1] batch by batch during training
+            data = np.empty((len(image_paths), *image_array.shape),
+                            dtype='uint8')
+        data[i] = image_array
 
         # Extract the class label from the image path and update the
         # labels list
         label = image_path.parts[-2]
         labels.append(label)
-    # Scale the raw pixel intensities to the range [0, 1]
-    data = np.array(data, dtype='float')/255
+
+    if data is None:
+        data = np.empty((0,), dtype='uint8')
     labels = np.array(labels)
 
     return data, labels
 
 
-def store_data_and_labels(data, labels, processed_dir):
-    """
-    Store the dataset and label
-
-    Parameters
-    ----------
-    processed_dir : Path
-        Path to the directory where the final datasets are stored
-    data : np.array, shape (len(image_paths), height, width, channels)
-        The images as numpy array
-    labels : np.array, shape (len(image_paths,))
-        The corresponding labels
-    """
-    # Pickle the data and labels
-    if not processed_dir.is_dir():
-        processed_dir.mkdir(parents=True, exist_ok=True)
-
-    data_path = processed_dir.joinpath('data.pkl')
-    with data_path.open('wb') as f:
-        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
-        print('[INFO] Saved to {}'.format(data_path))
-
-    labels_path = processed_dir.joinpath('labels.pkl')
-    with labels_path.open('wb') as f:
-        pickle.dump(labels, f, pickle.HIGHEST_PROTOCOL)
-        print('[INFO] Saved to {}'.format(labels_path))
-
-
 def get_data_split(data, labels):
     """
     Splits the data in train and test (or validation)
@@ -99,6 +75,11 @@ def get_data_split(data, labels):
         The test or validation labels
     """
 
+    # Keras, matplotlib and scikit-learn are imported in the functions
+    # using them, as they are slow to import and are not needed when
+    # only loading the data sets
+    from sklearn.model_selection import train_test_split
+
     # Partition the data into training and testing splits using 75% of
     # the data for training and the remaining 25% for validation
     (x_train, x_test, y_train, y_test) = \
@@ -141,12 +122,22 @@ def get_processed_data(image_paths,
         The test labels
     """
 
-    if processed_dir.joinpath('y_val.pkl').is_file():
+    fingerprint = get_fingerprint(image_paths)
+
+    if is_data_sets_stored(processed_dir, fingerprint):
         x_train, x_val, x_test, y_train, y_val, y_test =\
             load_data_sets(processed_dir)
+
+        # The label encoder is stored per model, and must be recreated
+        # if the data sets were stored while training another model
+        encoder_path = model_files_dir.joinpath('encoders',
+                                                model_name,
+                                                'encoder.pkl')
+        if not encoder_path.is_file():
+            classes = load_metadata(processed_dir)['classes']
+            encode_labels(np.array(classes), model_files_dir, model_name)
     else:
         data, labels = get_data_and_labels(image_paths)
-        store_data_and_labels(data, labels, processed_dir)
 
         encoded_labels = encode_labels(labels,
                                        model_files_dir,
@@ -163,20 +154,159 @@ def get_processed_data(image_paths,
                         y_train,
                         y_val,
                         y_test,
-                        processed_dir)
+                        processed_dir,
+                        classes=sorted(set(labels)),
+                        fingerprint=fingerprint)
+
+        x_train, x_val, x_test, y_train, y_val, y_test =\
+            load_data_sets(processed_dir)
+
+    return x_train, x_val, x_test, y_train, y_val, y_test
+
+
+def get_directory_data(image_paths, model_files_dir, model_name):
+    """
+    Returns the split image paths for reading the images lazily
+
+    The split is identical to the one made by `get_processed_data`.
+    Only the test images are read, as they are returned as an array.
+
+    Parameters
+    ----------
+    image_paths : list
+        List of Paths of the image paths
+    model_files_dir : Path
+        Path to the model_files
+    model_name : str
+        Name of the model
+
+    Returns
+    -------
+    x_train : np.array, shape (n_train,)
+        The Paths of the training images
+    x_val : np.array, shape (n_val,)
+        The Paths of the validation images
+    x_test: np.array, shape (n_test, height, width, channels)
+        The test data
+    y_train : np.array, shape (n_train, n_classes)
+        The training labels
+    y_val : np.array, shape (n_val, n_classes)
+        The validation labels
+    y_test : np.array, shape (n_test, n_classes)
+        The test labels
+    """
+
+    labels = np.array([image_path.parts[-2] for image_path in image_paths])
+    encoded_labels = encode_labels(labels, model_files_dir, model_name)
+
+    paths = np.array(image_paths, dtype=object)
+    train_paths, test_paths, train_labels, y_test = \
+        get_data_split(paths, encoded_labels)
+
+    x_train, x_val, y_train, y_val = \
+        get_data_split(train_paths, train_labels)
+
+    x_test, _ = get_data_and_labels(list(test_paths))
 
     return x_train, x_val, x_test, y_train, y_val, y_test
 
 
+def get_fingerprint(image_paths):
+    """
+    Returns a fingerprint of the images
+
+    The fingerprint changes if images are added, removed or modified
+
+    Parameters
+    ----------
+    image_paths : list
+        List of Paths of the image paths
+
+    Returns
+    -------
+    fingerprint : str
+        Hex digest of the class, name, size and modification time of
+        the images
+    """
+
+    sha = hashlib.sha1()
+    for image_path in sorted(image_paths):
+        stat = image_path.stat()
+        sha.update(f'{image_path.parent.name}/{image_path.name}:'
+                   f'{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+
+    return sha.hexdigest()
+
+
+def is_data_sets_stored(processed_dir, fingerprint=None):
+    """
+    Checks whether the data sets are stored
+
+    Parameters
+    ----------
+    processed_dir : Path
+        Path to the processed directory
+    fingerprint : None or str
+        The fingerprint of the images (see `get_fingerprint`)
+        If given, the stored data sets must be made from the same
+        images
+
+    Returns
+    -------
+    bool
+        Whether or not the data sets are stored
+    """
+
+    if not processed_dir.joinpath('metadata.json').is_file():
+        return False
+
+    if fingerprint is not None and \
+            load_metadata(processed_dir)['fingerprint'] != fingerprint:
+        print('[INFO] The images have changed since the data sets were '
+              'stored')
+        return False
+
+    return True
+
+
+def load_metadata(processed_dir):
+    """
+    Loads the metadata of the stored data sets
+
+    Parameters
+    ----------
+    processed_dir : Path
+        Path to the processed directory
+
+    Returns
+    -------
+    metadata : dict
+        The metadata (see `store_data_sets` for details)
+    """
+
+    with processed_dir.joinpath('metadata.json').open('r') as f:
+        metadata = json.load(f)
+
+    return metadata
+
+
 def store_data_sets(x_train,
                     x_val,
                     x_test,
                     y_train,
                     y_val,
                     y_test,
-                    processed_dir):
+                    processed_dir,
+                    classes=None,
+                    fingerprint=None):
     """
-    Saves and returns the train and the test
+    Saves the train, validation and test sets
+
+    Each data set is stored as a `.npy` file, which can be memory
+    mapped when loaded.
+    A `metadata.json` containing the shapes and dtypes of the data
+    sets, the classes and the fingerprint of the images is written
+    last, so that its presence marks a complete set of files.
 
     Parameters
     ----------
@@ -194,26 +324,54 @@ def store_data_sets(x_train,
         The test labels
     processed_dir : Path
         Path to the processed directory
+    classes : None or list
+        The classes in the order of the encoded labels
+    fingerprint : None or str
+        The fingerprint of the images (see `get_fingerprint`)
     """
 
+    if not processed_dir.is_dir():
+        processed_dir.mkdir(parents=True, exist_ok=True)
+
+    # Invalidate the current data sets while writing
+    metadata_path = processed_dir.joinpath('metadata.json')
+    if metadata_path.is_file():
+        metadata_path.unlink()
+
     data_sets = (x_train, x_val, x_test, y_train, y_val, y_test)
     names = ('x_train', 'x_val', 'x_test', 'y_train', 'y_val', 'y_test')
 
+    metadata = dict(data_sets=dict(),
+                    classes=classes,
+                    fingerprint=fingerprint)
+
     for data_set, name in zip(data_sets, names):
-        path = processed_dir.joinpath(f'{name}.pkl')
-        with path.open('wb') as f:
-            pickle.dump(data_set, f, pickle.HIGHEST_PROTOCOL)
-            print('[INFO] Saved to {}'.format(path))
+        path = processed_dir.joinpath(f'{name}.npy')
+        np.save(str(path), data_set)
+        metadata['data_sets'][name] = dict(shape=data_set.shape,
+                                           dtype=str(data_set.dtype))
+        print('[INFO] Saved to {}'.format(path))
+
+    with metadata_path.open('w') as f:
+        json.dump(metadata, f, indent=4)
+    print('[INFO] Saved to {}'.format(metadata_path))
 
 
-def load_data_sets(processed_dir):
+def load_data_sets(processed_dir, mmap_mode='r'):
     """
-    Saves and returns the train and the test
+    Loads the train, validation and test sets
+
+    The data sets are memory mapped by default, so only the parts
+    which are accessed are read from disk, and several processes can
+    share the same pages
 
     Parameters
     ----------
     processed_dir : Path
         Path to the processed directory
+    mmap_mode : None or str
+        The memory mapping mode (see np.load)
+        If None, the data sets are read into memory
 
     Returns
     -------
@@ -235,9 +393,8 @@ def load_data_sets(processed_dir):
     data_sets = list()
 
     for name in names:
-        path = processed_dir.joinpath(f'{name}.pkl')
-        with path.open('rb') as f:
-            data_sets.append(pickle.load(f))
+        path = processed_dir.joinpath(f'{name}.npy')
+        data_sets.append(np.load(str(path), mmap_mode=mmap_mode))
 
     x_train, x_val, x_test, y_train, y_val, y_test = data_sets
 
@@ -263,6 +420,8 @@ def encode_labels(labels, model_files_dir, model_name):
         The encoded labels
     """
 
+    from sklearn.preprocessing import OneHotEncoder
+
     label_encoder = OneHotEncoder()
     labels = labels.reshape(len(labels), 1)
     label_encoder.fit(labels)
@@ -307,6 +466,9 @@ def get_model(n_classes, model_setup=None, optimizer_setup=None):
         The compiled model
     """
 
+    from keras.optimizers import Adam
+    from fruit_classifier.models.factory import ModelFactory
+
     print('[INFO] compiling model...')
 
     if model_setup is None:
@@ -349,22 +511,38 @@ def train_model(model,
                 y_val,
                 model_name='basic',
                 batch_size=32,
-                epochs=25):
+                epochs=25,
+                workers=1,
+                max_queue_size=10,
+                use_multiprocessing=False,
+                augmentation_cache=None,
+                callbacks=None,
+                export=False):
     """
     Trains and saves the model
 
+    The batches are prepared by `workers` background threads (or
+    processes if `use_multiprocessing` is True) which keep up to
+    `max_queue_size` batches ready, so that reading, decoding and
+    augmenting the images overlaps with the model step.
+    The augmentation of a batch is seeded by the epoch and the batch
+    index, so the result does not depend on the number of workers
+
     Parameters
     ----------
     model : Sequential
         The model to train
-    image_generator : ImageDataGenerator
-        The image data generator to use
+    image_generator : BatchAugmenter or ImageDataGenerator
+        The augmenter to use
     model_files_dir : Path
         Directory to store the model
     x_train : np.array, shape (n_train, height, width, channels)
-        The training data
+        The uint8 training data
+        Can also be the Paths of the training images (object array
+        with shape (n_train,)), in which case the images are read
+        lazily
     x_val : np.array, shape (n_val, height, width, channels)
-        The validation data
+        The uint8 validation data (or the Paths of the images)
     y_train : np.array, shape (n_train,)
         The training labels
     y_val : np.array, shape (n_val,)
@@ -375,6 +553,28 @@ def train_model(model,
         The batch size
     epochs : int
         The number of epochs
+    workers : int
+        Number of threads (or processes) preparing the batches
+    max_queue_size : int
+        Maximum number of batches prepared in advance
+    use_multiprocessing : bool
+        Whether to prepare the batches in processes instead of threads
+        Processes side step the GIL, so the augmentation scales with
+        the number of cores
+    augmentation_cache : None or np.array
+        Precomputed augmented epochs of x_train with shape
+        (n_epochs, n_train, height, width, channels) as returned by
+        `get_augmentation_cache`
+        If given, the training images are read from the cache and
+        `image_generator` is not used
+    callbacks : None or list
+        Keras callbacks to apply during training
+    export : bool
+        Whether to also export the model to TensorFlow Lite in
+        model_files_dir/models/model_name/model.tflite, which is used
+        by the tflite prediction backend
+        Off by default, so that experiments and sweeps do not pay for
+        a conversion of every trial
 
     Returns
     -------
@@ -386,18 +586,40 @@ def train_model(model,
         - val_accuracy
     """
 
+    from fruit_classifier.train.sequences import CachedBatchSequence
+    from fruit_classifier.train.sequences import get_batch_sequence
+
     print('[INFO] Training network...')
 
-    train_batch_ratio = len(x_train) // batch_size
-    steps_per_epoch = train_batch_ratio if train_batch_ratio > 0 else 1
+    # The images are scaled to float32 batch by batch
+    # The sequence shuffles the images itself, so the order of the
+    # batches is not shuffled by Keras
+    if augmentation_cache is None:
+        train_sequence = \
+            get_batch_sequence(x_train,
+                               y_train,
+                               batch_size=batch_size,
+                               image_generator=image_generator)
+    else:
+        train_sequence = CachedBatchSequence(augmentation_cache,
+                                             y_train,
+                                             batch_size=batch_size)
+    val_sequence = get_batch_sequence(x_val,
+                                      y_val,
+                                      batch_size=batch_size,
+                                      shuffle=False)
 
     history = \
-        model.fit_generator(image_generator.flow(x_train,
-                                                 y_train,
-                                                 batch_size=batch_size),
-                            validation_data=(x_val, y_val),
-                            steps_per_epoch=steps_per_epoch,
+        model.fit_generator(train_sequence,
+                            validation_data=val_sequence,
+                            steps_per_epoch=len(train_sequence),
+                            validation_steps=len(val_sequence),
                             epochs=epochs,
+                            workers=workers,
+                            max_queue_size=max_queue_size,
+                            use_multiprocessing=use_multiprocessing,
+                            shuffle=False,
+                            callbacks=callbacks,
                             verbose=1)
 
     # Save the model to disk
@@ -412,6 +634,15 @@ def train_model(model,
     model.save(str(model_path))
     print('[INFO] Saved to {}'.format(model_path))
 
+    if export:
+        # The export is optional, so a failing conversion must not
+        # lose the trained model
+        try:
+            export_tflite(model, model_path)
+        except Exception as e:
+            print(f'[WARN] Could not export {model_name} to TensorFlow '
+                  f'Lite: {e}')
+
     return history
 
 
@@ -435,6 +666,8 @@ def plot_training(history, plot_dir, plot_name='last'):
         Name of plot
     """
 
+    from matplotlib import pyplot as plt
+
     plt.style.use('ggplot')
     plt.figure()
     n_epochs = np.arange(0, len(history.history['loss']))
@@ -458,3 +691,81 @@ def plot_training(history, plot_dir, plot_name='last'):
 
     plt.savefig(str(plot_path))
     print('[INFO] Saved to {}'.format(plot_path))
+
+
+def plot_throughput(records, plot_dir, plot_name='last'):
+    """
+    Stores and plots where the time of the training epochs was spent
+
+    The records are stored as json, and the time spent waiting for
+    data, in the training steps and in the rest of the epochs is
+    plotted next to the training history
+
+    Parameters
+    ----------
+    records : list
+        The records of each epoch as given by
+        `ThroughputMonitor.records`
+    plot_dir : Path
+        Directory where to store the report and the plot
+    plot_name : str
+        Name of plot
+
+    Returns
+    -------
+    report_path : Path
+        Path to the json report
+    plot_path : Path
+        Path to the plot
+    """
+
+    if not plot_dir.is_dir():
+        plot_dir.mkdir(parents=True, exist_ok=True)
+
+    report_path = plot_dir.joinpath(f'{plot_name}_throughput.json')
+    with report_path.open('w') as f:
+        json.dump(records, f, indent=2)
+    print('[INFO] Saved to {}'.format(report_path))
+
+    train_time = sum(record['data_wait'] + record['compute']
+                     for record in records)
+    if train_time > 0:
+        total_data_wait = sum(record['data_wait'] for record in records)
+        n_samples = sum((record['samples_per_sec'] or 0) *
+                        (record['data_wait'] + record['compute'])
+                        for record in records)
+        print(f'[INFO] Spent {100 * total_data_wait / train_time:.0f} % '
+              f'of the training time waiting for data, at '
+              f'{n_samples / train_time:.1f} samples/sec')
+
+    epochs = np.array([record['epoch'] for record in records])
+    data_wait = np.array([record['data_wait'] for record in records])
+    compute = np.array([record['compute'] for record in records])
+    other = np.array([record['other'] for record in records])
+
+    from matplotlib import pyplot as plt
+
+    plt.style.use('ggplot')
+    fig, (time_ax, rate_ax) = plt.subplots(2, 1, sharex=True)
+    time_ax.bar(epochs, data_wait, label='Data wait')
+    time_ax.bar(epochs, compute, bottom=data_wait, label='Compute')
+    time_ax.bar(epochs,
+                other,
+                bottom=data_wait + compute,
+                label='Other (validation)')
+    time_ax.set_title('Time per epoch for fruit classifier')
+    time_ax.set_ylabel('Time [s]')
+    time_ax.legend(loc='best')
+
+    samples_per_sec = [record['samples_per_sec'] for record in records]
+    rate_ax.plot(epochs, samples_per_sec, marker='o')
+    rate_ax.set_xlabel('Epoch #')
+    rate_ax.set_ylabel('Samples/sec')
+
+    plot_path = plot_dir.joinpath(f'{plot_name}_throughput.png')
+
+    fig.savefig(str(plot_path))
+    plt.close(fig)
+    print('[INFO] Saved to {}'.format(plot_path))
+
+    return report_path, plot_path
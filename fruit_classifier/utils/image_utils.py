@@ -1,5 +1,5 @@
 import cv2
-from keras.preprocessing.image import img_to_array
+import numpy as np
 
 
 def open_image(image_path):
@@ -19,11 +19,65 @@ def open_image(image_path):
 
     image = cv2.imread(str(image_path))
     # Cast to array and convert from BGR (OpenCV standard) to RGB
-    image_array = img_to_array(image)[..., ::-1]
+    image_array = np.asarray(image, dtype='float32')[..., ::-1]
 
     return image_array
 
 
+def decode_image(image_bytes):
+    """
+    Decodes an encoded image (for example the bytes of a jpg file)
+
+    Parameters
+    ----------
+    image_bytes : bytes
+        The encoded image
+
+    Returns
+    -------
+    image_array : None or np.array, shape (height, width, channels)
+        The image as a numpy array (RGB order)
+        None if the bytes could not be decoded
+    """
+
+    # imdecode raises on an empty buffer rather than returning None
+    if len(image_bytes) == 0:
+        return None
+
+    try:
+        image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8),
+                             cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+    if image is None:
+        return None
+
+    # Cast to array and convert from BGR (OpenCV standard) to RGB
+    image_array = np.asarray(image, dtype='float32')[..., ::-1]
+
+    return image_array
+
+
+def normalize_images(images):
+    """
+    Scales the raw pixel intensities to the range [0, 1]
+
+    Parameters
+    ----------
+    images : np.array, shape (..., height, width, channels)
+        The images with pixel intensities in the range [0, 255]
+
+    Returns
+    -------
+    normalized_images : np.array, shape (..., height, width, channels)
+        The images as float32 in the range [0, 1]
+    """
+
+    normalized_images = np.asarray(images, dtype='float32') / 255
+
+    return normalized_images
+
+
 def get_image_paths(path):
     """
     Returns a list of image paths
@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+
+
+def get_n_workers(n_workers=None):
+    """
+    Returns the number of workers to use
+
+    Parameters
+    ----------
+    n_workers : None or int
+        The requested number of workers
+        If None or less than 1, the number of CPUs is used
+
+    Returns
+    -------
+    n_workers : int
+        The number of workers to use
+    """
+
+    if n_workers is None or n_workers < 1:
+        n_workers = os.cpu_count() or 1
+
+    return n_workers
+
+
+def parallel_map(func, items, n_workers=None, chunk_size=16, desc=None):
+    """
+    Applies a function to all the items using a pool of processes
+
+    The items are sent to the workers in chunks of `chunk_size` items.
+    The progress bar is updated in the main process as the results
+    arrive, so it is not garbled by the workers.
+
+    Parameters
+    ----------
+    func : callable
+        The function to apply
+        Must be picklable (i.e. defined at module level, or a
+        functools.partial of such a function)
+    items : list
+        The items to apply the function to
+    n_workers : None or int
+        Number of worker processes
+        If None, the number of CPUs is used
+        If 1, the items are processed in the current process
+    chunk_size : int
+        Number of items sent to a worker at the time
+    desc : None or str
+        Description of the progress bar
+
+    Returns
+    -------
+    results : list
+        The results in the same order as `items`
+    """
+
+    n_workers = min(get_n_workers(n_workers), max(len(items), 1))
+
+    if n_workers == 1:
+        return [func(item) for item in tqdm(items, desc=desc)]
+
+    results = list()
+    with ProcessPoolExecutor(n_workers) as executor, \
+            tqdm(total=len(items), desc=desc) as progress_bar:
+        for result in executor.map(func, items, chunksize=chunk_size):
+            results.append(result)
+            progress_bar.update()
+
+    return results
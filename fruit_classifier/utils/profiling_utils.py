@@ -0,0 +1,292 @@
+"""
+Contains the latency profiling of the prediction path
+
+The latency of each stage (decoding, resizing, inference, ...) is
+recorded in an in-process histogram when profiling is enabled, either
+by the `--profile` flag of the predict command or by setting the
+`FRUIT_PROFILE` environment variable to 1.
+When disabled, the stages are run without being timed
+"""
+
+import os
+import time
+import threading
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_NAME = 'fruit_classifier_stage_latency_seconds'
+
+
+class LatencyHistogram(object):
+    """
+    Records the latencies of a stage
+
+    The latencies are counted in fixed buckets, as exposed to
+    Prometheus, and the most recent `max_samples` latencies are kept
+    to compute the quantiles
+    """
+
+    def __init__(self, buckets=BUCKETS, max_samples=10000):
+        """
+        Sets up the histogram
+
+        Parameters
+        ----------
+        buckets : tuple
+            The increasing upper bounds of the buckets in seconds
+        max_samples : int
+            Number of recent latencies the quantiles are computed from
+        """
+
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """
+        Records a latency
+
+        Parameters
+        ----------
+        seconds : float
+            The latency in seconds
+        """
+
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            self.samples.append(seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def get_quantiles(self, quantiles=QUANTILES):
+        """
+        Returns the quantiles of the recent latencies
+
+        Parameters
+        ----------
+        quantiles : tuple
+            The quantiles to compute (in [0, 1])
+
+        Returns
+        -------
+        values : dict
+            The latency in seconds keyed by the quantile
+            The latencies are None if nothing is recorded
+        """
+
+        with self._lock:
+            samples = np.array(self.samples)
+
+        if len(samples) == 0:
+            return {quantile: None for quantile in quantiles}
+
+        values = np.quantile(samples, quantiles)
+
+        return {quantile: float(value)
+                for quantile, value in zip(quantiles, values)}
+
+    def get_cumulative_counts(self):
+        """
+        Returns the cumulative counts of the buckets
+
+        Returns
+        -------
+        counts : list
+            The number of latencies less than or equal to each bound
+        """
+
+        with self._lock:
+            return list(np.cumsum(self.bucket_counts, dtype=int))
+
+
+class Profiler(object):
+    """
+    Records the latencies of the stages in histograms
+    """
+
+    def __init__(self, enabled=False):
+        """
+        Sets up the profiler
+
+        Parameters
+        ----------
+        enabled : bool
+            Whether to record the latencies
+        """
+
+        self.enabled = enabled
+        self.histograms = dict()
+        self._lock = threading.Lock()
+
+    def get_histogram(self, stage):
+        """
+        Returns the histogram of a stage, and creates it on first use
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage
+
+        Returns
+        -------
+        histogram : LatencyHistogram
+            The histogram of the stage
+        """
+
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+
+            return self.histograms[stage]
+
+    @contextmanager
+    def stage(self, stage):
+        """
+        Times the code run in the context as a stage
+
+        Example
+        -------
+        >>> with profiler.stage('resize'):
+        ...     image = resize_image(image)
+
+        Parameters
+        ----------
+        stage : str
+            Name of the stage
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.get_histogram(stage).observe(time.perf_counter() - start)
+
+    def reset(self):
+        """
+        Removes all the recorded latencies
+        """
+
+        with self._lock:
+            self.histograms = dict()
+
+    def get_summary(self):
+        """
+        Returns a summary of the latencies of the stages
+
+        Returns
+        -------
+        summary : dict
+            For each stage the `count`, the `total` and `mean` latency,
+            and the `p50`, `p95` and `p99` latencies in seconds
+        """
+
+        with self._lock:
+            histograms = dict(self.histograms)
+
+        summary = dict()
+        for stage, histogram in histograms.items():
+            quantiles = histogram.get_quantiles()
+            summary[stage] = dict(count=histogram.count,
+                                  total=histogram.sum,
+                                  mean=histogram.sum / histogram.count,
+                                  p50=quantiles[0.5],
+                                  p95=quantiles[0.95],
+                                  p99=quantiles[0.99])
+
+        return summary
+
+    def to_prometheus(self, metric_name=METRIC_NAME, labels=None):
+        """
+        Returns the latencies in the Prometheus text format
+
+        Every stage is exposed as a histogram with the stage as label,
+        and the p50, p95 and p99 latencies are exposed as a summary
+        named `<metric_name>_quantiles`
+
+        Parameters
+        ----------
+        metric_name : str
+            Name of the metric
+        labels : None or dict
+            Labels added to every sample, such as the worker which
+            recorded the latencies
+
+        Returns
+        -------
+        text : str
+            The metrics in the Prometheus text format
+        """
+
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+
+        labels = dict() if labels is None else labels
+        prefix = ''.join(f'{name}="{value}",'
+                         for name, value in labels.items())
+
+        lines = [f'# HELP {metric_name} Latency of the prediction stages',
+                 f'# TYPE {metric_name} histogram']
+        for stage, histogram in histograms:
+            stage_labels = f'{prefix}stage="{stage}"'
+            counts = histogram.get_cumulative_counts()
+            for bound, count in zip(histogram.buckets, counts):
+                lines.append(f'{metric_name}_bucket'
+                             f'{{{stage_labels},le="{bound}"}} {count}')
+            lines.append(f'{metric_name}_bucket'
+                         f'{{{stage_labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric_name}_sum{{{stage_labels}}} '
+                         f'{histogram.sum}')
+            lines.append(f'{metric_name}_count{{{stage_labels}}} '
+                         f'{histogram.count}')
+
+        quantile_name = f'{metric_name}_quantiles'
+        lines += [f'# HELP {quantile_name} Recent latency quantiles of the '
+                  f'prediction stages',
+                  f'# TYPE {quantile_name} summary']
+        for stage, histogram in histograms:
+            stage_labels = f'{prefix}stage="{stage}"'
+            for quantile, value in histogram.get_quantiles().items():
+                value = 'NaN' if value is None else value
+                lines.append(f'{quantile_name}'
+                             f'{{{stage_labels},quantile="{quantile}"}} '
+                             f'{value}')
+            lines.append(f'{quantile_name}_sum{{{stage_labels}}} '
+                         f'{histogram.sum}')
+            lines.append(f'{quantile_name}_count{{{stage_labels}}} '
+                         f'{histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def print_summary(self):
+        """
+        Prints the latencies of the stages in milliseconds
+        """
+
+        print(f'[INFO] {"Stage [ms]":<16}{"Count":>8}{"Total":>10}'
+              f'{"Mean":>10}{"p50":>10}{"p95":>10}{"p99":>10}')
+        for stage, latencies in self.get_summary().items():
+            print(f'[INFO] {stage:<16}{latencies["count"]:>8}'
+                  f'{1000 * latencies["total"]:>10.2f}'
+                  f'{1000 * latencies["mean"]:>10.2f}'
+                  f'{1000 * latencies["p50"]:>10.2f}'
+                  f'{1000 * latencies["p95"]:>10.2f}'
+                  f'{1000 * latencies["p99"]:>10.2f}')
+
+
+# The profiler shared by the prediction path
+profiler = Profiler(enabled=os.environ.get('FRUIT_PROFILE', '0') == '1')
@@ -0,0 +1,105 @@
+import io
+import os
+import json
+import zipfile
+import unittest
+import numpy as np
+from pathlib import Path
+from unittest.mock import patch
+from sklearn.preprocessing import OneHotEncoder
+import app.__main__ as app_main
+from fruit_classifier.predict.batch_predictor import BatchPredictor
+from fruit_classifier.utils.profiling_utils import Profiler
+from test.fruit_classifier.predict.test_batch_predictor import MockModel
+from test.fruit_classifier.predict.test_batch_predictor import MockRegistry
+
+
+class TestApp(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[1]
+        self.image_bytes = test_dir.joinpath('data',
+                                             'raw',
+                                             'bananas',
+                                             '1. banana-1.png').read_bytes()
+
+        classes = np.array(['apples', 'bananas', 'oranges'])
+        label_encoder = OneHotEncoder()
+        label_encoder.fit(classes.reshape(-1, 1))
+        self.predictor = BatchPredictor(MockRegistry(MockModel(len(classes)),
+                                                     label_encoder))
+        self.addCleanup(self.predictor.stop)
+
+        patcher = patch.object(app_main, 'predictor', self.predictor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = app_main.app.test_client()
+
+    def test_predict_batch_skips_empty_images(self):
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('empty.png', b'')
+            zip_file.writestr('a.png', self.image_bytes)
+        zip_buffer.seek(0)
+
+        files = [(zip_buffer, 'images.zip'),
+                 (io.BytesIO(b''), 'empty.jpg'),
+                 (io.BytesIO(self.image_bytes), 'b.png')]
+        response = self.client.post('/api/predict_batch',
+                                    data=dict(files=files),
+                                    content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)['image'] for line in lines],
+                         ['a.png', 'b.png'])
+
+    def test_predict_batch_skips_large_zipped_images(self):
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer,
+                             'w',
+                             compression=zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('bomb.png', bytes(1024 ** 2))
+            zip_file.writestr('a.png', self.image_bytes)
+        zip_buffer.seek(0)
+
+        with patch.dict(app_main.app.config,
+                        MAX_IMAGE_SIZE=len(self.image_bytes)):
+            response = self.client.post('/api/predict_batch',
+                                        data=dict(files=[(zip_buffer,
+                                                          'images.zip')]),
+                                        content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line)['image'] for line in lines],
+                         ['a.png'])
+
+    def test_predict_batch_rejects_large_requests(self):
+        files = [(io.BytesIO(self.image_bytes), 'a.png')]
+        with patch.dict(app_main.app.config, MAX_CONTENT_LENGTH=1024):
+            response = self.client.post('/api/predict_batch',
+                                        data=dict(files=files),
+                                        content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_predict_empty_image(self):
+        response = self.client.post('/api/predict', data=b'')
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics_are_labelled_with_the_worker(self):
+        profiler = Profiler(enabled=True)
+        profiler.get_histogram('decode').observe(0.002)
+
+        with patch.object(app_main, 'profiler', profiler):
+            response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'{{worker="{os.getpid()}",stage="decode"}}',
+                      response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import signal
+import unittest
+import subprocess
+import urllib.request
+from pathlib import Path
+
+SERVER_CODE = """
+import os
+from app.prefork import PreforkServer
+
+
+def app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid()).encode()]
+
+
+PreforkServer(app, host='127.0.0.1', port=0, n_workers=2).serve_forever()
+"""
+
+FAILING_SERVER_CODE = """
+from app.prefork import PreforkServer
+
+
+def post_fork():
+    raise RuntimeError('Could not load the model')
+
+
+PreforkServer(None,
+              host='127.0.0.1',
+              port=0,
+              n_workers=2,
+              post_fork=post_fork,
+              max_failures=3,
+              max_backoff=1.0).serve_forever(poll_interval=0.1)
+"""
+
+SLOW_FAILING_SERVER_CODE = """
+import time
+from app.prefork import PreforkServer
+
+
+def post_fork():
+    time.sleep(0.5)
+    raise RuntimeError('Could not load the model')
+
+
+PreforkServer(None,
+              host='127.0.0.1',
+              port=0,
+              n_workers=1,
+              post_fork=post_fork,
+              min_uptime=0.1,
+              max_failures=2,
+              max_backoff=1.0).serve_forever(poll_interval=0.1)
+"""
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'Needs os.fork')
+class TestPreforkServer(unittest.TestCase):
+
+    def setUp(self):
+        root_dir = Path(__file__).absolute().parents[2]
+        self.process = subprocess.Popen([sys.executable, '-c', SERVER_CODE],
+                                        cwd=str(root_dir),
+                                        stdout=subprocess.PIPE,
+                                        universal_newlines=True)
+        # [INFO] Serving on 127.0.0.1:<port> with 2 workers
+        line = self.process.stdout.readline()
+        port = line.split(':')[1].split(' ')[0]
+        self.url = f'http://127.0.0.1:{port}/'
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            self.process.wait(timeout=15)
+        self.process.stdout.close()
+
+    def get_worker_pid(self):
+        with urllib.request.urlopen(self.url, timeout=10) as response:
+            return int(response.read())
+
+    def test_serve_forever(self):
+        pids = {self.get_worker_pid() for _ in range(10)}
+        self.assertNotIn(self.process.pid, pids)
+
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(timeout=15), 0)
+        for pid in pids:
+            with self.assertRaises(ProcessLookupError):
+                os.kill(pid, 0)
+
+    def test_replaces_dead_workers(self):
+        pid = self.get_worker_pid()
+        os.kill(pid, signal.SIGKILL)
+
+        # The other worker serves the requests until the dead worker is
+        # replaced
+        for _ in range(10):
+            self.assertNotEqual(self.get_worker_pid(), pid)
+
+    def test_workers_stop_with_master(self):
+        pids = {self.get_worker_pid() for _ in range(10)}
+
+        self.process.kill()
+        self.process.wait()
+        for pid in pids:
+            for _ in range(50):
+                try:
+                    os.kill(pid, 0)
+                except ProcessLookupError:
+                    break
+                time.sleep(0.1)
+            else:
+                self.fail(f'Worker {pid} outlived the master')
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'Needs os.fork')
+class TestPreforkServerFailingWorkers(unittest.TestCase):
+
+    def run_server(self, code):
+        root_dir = Path(__file__).absolute().parents[2]
+        process = subprocess.Popen([sys.executable, '-c', code],
+                                   cwd=str(root_dir),
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   universal_newlines=True)
+        try:
+            stdout, stderr = process.communicate(timeout=30)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        return process, stdout, stderr
+
+    def test_stops_after_repeated_failures(self):
+        process, stdout, stderr = self.run_server(FAILING_SERVER_CODE)
+
+        self.assertNotEqual(process.returncode, 0)
+        self.assertIn('in a row died', stderr)
+        # The failed workers are replaced after a backoff, not at once
+        self.assertIn('replacing it in 1 s', stdout)
+        self.assertLess(stdout.count('[WARN] Worker'), 10)
+
+    def test_stops_after_slow_post_fork_failures(self):
+        # The workers fail after min_uptime, but still count as failed
+        # to start as their post_fork raised
+        process, stdout, stderr = \
+            self.run_server(SLOW_FAILING_SERVER_CODE)
+
+        self.assertNotEqual(process.returncode, 0)
+        self.assertIn('in a row died', stderr)
+        self.assertIn('replacing it in 1 s', stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+from benchmarks.import_time import LAZY_ENTRY_POINTS
+from benchmarks.import_time import time_import
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_time_import(self):
+        result = time_import('json')
+
+        self.assertGreaterEqual(result['seconds'], 0)
+        self.assertEqual(result['heavy_modules'], [])
+
+    def test_lazy_entry_points(self):
+        for module in LAZY_ENTRY_POINTS:
+            with self.subTest(module=module):
+                result = time_import(module)
+                self.assertEqual(result['heavy_modules'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+from benchmarks.load_benchmark import get_summary
+from benchmarks.load_benchmark import get_test_image
+from fruit_classifier.utils.image_utils import decode_image
+
+
+class TestLoadBenchmark(unittest.TestCase):
+
+    def test_get_test_image(self):
+        image = decode_image(get_test_image(32, 48))
+        self.assertEqual(image.shape, (32, 48, 3))
+
+    def test_get_summary(self):
+        latencies = list(np.linspace(0.001, 0.1, 100))
+        summary = get_summary(latencies, 2, 2.0)
+
+        self.assertEqual(summary['requests'], 102)
+        self.assertEqual(summary['errors'], 2)
+        self.assertAlmostEqual(summary['requests_per_sec'], 50.0)
+        self.assertAlmostEqual(summary['p50_ms'], 50.5)
+        self.assertAlmostEqual(summary['max_ms'], 100.0)
+        self.assertLessEqual(summary['p95_ms'], summary['p99_ms'])
+
+    def test_get_summary_without_successful_requests(self):
+        summary = get_summary([], 3, 1.0)
+
+        self.assertEqual(summary['requests'], 3)
+        self.assertEqual(summary['requests_per_sec'], 0.0)
+        self.assertIsNone(summary['p99_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import shutil
+from pathlib import Path
+from benchmarks.pipeline_benchmark import CLASSES
+from benchmarks.pipeline_benchmark import compare_to_baseline
+from benchmarks.pipeline_benchmark import make_synthetic_images
+from benchmarks.pipeline_benchmark import time_stage
+from fruit_classifier.utils.image_utils import get_image_paths
+from fruit_classifier.utils.image_utils import open_image
+
+
+class TestPipelineBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[1]
+        self.tmp_dir = test_dir.joinpath('tmp_benchmark')
+
+    def tearDown(self):
+        if self.tmp_dir.is_dir():
+            shutil.rmtree(self.tmp_dir)
+
+    def test_make_synthetic_images(self):
+        make_synthetic_images(self.tmp_dir, 3, 32, 48)
+
+        image_paths = get_image_paths(self.tmp_dir)
+        # Including one unreadable file per class
+        self.assertEqual(len(image_paths), 4 * len(CLASSES))
+        self.assertEqual(open_image(image_paths[0]).shape, (32, 48, 3))
+
+    def test_time_stage(self):
+        calls = list()
+        seconds, output = time_stage(lambda x: calls.append(x) or x,
+                                     repeats=3,
+                                     setup=lambda: len(calls))
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual(output, 2)
+        self.assertGreaterEqual(seconds, 0)
+
+    def test_compare_to_baseline(self):
+        baseline = dict(fast=dict(seconds=0.001),
+                        slow=dict(seconds=1.0),
+                        stable=dict(seconds=1.0))
+        results = dict(fast=dict(seconds=0.002),
+                       slow=dict(seconds=2.0),
+                       stable=dict(seconds=1.1),
+                       new=dict(seconds=1.0))
+
+        comparison = compare_to_baseline(results, baseline, 0.25)
+
+        self.assertEqual(set(comparison), {'fast', 'slow', 'stable'})
+        # Slower, but within the noise
+        self.assertFalse(comparison['fast']['regressed'])
+        self.assertTrue(comparison['slow']['regressed'])
+        self.assertAlmostEqual(comparison['slow']['ratio'], 2.0)
+        self.assertFalse(comparison['stable']['regressed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
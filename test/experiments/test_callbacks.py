@@ -0,0 +1,81 @@
+import unittest
+from experiments.callbacks import MetricsStreamer
+
+
+class MockExperiment(object):
+
+    def __init__(self):
+        self.logged = list()
+
+    def log_scalar(self, name, value, step=None):
+        self.logged.append((name, value, step))
+
+
+class TestCallbacks(unittest.TestCase):
+
+    def train(self, callback, n_epochs=2, n_batches=3):
+        for epoch in range(n_epochs):
+            callback.on_epoch_begin(epoch)
+            for batch in range(n_batches):
+                callback.on_batch_begin(batch)
+                callback.on_batch_end(batch, dict(loss=0.5, accuracy=0.75))
+            callback.on_epoch_end(epoch, dict(loss=0.5,
+                                              accuracy=0.75,
+                                              val_loss=0.25,
+                                              val_accuracy=1.0))
+        callback.on_train_end()
+
+    def test_metrics_streamer(self):
+        ex = MockExperiment()
+        streamer = MetricsStreamer(ex, batch_size=4, flush_interval=0.0)
+        self.train(streamer)
+
+        names = {name for name, _, _ in ex.logged}
+        self.assertEqual(names, {'batch.loss',
+                                 'batch.accuracy',
+                                 'batch.step_time',
+                                 'batch.data_wait',
+                                 'batch.samples_per_sec',
+                                 'loss',
+                                 'acc',
+                                 'val_loss',
+                                 'val_acc',
+                                 'epoch.time',
+                                 'epoch.data_wait',
+                                 'epoch.samples_per_sec'})
+
+        batch_steps = [step for name, _, step in ex.logged
+                       if name == 'batch.loss']
+        self.assertEqual(batch_steps, [1, 2, 3, 4, 5, 6])
+        val_acc = [(value, step) for name, value, step in ex.logged
+                   if name == 'val_acc']
+        self.assertEqual(val_acc, [(1.0, 1), (1.0, 2)])
+        self.assertEqual(streamer.epoch_samples, 12)
+
+    def test_buffering(self):
+        ex = MockExperiment()
+        streamer = MetricsStreamer(ex, batch_size=4, flush_interval=3600.0)
+
+        streamer.on_epoch_begin(0)
+        streamer.on_batch_begin(0)
+        streamer.on_batch_end(0, dict(loss=0.5))
+        self.assertEqual(len(ex.logged), 0)
+        self.assertGreater(len(streamer.buffer), 0)
+
+        streamer.on_epoch_end(0, dict(loss=0.5))
+        streamer.on_train_end()
+        self.assertGreater(len(ex.logged), 0)
+        self.assertEqual(len(streamer.buffer), 0)
+
+    def test_epochs_only(self):
+        ex = MockExperiment()
+        streamer = MetricsStreamer(ex, flush_interval=0.0, log_batches=False)
+        self.train(streamer)
+
+        names = {name for name, _, _ in ex.logged}
+        self.assertFalse(any(name.startswith('batch.') for name in names))
+        self.assertIn('val_acc', names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import unittest
+from unittest import mock
+from sacred import Experiment
+from sacred.observers import FileStorageObserver
+from experiments.observers import get_observer
+from experiments.observers import set_observer
+
+
+class TestObservers(unittest.TestCase):
+
+    def test_get_observer(self):
+        self.assertIsNone(get_observer('none'))
+        self.assertIsInstance(get_observer('file'), FileStorageObserver)
+
+        with mock.patch.dict(os.environ, dict(SACRED_OBSERVER='none')):
+            self.assertIsNone(get_observer())
+
+        with self.assertRaises(NotImplementedError):
+            get_observer('sqlite')
+
+    def test_set_observer(self):
+        ex = Experiment('test_observers')
+        set_observer(ex, 'file')
+        set_observer(ex, 'file')
+        self.assertEqual(len(ex.observers), 1)
+
+        set_observer(ex, 'none')
+        self.assertEqual(len(ex.observers), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
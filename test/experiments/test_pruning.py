@@ -0,0 +1,72 @@
+import unittest
+import shutil
+from pathlib import Path
+from experiments.pruning import PruningCallback
+from experiments.pruning import RungStore
+from experiments.pruning import get_rungs
+from experiments.pruning import is_promising
+
+
+class MockModel(object):
+
+    def __init__(self):
+        self.stop_training = False
+
+
+class TestPruning(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[1]
+        self.store_dir = test_dir.joinpath('tmp_rungs')
+
+    def tearDown(self):
+        if self.store_dir.is_dir():
+            shutil.rmtree(self.store_dir)
+
+    def test_get_rungs(self):
+        self.assertEqual(get_rungs(20, 1, 3), [1, 3, 9])
+        self.assertEqual(get_rungs(20, 2, 2), [2, 4, 8, 16])
+        self.assertEqual(get_rungs(1, 1, 3), [])
+
+    def test_is_promising(self):
+        # Too few trials to tell
+        self.assertTrue(is_promising(0.1, [0.1, 0.9], 3))
+        self.assertTrue(is_promising(0.9, [0.1, 0.5, 0.9], 3))
+        self.assertFalse(is_promising(0.5, [0.1, 0.5, 0.9], 3))
+        self.assertTrue(is_promising(0.7, [0.1, 0.5, 0.7, 0.9], 2))
+        self.assertFalse(is_promising(0.5, [0.1, 0.5, 0.7, 0.9], 2))
+
+    def test_rung_store(self):
+        store = RungStore(self.store_dir)
+        store.report(1, 'a', 0.5)
+        store.report(1, 'b', 0.75)
+        store.report(3, 'a', 0.8)
+
+        self.assertEqual(store.get_values(1), dict(a=0.5, b=0.75))
+        self.assertEqual(store.get_values(3), dict(a=0.8))
+        self.assertEqual(store.get_values(9), dict())
+
+    def test_pruning_callback(self):
+        callbacks = dict()
+        for trial, value in (('a', 0.9), ('b', 0.8), ('c', 0.1)):
+            callback = PruningCallback(trial,
+                                       self.store_dir,
+                                       max_epochs=20,
+                                       min_epochs=2,
+                                       reduction_factor=3)
+            callback.set_model(MockModel())
+            # Not a rung
+            callback.on_epoch_end(0, dict(val_accuracy=value))
+            callback.on_epoch_end(1, dict(val_accuracy=value))
+            callbacks[trial] = callback
+
+        # The first trials have too few peers to be pruned
+        self.assertIsNone(callbacks['a'].pruned_epoch)
+        self.assertIsNone(callbacks['b'].pruned_epoch)
+        self.assertFalse(callbacks['b'].model.stop_training)
+        self.assertEqual(callbacks['c'].pruned_epoch, 2)
+        self.assertTrue(callbacks['c'].model.stop_training)
+
+
+if __name__ == '__main__':
+    unittest.main()
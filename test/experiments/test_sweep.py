@@ -0,0 +1,122 @@
+import json
+import unittest
+import numpy as np
+from pathlib import Path
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from experiments.sweep import get_trials
+from experiments.sweep import run_sweep
+from experiments.sweep import sample_value
+from experiments.utils import get_configuration
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.config = dict(
+            sweep_space={'model_setup.dropout': [0.0, 0.5],
+                         'optimizer_setup.batch_size': [16, 32, 64]})
+
+    def test_grid_trials(self):
+        trials = get_trials(self.config, method='grid')
+
+        self.assertEqual(len(trials), 6)
+        self.assertIn(dict(model_setup=dict(dropout=0.5),
+                           optimizer_setup=dict(batch_size=16)),
+                      trials)
+
+    def test_random_trials(self):
+        self.config['sweep_space']['optimizer_setup.'
+                                   'initial_learning_rate'] = \
+            ('loguniform', 1e-4, 1e-2)
+        trials = get_trials(self.config, method='random', n_trials=5)
+
+        self.assertEqual(len(trials), 5)
+        self.assertEqual(trials,
+                         get_trials(self.config,
+                                    method='random',
+                                    n_trials=5))
+        for trial in trials:
+            self.assertIn(trial['model_setup']['dropout'], (0.0, 0.5))
+            learning_rate = \
+                trial['optimizer_setup']['initial_learning_rate']
+            self.assertTrue(1e-4 <= learning_rate <= 1e-2)
+
+        # Distributions can not be searched on a grid
+        with self.assertRaises(ValueError):
+            get_trials(self.config, method='grid')
+
+    def test_invalid_method(self):
+        with self.assertRaises(NotImplementedError):
+            get_trials(self.config, method='bayesian')
+
+    def test_sample_value(self):
+        random_state = np.random.RandomState(0)
+        value = sample_value(('randint', 1, 3), random_state)
+        self.assertIn(value, (1, 2, 3))
+        self.assertIsInstance(value, int)
+
+        with self.assertRaises(NotImplementedError):
+            sample_value(('normal', 0, 1), random_state)
+
+    def test_get_configuration_overrides(self):
+        overrides = dict(model_setup=dict(dropout=0.5),
+                         sweep=dict(method='grid'))
+        config = get_configuration('first_experiment.ini', overrides)
+
+        self.assertEqual(config['model_setup']['dropout'], 0.5)
+        self.assertEqual(config['sweep'], dict(method='grid'))
+        self.assertEqual(config['train']['model_type'], 'leNet')
+
+
+class TestRunSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.config = dict(
+            train=dict(model_name='test_failing_sweep'),
+            sweep=dict(method='grid', n_workers=2),
+            sweep_space={'model_setup.dropout': [0.0, 0.25, 0.5]})
+
+        root_dir = Path(__file__).absolute().parents[2]
+        self.results_path = root_dir.joinpath('reports',
+                                              'sweeps',
+                                              'test_failing_sweep.json')
+
+    def tearDown(self):
+        if self.results_path.is_file():
+            self.results_path.unlink()
+
+    @staticmethod
+    def get_thread_pool(n_workers, **kwargs):
+        # Threads see the patched run_trial, spawned processes do not
+        return ThreadPoolExecutor(n_workers)
+
+    @staticmethod
+    def run_trial(experiment_file, overrides):
+        dropout = overrides['model_setup']['dropout']
+        if dropout == 0.25:
+            raise RuntimeError('NaN loss')
+        return 1.0 - dropout, None
+
+    def test_failing_trial(self):
+        with patch('experiments.sweep.get_configuration',
+                   return_value=self.config), \
+                patch('experiments.sweep.prepare_data'), \
+                patch('experiments.sweep.ProcessPoolExecutor',
+                      self.get_thread_pool), \
+                patch('experiments.sweep.run_trial', self.run_trial):
+            results = run_sweep('sweep.ini')
+
+        self.assertEqual([result['result'] for result in results],
+                         [1.0, 0.5, None])
+        self.assertEqual(results[-1]['model_name'],
+                         'test_failing_sweep_trial_001')
+        self.assertEqual(results[-1]['error'], 'NaN loss')
+        self.assertIsNone(results[0]['error'])
+
+        with self.results_path.open() as f:
+            self.assertEqual(json.load(f), results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import shutil
+from pathlib import Path
+from sacred import Experiment
+from sacred.observers import FileStorageObserver
+from experiments.sync import sync_runs
+
+
+class RecordingObserver(object):
+    """Records the replayed events"""
+
+    def __init__(self):
+        self.events = list()
+
+    def started_event(self, ex_info, command, host_info, start_time,
+                      config, meta_info, _id):
+        self.events.append(('started', config))
+        return len(self.events)
+
+    def log_metrics(self, metrics_by_name, info):
+        self.events.append(('metrics', metrics_by_name))
+
+    def artifact_event(self, name, filename):
+        self.events.append(('artifact', Path(filename).read_text()))
+
+    def heartbeat_event(self, info, captured_out, beat_time, result):
+        self.events.append(('heartbeat', info))
+
+    def completed_event(self, stop_time, result):
+        self.events.append(('completed', result))
+
+
+class TestSync(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[1]
+        self.tmp_dir = test_dir.joinpath('tmp_sync')
+        self.runs_dir = self.tmp_dir.joinpath('runs')
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        artifact_path = self.tmp_dir.joinpath('artifact.txt')
+        artifact_path.write_text('content')
+
+        ex = Experiment('test_sync')
+        ex.observers.append(FileStorageObserver.create(
+            str(self.runs_dir)))
+        ex.add_config(dict(dropout=0.5))
+
+        @ex.main
+        def main():
+            for loss in (1.0, 0.5):
+                ex.log_scalar('loss', loss)
+            ex.add_artifact(str(artifact_path), name='artifact.txt')
+            ex.info['pruned_epoch'] = 2
+            return 0.75
+
+        ex.run()
+
+    def tearDown(self):
+        if self.tmp_dir.is_dir():
+            shutil.rmtree(self.tmp_dir)
+
+    def test_sync_runs(self):
+        observer = RecordingObserver()
+        synced = sync_runs(self.runs_dir, observer)
+
+        self.assertEqual(len(synced), 1)
+        events = dict(observer.events)
+        self.assertEqual(events['started']['dropout'], 0.5)
+        self.assertEqual(events['metrics']['loss']['values'], [1.0, 0.5])
+        self.assertEqual(events['artifact'], 'content')
+        self.assertEqual(events['heartbeat']['pruned_epoch'], 2)
+        self.assertEqual(events['completed'], 0.75)
+
+        # Synced runs are skipped
+        self.assertEqual(sync_runs(self.runs_dir, RecordingObserver()),
+                         dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+from sklearn.preprocessing import OneHotEncoder
+from fruit_classifier.predict.batch_predictor import BatchPredictor
+
+
+class MockModel(object):
+    """Predicts the class given by the first (uint8) pixel value"""
+
+    def __init__(self, n_classes):
+        self.n_classes = n_classes
+        self.batch_sizes = list()
+
+    def predict(self, images):
+        self.batch_sizes.append(len(images))
+        # The uint8 images are scaled to [0, 1] by classify_many
+        classes = \
+            np.round(images[:, 0, 0, 0] * 255).astype(int) % self.n_classes
+        probabilities = np.full((len(images), self.n_classes), 0.1)
+        probabilities[np.arange(len(images)), classes] = 0.8
+        return probabilities
+
+
+class MockRegistry(object):
+
+    def __init__(self, model, label_encoder):
+        self.model = model
+        self.label_encoder = label_encoder
+
+    def get(self, _):
+        return self.model, self.label_encoder
+
+
+class TestBatchPredictor(unittest.TestCase):
+
+    def setUp(self):
+        self.classes = np.array(['apples', 'bananas', 'oranges'])
+        label_encoder = OneHotEncoder()
+        label_encoder.fit(self.classes.reshape(-1, 1))
+
+        self.model = MockModel(len(self.classes))
+        self.predictor = BatchPredictor(MockRegistry(self.model,
+                                                     label_encoder),
+                                        max_batch_size=4,
+                                        max_wait=0.5)
+
+    def tearDown(self):
+        self.predictor.stop()
+
+    def test_each_caller_gets_own_result(self):
+        images = [np.full((2, 2, 3), i, dtype='uint8')
+                  for i in range(8)]
+        futures = [self.predictor.submit(image) for image in images]
+
+        for i, future in enumerate(futures):
+            prediction = future.result(timeout=10)
+            self.assertEqual(prediction['label'], self.classes[i % 3])
+            self.assertAlmostEqual(prediction['probability'], 0.8)
+            self.assertEqual(sorted(prediction['probabilities']),
+                             list(self.classes))
+
+        self.assertEqual(sum(self.model.batch_sizes), len(images))
+        self.assertLessEqual(max(self.model.batch_sizes), 4)
+        self.assertLess(len(self.model.batch_sizes), len(images))
+
+    def test_exception_is_propagated(self):
+        future = self.predictor.submit(np.zeros((2, 2, 3)))
+        other_future = self.predictor.submit(np.zeros((3, 3, 3)))
+
+        # The images can not be stacked
+        with self.assertRaises(ValueError):
+            future.result(timeout=10)
+        with self.assertRaises(ValueError):
+            other_future.result(timeout=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
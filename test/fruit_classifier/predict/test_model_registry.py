@@ -0,0 +1,98 @@
+import os
+import unittest
+import shutil
+from pathlib import Path
+from unittest.mock import patch
+from fruit_classifier.predict.model_registry import ModelRegistry
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[2]
+        self.model_files_dir = test_dir.joinpath('tmp_model_files')
+        self.model_path = self.model_files_dir.joinpath('models',
+                                                        'test',
+                                                        'model.h5')
+        self.encoder_path = self.model_files_dir.joinpath('encoders',
+                                                          'test',
+                                                          'encoder.pkl')
+
+        for path in (self.model_path, self.encoder_path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'0')
+
+        self.registry = ModelRegistry(self.model_files_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.model_files_dir)
+
+    @patch('fruit_classifier.predict.model_registry.load_label_encoder')
+    @patch('fruit_classifier.predict.model_registry.load_classifier')
+    def test_get_loads_once(self, mock_classifier, mock_encoder):
+        for _ in range(3):
+            self.registry.get('test')
+
+        mock_classifier.assert_called_once()
+        mock_encoder.assert_called_once()
+
+    @patch('fruit_classifier.predict.model_registry.load_label_encoder')
+    @patch('fruit_classifier.predict.model_registry.load_classifier')
+    def test_get_reloads_changed_files(self,
+                                       mock_classifier,
+                                       mock_encoder):
+        self.registry.get('test')
+
+        # Emulate a new model being written to disk
+        self.model_path.write_bytes(b'01')
+        stat = self.model_path.stat()
+        os.utime(str(self.model_path),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.registry.get('test')
+
+        self.assertEqual(mock_classifier.call_count, 2)
+        self.assertEqual(mock_encoder.call_count, 2)
+
+    @patch('fruit_classifier.predict.model_registry.load_label_encoder')
+    @patch('fruit_classifier.predict.model_registry.load_classifier')
+    def test_failed_reload_keeps_model(self,
+                                       mock_classifier,
+                                       mock_encoder):
+        mock_classifier.return_value = 'old_model'
+        model, _ = self.registry.get('test')
+        self.assertEqual(model, 'old_model')
+
+        self.model_path.write_bytes(b'01')
+        mock_classifier.side_effect = OSError('Truncated file')
+        model, _ = self.registry.get('test')
+        self.assertEqual(model, 'old_model')
+
+    @patch('fruit_classifier.predict.model_registry.load_label_encoder')
+    @patch('fruit_classifier.predict.model_registry.load_classifier')
+    def test_preload(self, mock_classifier, mock_encoder):
+        mock_encoder.return_value = 'encoder'
+        self.registry.preload('test')
+        mock_classifier.assert_not_called()
+
+        _, label_encoder = self.registry.get('test')
+        self.assertEqual(label_encoder, 'encoder')
+        # The model is built from the preloaded bytes
+        self.assertEqual(mock_classifier.call_args[0][3], b'0')
+        mock_encoder.assert_called_once()
+
+    @patch('fruit_classifier.predict.model_registry.load_label_encoder')
+    @patch('fruit_classifier.predict.model_registry.load_classifier')
+    def test_preload_ignores_changed_files(self,
+                                           mock_classifier,
+                                           mock_encoder):
+        self.registry.preload('test')
+
+        self.model_path.write_bytes(b'01')
+        self.registry.get('test')
+
+        self.assertNotIn(b'0', mock_classifier.call_args[0])
+        self.assertEqual(mock_encoder.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
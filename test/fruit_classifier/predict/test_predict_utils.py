@@ -0,0 +1,83 @@
+import csv
+import json
+import shutil
+import unittest
+import numpy as np
+from pathlib import Path
+from sklearn.preprocessing import OneHotEncoder
+from fruit_classifier.predict.predict_utils import format_predictions
+from fruit_classifier.predict.predict_utils import get_input_image_paths
+from fruit_classifier.predict.predict_utils import predict_image_paths
+from test.fruit_classifier.predict.test_batch_predictor import MockModel
+
+
+class TestPredictUtils(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[2]
+        self.raw_dir = test_dir.joinpath('data', 'raw')
+
+        self.predictions = \
+            [dict(image='a.jpg',
+                  label='apples',
+                  probability=0.75,
+                  probabilities=dict(apples=0.75, bananas=0.25)),
+             dict(image='b.jpg',
+                  label='bananas',
+                  probability=0.5,
+                  probabilities=dict(apples=0.5, bananas=0.5))]
+
+    def test_get_input_image_paths(self):
+        image_paths = get_input_image_paths(self.raw_dir)
+        self.assertEqual(len(image_paths), 6)
+
+        image_paths = \
+            get_input_image_paths(str(self.raw_dir.joinpath('**',
+                                                            '*.png')))
+        self.assertEqual([p.name for p in image_paths],
+                         ['1. banana-1.png'])
+
+    def test_predict_image_paths_skips_empty_files(self):
+        tmp_dir = self.raw_dir.parent.joinpath('tmp_predict')
+        self.addCleanup(shutil.rmtree, str(tmp_dir), True)
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        image_path = tmp_dir.joinpath('banana.png')
+        shutil.copy(str(self.raw_dir.joinpath('bananas', '1. banana-1.png')),
+                    str(image_path))
+        empty_path = tmp_dir.joinpath('empty.jpg')
+        empty_path.write_bytes(b'')
+
+        classes = np.array(['apples', 'bananas'])
+        label_encoder = OneHotEncoder()
+        label_encoder.fit(classes.reshape(-1, 1))
+        predictions = list(predict_image_paths([empty_path, image_path],
+                                               MockModel(len(classes)),
+                                               label_encoder))
+
+        self.assertEqual([p['image'] for p in predictions],
+                         [str(image_path)])
+
+    def test_format_predictions_jsonl(self):
+        lines = list(format_predictions(self.predictions, 'jsonl'))
+
+        self.assertEqual(len(lines), len(self.predictions))
+        for line, prediction in zip(lines, self.predictions):
+            self.assertEqual(json.loads(line), prediction)
+
+    def test_format_predictions_csv(self):
+        lines = list(format_predictions(self.predictions, 'csv'))
+        rows = list(csv.reader(lines))
+
+        self.assertEqual(rows[0], ['image', 'label', 'probability',
+                                   'apples', 'bananas'])
+        self.assertEqual(rows[1], ['a.jpg', 'apples', '0.75',
+                                   '0.75', '0.25'])
+        self.assertEqual(len(rows), len(self.predictions) + 1)
+
+    def test_format_predictions_invalid(self):
+        with self.assertRaises(NotImplementedError):
+            list(format_predictions(self.predictions, 'xml'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import shutil
+import numpy as np
+from pathlib import Path
+from fruit_classifier.models.factory import ModelFactory
+from fruit_classifier.predict.predict_utils import classify_many
+from fruit_classifier.predict.tflite_classifier import TFLiteClassifier
+from fruit_classifier.train.export_utils import export_tflite
+
+
+class TestTFLiteClassifier(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[2]
+        self.tmp_dir = test_dir.joinpath('tmp_tflite')
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.model_path = self.tmp_dir.joinpath('model.h5')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_tflite_classifier(self):
+        model = ModelFactory.create_model('leNet',
+                                          dict(width=28,
+                                               height=28,
+                                               channels=3,
+                                               classes=3))
+        model.save(str(self.model_path))
+
+        tflite_path = export_tflite(model, self.model_path)
+        self.assertEqual(tflite_path, self.tmp_dir.joinpath('model.tflite'))
+
+        classifier = TFLiteClassifier(tflite_path)
+        self.assertEqual(tuple(classifier.input_shape[1:]), (28, 28, 3))
+
+        random_state = np.random.RandomState(42)
+        # Resizes the input between calls with different batch sizes
+        for n_images in (1, 5, 2):
+            images = random_state.randint(0,
+                                          256,
+                                          (n_images, 28, 28, 3),
+                                          dtype='uint8')
+            labels, probabilities = classify_many(classifier, images)
+            expected_labels, expected_probabilities = \
+                classify_many(model, images)
+
+            np.testing.assert_allclose(probabilities,
+                                       expected_probabilities,
+                                       atol=1e-5)
+            np.testing.assert_array_equal(labels, expected_labels)
+
+        # The model can also be loaded from the content of the file
+        classifier = TFLiteClassifier(model_content=tflite_path.read_bytes())
+        _, probabilities = classify_many(classifier, images)
+        np.testing.assert_allclose(probabilities,
+                                   expected_probabilities,
+                                   atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import numpy as np
+from scipy import ndimage
+from fruit_classifier.preprocessing.augmentation import BatchAugmenter
+from fruit_classifier.preprocessing.augmentation import \
+    get_transform_matrices
+from fruit_classifier.preprocessing.augmentation import warp_images
+
+
+class TestAugmentation(unittest.TestCase):
+
+    def setUp(self):
+        random_state = np.random.RandomState(0)
+        self.images = random_state.rand(8, 28, 28, 3).astype('float32')
+
+    def test_warp_images_matches_scipy(self):
+        augmenter = BatchAugmenter()
+        transforms = \
+            augmenter.get_random_transforms(len(self.images),
+                                            28,
+                                            28,
+                                            np.random.RandomState(1))
+        matrices = get_transform_matrices(transforms, 28, 28)
+
+        for fill_mode in ('nearest', 'reflect'):
+            warped = warp_images(self.images, matrices, fill_mode)
+            for image, matrix, warped_image in zip(self.images,
+                                                   matrices,
+                                                   warped):
+                for channel in range(image.shape[-1]):
+                    expected = \
+                        ndimage.affine_transform(image[..., channel],
+                                                 matrix[:2, :2],
+                                                 matrix[:2, 2],
+                                                 order=1,
+                                                 mode=fill_mode)
+                    np.testing.assert_allclose(warped_image[..., channel],
+                                               expected,
+                                               atol=1e-5)
+
+    def test_random_transforms_match_image_data_generator(self):
+        from keras.preprocessing.image import ImageDataGenerator
+
+        setup = dict(rotation_range=30,
+                     width_shift_range=0.1,
+                     height_shift_range=0.2,
+                     shear_range=0.2,
+                     zoom_range=0.2,
+                     horizontal_flip=True)
+        n_images = 2000
+        transforms = \
+            BatchAugmenter(**setup).get_random_transforms(
+                n_images, 28, 32, np.random.RandomState(0))
+        image_data_generator = ImageDataGenerator(**setup)
+        keras_transforms = \
+            [image_data_generator.get_random_transform((28, 32, 3), seed)
+             for seed in range(n_images)]
+
+        for key in ('theta', 'tx', 'ty', 'shear', 'zx', 'zy'):
+            values = np.asarray(transforms[key], dtype=float)
+            keras_values = np.array([t[key] for t in keras_transforms],
+                                    dtype=float)
+            # Uniform distributions over the same range
+            scale = keras_values.max() - keras_values.min()
+            for statistic in (np.min, np.max, np.mean, np.std):
+                self.assertAlmostEqual(statistic(values),
+                                       statistic(keras_values),
+                                       delta=0.05 * scale,
+                                       msg=key)
+        self.assertAlmostEqual(np.mean(transforms['flip_horizontal']),
+                               np.mean([t['flip_horizontal']
+                                        for t in keras_transforms]),
+                               delta=0.05)
+
+    def test_identity(self):
+        augmenter = BatchAugmenter(rotation_range=0,
+                                   width_shift_range=0,
+                                   height_shift_range=0,
+                                   shear_range=0,
+                                   zoom_range=0,
+                                   horizontal_flip=False)
+        augmented = augmenter.augment(self.images)
+
+        self.assertEqual(augmented.dtype, np.float32)
+        np.testing.assert_allclose(augmented, self.images, atol=1e-6)
+
+    def test_horizontal_flip(self):
+        augmenter = BatchAugmenter(rotation_range=0,
+                                   width_shift_range=0,
+                                   height_shift_range=0,
+                                   shear_range=0,
+                                   zoom_range=0)
+        transforms = augmenter.get_random_transforms(len(self.images),
+                                                     28,
+                                                     28)
+        transforms['flip_horizontal'][:] = True
+        augmented = augmenter.apply_transforms(self.images, transforms)
+
+        np.testing.assert_allclose(augmented,
+                                   self.images[:, :, ::-1],
+                                   atol=1e-6)
+
+    def test_constant_fill_mode(self):
+        augmenter = BatchAugmenter(rotation_range=0,
+                                   width_shift_range=0,
+                                   height_shift_range=0,
+                                   shear_range=0,
+                                   zoom_range=0,
+                                   horizontal_flip=False,
+                                   fill_mode='constant',
+                                   cval=-1)
+        transforms = augmenter.get_random_transforms(len(self.images),
+                                                     28,
+                                                     28)
+        transforms['tx'][:] = 5
+        augmented = augmenter.apply_transforms(self.images, transforms)
+
+        np.testing.assert_allclose(augmented[:, -5:], -1)
+        np.testing.assert_allclose(augmented[:, :-5],
+                                   self.images[:, 5:],
+                                   atol=1e-6)
+
+    def test_augment_is_reproducible(self):
+        augmenter = BatchAugmenter()
+        augmented = augmenter.augment(self.images,
+                                      np.random.RandomState(42))
+        other_augmented = augmenter.augment(self.images,
+                                            np.random.RandomState(42))
+
+        np.testing.assert_array_equal(augmented, other_augmented)
+        self.assertEqual(augmented.shape, self.images.shape)
+
+    def test_invalid_fill_mode(self):
+        with self.assertRaises(NotImplementedError):
+            BatchAugmenter(fill_mode='mirror')
+
+
+if __name__ == '__main__':
+    unittest.main()
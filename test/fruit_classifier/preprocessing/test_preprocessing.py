@@ -6,6 +6,13 @@ import shutil
 from fruit_classifier.utils.file_utils import truncate_filenames
 from fruit_classifier.preprocessing.preprocessing_utils \
     import resize_image
+from fruit_classifier.preprocessing.preprocessing_utils \
+    import copy_valid_images
+from fruit_classifier.preprocessing.preprocessing_utils \
+    import resize_images
+from fruit_classifier.preprocessing.preprocessing_utils \
+    import process_images
+from fruit_classifier.utils.image_utils import get_image_paths
 
 
 class TestPreprocessingUtils(unittest.TestCase):
@@ -88,8 +95,137 @@ class TestPreprocessingUtils(unittest.TestCase):
         for filepath in file_list:
             self.assertLessEqual(len(str(filepath)), 255)
 
+    def make_raw_dir(self):
+        """
+        Makes a raw dataset with three valid and one broken image per
+        class
 
-if __name__ == '__main__':
-    unittest.main()
+        Returns
+        -------
+        raw_dir : Path
+            Path to the raw dataset
+        """
+        raw_dir = self.tmp_dir_path.joinpath('raw')
+
+        for c in ('class_a', 'class_b'):
+            class_dir = raw_dir.joinpath(c)
+            class_dir.mkdir(parents=True, exist_ok=True)
+            for i in range(3):
+                shutil.copy(str(self.jpg_image_file_name),
+                            str(class_dir.joinpath(f'{i}.jpg')))
+            class_dir.joinpath('broken.jpg').write_bytes(b'not an image')
+
+        return raw_dir
+
+    def test_copy_and_resize_images_in_parallel(self):
+        raw_dir = self.make_raw_dir()
+        interim_dir = self.tmp_dir_path.joinpath('interim')
+
+        copy_valid_images(raw_dir, interim_dir, n_workers=2, chunk_size=1)
+        image_paths = get_image_paths(interim_dir)
+        self.assertEqual(len(image_paths), 6)
+        self.assertNotIn('broken.jpg', [p.name for p in image_paths])
+
+        resize_images(interim_dir, 27, 29, n_workers=2, chunk_size=2)
+        for image_path in get_image_paths(interim_dir):
+            image = cv2.imread(str(image_path))
+            self.assertEqual(image.shape, tuple(self.test_comp_shape))
+
+    def test_process_images(self):
+        raw_dir = self.make_raw_dir()
+        interim_dir = self.tmp_dir_path.joinpath('interim')
+        reference_dir = self.tmp_dir_path.joinpath('reference')
+
+        manifest = process_images(raw_dir,
+                                  interim_dir,
+                                  27,
+                                  29,
+                                  n_workers=2,
+                                  chunk_size=1)
+        self.assertEqual(sum(entry['output'] is None
+                             for entry in manifest.values()), 2)
+
+        # The result must equal copying, cleaning and resizing
+        copy_valid_images(raw_dir, reference_dir, n_workers=1)
+        resize_images(reference_dir, 27, 29, n_workers=1)
+
+        image_paths = get_image_paths(interim_dir)
+        reference_paths = get_image_paths(reference_dir)
+        self.assertEqual(len(image_paths), 6)
+        self.assertEqual([p.relative_to(interim_dir)
+                          for p in image_paths],
+                         [p.relative_to(reference_dir)
+                          for p in reference_paths])
+        for image_path, reference_path in zip(image_paths,
+                                              reference_paths):
+            np.testing.assert_array_equal(
+                cv2.imread(str(image_path)),
+                cv2.imread(str(reference_path)))
+
+    def test_process_images_skips_empty_files(self):
+        raw_dir = self.make_raw_dir()
+        empty_path = raw_dir.joinpath('class_a', 'empty.jpg')
+        empty_path.write_bytes(b'')
+
+        for n_workers in (1, 2):
+            interim_dir = self.tmp_dir_path.joinpath(f'interim_{n_workers}')
+            manifest = process_images(raw_dir,
+                                      interim_dir,
+                                      n_workers=n_workers,
+                                      chunk_size=1)
+
+            self.assertIsNone(manifest['class_a/empty.jpg']['output'])
+            image_paths = get_image_paths(interim_dir)
+            self.assertEqual(len(image_paths), 6)
+            self.assertNotIn('empty.jpg', [p.name for p in image_paths])
+
+    def test_process_images_incrementally(self):
+        raw_dir = self.make_raw_dir()
+        interim_dir = self.tmp_dir_path.joinpath('interim')
+        manifest_path = self.tmp_dir_path.joinpath('manifest.json')
+
+        manifest = process_images(raw_dir,
+                                  interim_dir,
+                                  n_workers=1,
+                                  manifest_path=manifest_path)
+        self.assertTrue(manifest_path.is_file())
+        self.assertEqual(len(get_image_paths(interim_dir)), 6)
+
+        # Add one, remove one and keep the rest of the images
+        shutil.copy(str(self.jpg_image_file_name),
+                    str(raw_dir.joinpath('class_a', 'new.jpg')))
+        raw_dir.joinpath('class_b', '0.jpg').unlink()
+        removed_output = \
+            interim_dir.joinpath(manifest['class_b/0.jpg']['output'])
+        unchanged_output = \
+            interim_dir.joinpath(manifest['class_a/1.jpg']['output'])
+        unchanged_mtime = unchanged_output.stat().st_mtime_ns
+
+        manifest = process_images(raw_dir,
+                                  interim_dir,
+                                  n_workers=1,
+                                  manifest_path=manifest_path)
+
+        self.assertIn('class_a/new.jpg', manifest)
+        self.assertNotIn('class_b/0.jpg', manifest)
+        self.assertFalse(removed_output.is_file())
+        self.assertEqual(unchanged_output.stat().st_mtime_ns,
+                         unchanged_mtime)
+        self.assertEqual(len(get_image_paths(interim_dir)), 6)
+
+        # A different target size reprocesses all the images
+        manifest = process_images(raw_dir,
+                                  interim_dir,
+                                  27,
+                                  29,
+                                  n_workers=1,
+                                  manifest_path=manifest_path)
+        for entry in manifest.values():
+            self.assertEqual((entry['height'], entry['width']), (27, 29))
+        for image_path in get_image_paths(interim_dir):
+            image = cv2.imread(str(image_path))
+            self.assertEqual(image.shape, tuple(self.test_comp_shape))
 
 
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import shutil
+import numpy as np
+from pathlib import Path
+from fruit_classifier.models.factory import ModelFactory
+from fruit_classifier.predict.predict_utils import classify_many
+from fruit_classifier.predict.tflite_classifier import TFLiteClassifier
+from fruit_classifier.quantize.quantize_utils import get_calibration_data
+from fruit_classifier.quantize.quantize_utils import quantize_model
+
+
+class TestQuantizeUtils(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[2]
+        self.tmp_dir = test_dir.joinpath('tmp_quantize')
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.model_path = self.tmp_dir.joinpath('model.h5')
+
+        self.model = ModelFactory.create_model('leNet',
+                                               dict(width=28,
+                                                    height=28,
+                                                    channels=3,
+                                                    classes=3))
+        self.model.save(str(self.model_path))
+
+        random_state = np.random.RandomState(42)
+        self.images = random_state.randint(0,
+                                           256,
+                                           (20, 28, 28, 3),
+                                           dtype='uint8')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_calibration_data(self):
+        calibration_data = get_calibration_data(self.images, 8)
+        self.assertEqual(calibration_data.shape, (8, 28, 28, 3))
+        self.assertEqual(calibration_data.dtype, np.float32)
+        self.assertLessEqual(calibration_data.max(), 1.0)
+
+        # At most all the images
+        calibration_data = get_calibration_data(self.images, 100)
+        self.assertEqual(len(calibration_data), 20)
+
+    def test_quantize_model(self):
+        calibration_data = get_calibration_data(self.images, 10)
+        _, expected_probabilities = classify_many(self.model, self.images)
+
+        for mode in ('int8', 'float16'):
+            quantized_path = quantize_model(self.model,
+                                            self.model_path,
+                                            mode,
+                                            calibration_data)
+            self.assertEqual(quantized_path.name, f'model_{mode}.tflite')
+            self.assertLess(quantized_path.stat().st_size,
+                            self.model_path.stat().st_size)
+
+            # The quantized model takes and returns floats
+            quantized_model = TFLiteClassifier(quantized_path)
+            _, probabilities = classify_many(quantized_model, self.images)
+            np.testing.assert_allclose(probabilities,
+                                       expected_probabilities,
+                                       atol=0.05)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(NotImplementedError):
+            quantize_model(self.model, self.model_path, 'int4')
+        with self.assertRaises(ValueError):
+            quantize_model(self.model, self.model_path, 'int8')
+
+
+if __name__ == '__main__':
+    unittest.main()
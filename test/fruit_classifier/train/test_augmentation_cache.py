@@ -0,0 +1,131 @@
+import os
+import unittest
+import shutil
+import numpy as np
+from pathlib import Path
+from unittest.mock import patch
+from fruit_classifier.train import augmentation_cache
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    get_batch_augmenter
+from fruit_classifier.train.augmentation_cache import \
+    get_augmentation_cache
+from fruit_classifier.train.augmentation_cache import get_cache_key
+from fruit_classifier.train.sequences import CachedBatchSequence
+
+
+class TestAugmentationCache(unittest.TestCase):
+
+    def setUp(self):
+        test_dir = Path(__file__).absolute().parents[2]
+        self.cache_dir = test_dir.joinpath('tmp_augmentation_cache')
+
+        random_state = np.random.RandomState(0)
+        self.x = random_state.randint(0, 256, (10, 8, 8, 3)).\
+            astype('uint8')
+        self.y = np.eye(2)[np.arange(len(self.x)) % 2]
+        self.batch_augmenter = get_batch_augmenter()
+
+    def tearDown(self):
+        if self.cache_dir.is_dir():
+            shutil.rmtree(self.cache_dir)
+
+    def test_get_cache_key(self):
+        key = get_cache_key(self.x, self.batch_augmenter, 2)
+        self.assertEqual(key,
+                         get_cache_key(self.x.copy(),
+                                       get_batch_augmenter(),
+                                       2))
+        self.assertNotEqual(key,
+                            get_cache_key(self.x,
+                                          self.batch_augmenter,
+                                          2,
+                                          seed=1))
+        self.assertNotEqual(key,
+                            get_cache_key(self.x,
+                                          get_batch_augmenter(
+                                              rotation_range=10),
+                                          2))
+        self.assertNotEqual(key,
+                            get_cache_key(self.x[::-1],
+                                          self.batch_augmenter,
+                                          2))
+        self.assertNotEqual(key,
+                            get_cache_key(self.x,
+                                          self.batch_augmenter,
+                                          2,
+                                          chunk_size=4))
+
+    def test_get_augmentation_cache(self):
+        cache = get_augmentation_cache(self.x,
+                                       self.batch_augmenter,
+                                       self.cache_dir,
+                                       n_epochs=2,
+                                       chunk_size=4)
+        self.assertEqual(cache.shape, (2, *self.x.shape))
+        self.assertEqual(cache.dtype, np.uint8)
+        self.assertFalse(np.array_equal(cache[0], cache[1]))
+
+        # The second call reads the stored cache
+        cache_paths = list(self.cache_dir.glob('*.npy'))
+        self.assertEqual(len(cache_paths), 1)
+        mtime = cache_paths[0].stat().st_mtime_ns
+        cached = get_augmentation_cache(self.x,
+                                        self.batch_augmenter,
+                                        self.cache_dir,
+                                        n_epochs=2,
+                                        chunk_size=4)
+        np.testing.assert_array_equal(cache, cached)
+        self.assertEqual(cache_paths[0].stat().st_mtime_ns, mtime)
+
+    def test_concurrent_builds(self):
+        key = get_cache_key(self.x, self.batch_augmenter, 2, chunk_size=4)
+        cache_path = self.cache_dir.joinpath(f'{key}.npy')
+        build = augmentation_cache.build_augmentation_cache
+        tmp_paths = list()
+
+        def build_while_another_finishes(x, batch_augmenter, tmp_path,
+                                         *args):
+            build(x, batch_augmenter, tmp_path, *args)
+            tmp_paths.append(tmp_path)
+            # Another process stores the same cache in the meantime
+            np.save(str(cache_path),
+                    np.zeros((2, *self.x.shape), dtype='uint8'))
+
+        with patch.object(augmentation_cache,
+                          'build_augmentation_cache',
+                          build_while_another_finishes):
+            cache = get_augmentation_cache(self.x,
+                                           self.batch_augmenter,
+                                           self.cache_dir,
+                                           n_epochs=2,
+                                           chunk_size=4)
+
+        # Each process builds in its own temporary file, which is
+        # removed as the finished cache of the other process is kept
+        self.assertEqual(tmp_paths[0].name,
+                         f'{key}.{os.getpid()}.tmp.npy')
+        self.assertFalse(tmp_paths[0].exists())
+        np.testing.assert_array_equal(cache, 0)
+
+    def test_cached_batch_sequence(self):
+        cache = get_augmentation_cache(self.x,
+                                       self.batch_augmenter,
+                                       self.cache_dir,
+                                       n_epochs=2)
+        sequence = CachedBatchSequence(cache,
+                                       self.y,
+                                       batch_size=4,
+                                       shuffle=False)
+
+        for epoch in range(3):
+            x_batch, y_batch = sequence[0]
+            self.assertEqual(x_batch.dtype, np.float32)
+            np.testing.assert_allclose(x_batch,
+                                       cache[epoch % 2, :4] / 255,
+                                       rtol=1e-6)
+            np.testing.assert_array_equal(y_batch, self.y[:4])
+            sequence.on_epoch_end()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import time
+import unittest
+from fruit_classifier.train.callbacks import ThroughputMonitor
+from fruit_classifier.train.callbacks import TimingCallback
+
+
+class TestCallbacks(unittest.TestCase):
+
+    def test_timing_callback(self):
+        callback = TimingCallback(batch_size=8)
+
+        callback.on_epoch_begin(0)
+        time.sleep(0.02)
+        callback.on_batch_begin(0)
+        time.sleep(0.01)
+        callback.on_batch_end(0, dict())
+
+        self.assertGreaterEqual(callback.data_wait, 0.02)
+        self.assertGreaterEqual(callback.step_time, 0.01)
+        self.assertLess(callback.step_time, callback.data_wait)
+        self.assertEqual(callback.samples, 8)
+
+        # The size in the logs takes precedence
+        callback.on_batch_begin(1)
+        callback.on_batch_end(1, dict(size=3))
+        self.assertEqual(callback.samples, 3)
+        self.assertEqual(callback.epoch_samples, 11)
+        self.assertEqual(callback.epoch_batches, 2)
+        self.assertGreaterEqual(callback.get_epoch_time(), 0.03)
+
+        # Reset at each epoch
+        callback.on_epoch_begin(1)
+        self.assertEqual(callback.epoch_samples, 0)
+        self.assertEqual(callback.epoch_batches, 0)
+
+    def test_throughput_monitor(self):
+        monitor = ThroughputMonitor(batch_size=4)
+
+        for epoch in range(2):
+            monitor.on_epoch_begin(epoch)
+            for batch in range(2):
+                time.sleep(0.01)
+                monitor.on_batch_begin(batch)
+                time.sleep(0.01)
+                monitor.on_batch_end(batch, dict())
+            monitor.on_epoch_end(epoch, dict())
+
+        self.assertEqual(len(monitor.records), 2)
+        record = monitor.records[-1]
+        self.assertEqual(record['epoch'], 2)
+        self.assertGreaterEqual(record['data_wait'], 0.02)
+        self.assertGreaterEqual(record['compute'], 0.02)
+        self.assertGreaterEqual(record['epoch_time'],
+                                record['data_wait'] + record['compute'])
+        self.assertGreater(record['data_wait_fraction'], 0)
+        self.assertLess(record['data_wait_fraction'], 1)
+        self.assertAlmostEqual(record['samples_per_sec'],
+                               8 / (record['data_wait'] +
+                                    record['compute']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import pickle
+import unittest
+import shutil
+import cv2
+import numpy as np
+from pathlib import Path
+from fruit_classifier.train.sequences import ArrayBatchSequence
+from fruit_classifier.train.sequences import DirectoryBatchSequence
+from fruit_classifier.train.sequences import get_batch_sequence
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    get_batch_augmenter
+from fruit_classifier.preprocessing.preprocessing_utils import \
+    get_image_generator
+
+
+class TestSequences(unittest.TestCase):
+
+    def setUp(self):
+        self.n_images = 10
+        self.x = np.arange(self.n_images, dtype='uint8').\
+            reshape(-1, 1, 1, 1) * np.ones((1, 4, 4, 3), dtype='uint8')
+        self.y = np.eye(2)[np.arange(self.n_images) % 2]
+
+        test_dir = Path(__file__).absolute().parents[2]
+        self.tmp_dir = test_dir.joinpath('tmp_sequences')
+
+    def tearDown(self):
+        if self.tmp_dir.is_dir():
+            shutil.rmtree(self.tmp_dir)
+
+    def test_array_batch_sequence(self):
+        sequence = ArrayBatchSequence(self.x, self.y, batch_size=4)
+        self.assertEqual(len(sequence), 3)
+
+        for epoch in range(2):
+            seen = list()
+            for index in range(len(sequence)):
+                x_batch, y_batch = sequence[index]
+                self.assertEqual(x_batch.dtype, np.float32)
+                self.assertLessEqual(x_batch.max(), 1.0)
+                self.assertEqual(len(x_batch), len(y_batch))
+                # Each image belongs to the corresponding label
+                pixels = np.round(x_batch[:, 0, 0, 0] * 255).astype(int)
+                np.testing.assert_array_equal(y_batch,
+                                              np.eye(2)[pixels % 2])
+                seen.extend(pixels)
+            self.assertEqual(sorted(seen), list(range(self.n_images)))
+            sequence.on_epoch_end()
+
+    def test_shuffle_is_deterministic(self):
+        sequences = [ArrayBatchSequence(self.x, self.y, seed=1)
+                     for _ in range(2)]
+        for sequence in sequences:
+            sequence.on_epoch_end()
+        np.testing.assert_array_equal(sequences[0].indices,
+                                      sequences[1].indices)
+
+        unshuffled = ArrayBatchSequence(self.x, self.y, shuffle=False)
+        np.testing.assert_array_equal(unshuffled.indices,
+                                      np.arange(self.n_images))
+
+    def test_augmentation(self):
+        for image_generator in (get_image_generator(),
+                                get_batch_augmenter()):
+            sequence = ArrayBatchSequence(self.x,
+                                          self.y,
+                                          batch_size=4,
+                                          image_generator=image_generator)
+            x_batch, _ = sequence[0]
+            self.assertEqual(x_batch.shape, (4, 4, 4, 3))
+            self.assertEqual(x_batch.dtype, np.float32)
+
+    def test_augmentation_is_deterministic(self):
+        # Constant images are not changed by the augmentation
+        x = np.random.RandomState(0).randint(0, 256, (10, 8, 8, 3))
+        for image_generator in (get_image_generator(),
+                                get_batch_augmenter()):
+            sequence = ArrayBatchSequence(x.astype('uint8'),
+                                          self.y,
+                                          batch_size=4,
+                                          image_generator=image_generator)
+            # A copy as sent to a worker process
+            worker_sequence = pickle.loads(pickle.dumps(sequence))
+
+            # The batches are independent of the order they are made in
+            x_batches = [sequence[index][0]
+                         for index in range(len(sequence))]
+            for index in reversed(range(len(sequence))):
+                np.testing.assert_array_equal(
+                    worker_sequence[index][0], x_batches[index])
+
+            # The augmentation changes between the epochs
+            sequence.on_epoch_end()
+            sequence.indices = worker_sequence.indices
+            self.assertFalse(np.array_equal(sequence[0][0],
+                                            x_batches[0]))
+
+    def test_directory_batch_sequence(self):
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        image_paths = list()
+        for i, image in enumerate(self.x):
+            image_path = self.tmp_dir.joinpath(f'{i}.png')
+            cv2.imwrite(str(image_path), image)
+            image_paths.append(image_path)
+
+        sequence = get_batch_sequence(np.array(image_paths, dtype=object),
+                                      self.y,
+                                      batch_size=4,
+                                      shuffle=False)
+        self.assertIsInstance(sequence, DirectoryBatchSequence)
+        array_sequence = get_batch_sequence(self.x,
+                                            self.y,
+                                            batch_size=4,
+                                            shuffle=False)
+        self.assertIsInstance(array_sequence, ArrayBatchSequence)
+
+        for index in range(len(sequence)):
+            x_batch, y_batch = sequence[index]
+            x_array_batch, y_array_batch = array_sequence[index]
+            np.testing.assert_array_equal(x_batch, x_array_batch)
+            np.testing.assert_array_equal(y_batch, y_array_batch)
+
+
+if __name__ == '__main__':
+    unittest.main()
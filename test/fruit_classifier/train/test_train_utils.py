@@ -1,3 +1,4 @@
+import json
 import unittest
 from fruit_classifier.utils.image_utils import get_image_paths
 from fruit_classifier.train.train_utils import get_data_and_labels
@@ -5,12 +6,20 @@ from fruit_classifier.train.train_utils import get_data_split
 from fruit_classifier.train.train_utils import get_model
 from fruit_classifier.train.train_utils import encode_labels
 from fruit_classifier.train.train_utils import train_model
+from fruit_classifier.train.train_utils import plot_throughput
 from fruit_classifier.train.train_utils import plot_training
+from fruit_classifier.train.train_utils import get_directory_data
+from fruit_classifier.train.train_utils import get_fingerprint
+from fruit_classifier.train.train_utils import get_processed_data
+from fruit_classifier.train.train_utils import is_data_sets_stored
+from fruit_classifier.train.train_utils import load_data_sets
+from fruit_classifier.train.train_utils import store_data_sets
 from fruit_classifier.preprocessing.preprocessing_utils import \
     get_image_generator
 from fruit_classifier.preprocessing.preprocessing_utils import \
     resize_images
 from pathlib import Path
+import numpy as np
 import shutil
 
 
@@ -58,6 +67,7 @@ class TestTrainUtils(unittest.TestCase):
             get_data_and_labels(self.image_paths)
         self.assertGreater(len(data), 0)
         self.assertGreater(len(labels), 0)
+        self.assertEqual(data.dtype, np.uint8)
 
     def test_get_model_input(self):
         # Run get_data_split and verify outputs
@@ -70,6 +80,85 @@ class TestTrainUtils(unittest.TestCase):
         self.assertEqual(1, len(y_train))
         self.assertEqual(1, len(y_val))
 
+    def test_store_and_load_data_sets(self):
+        data_sets = [np.full((i + 1, 2, 2, 3), i, dtype='uint8')
+                     for i in range(3)]
+        data_sets += [np.eye(2)[:i + 1] for i in range(3)]
+        store_data_sets(*data_sets,
+                        self.processed_dir,
+                        classes=['class_a', 'class_b'],
+                        fingerprint='abc')
+
+        self.assertTrue(is_data_sets_stored(self.processed_dir, 'abc'))
+        self.assertFalse(is_data_sets_stored(self.processed_dir, 'def'))
+
+        loaded_data_sets = load_data_sets(self.processed_dir)
+        for data_set, loaded_data_set in zip(data_sets,
+                                             loaded_data_sets):
+            self.assertIsInstance(loaded_data_set, np.memmap)
+            self.assertEqual(data_set.dtype, loaded_data_set.dtype)
+            np.testing.assert_array_equal(data_set, loaded_data_set)
+
+    def add_images(self):
+        """
+        Adds copies of the images so there are enough for the splits
+
+        Returns
+        -------
+        image_paths : list
+            The paths of all the images
+        """
+        for image_path in self.image_paths:
+            for i in range(3):
+                shutil.copy(str(image_path),
+                            str(image_path.with_name(f'{i}.jpg')))
+
+        return get_image_paths(self.tmp_dir)
+
+    def test_get_directory_data(self):
+        image_paths = self.add_images()
+        resize_images(self.tmp_dir)
+        image_paths = get_image_paths(self.tmp_dir)
+
+        directory_data = get_directory_data(image_paths,
+                                            self.model_files_dir,
+                                            'test')
+        processed_data = get_processed_data(image_paths,
+                                            self.model_files_dir,
+                                            'test',
+                                            self.processed_dir)
+
+        x_train_paths, x_val_paths, x_test, *labels = directory_data
+        x_train, x_val, processed_x_test, *processed_labels = \
+            processed_data
+        self.assertEqual(len(x_train_paths), len(x_train))
+        self.assertEqual(len(x_val_paths), len(x_val))
+        np.testing.assert_array_equal(x_test, processed_x_test)
+        for y, processed_y in zip(labels, processed_labels):
+            np.testing.assert_array_equal(y, processed_y)
+
+    def test_get_processed_data(self):
+        image_paths = self.add_images()
+
+        fingerprint = get_fingerprint(image_paths)
+        data_sets = get_processed_data(image_paths,
+                                       self.model_files_dir,
+                                       'test',
+                                       self.processed_dir)
+        self.assertTrue(is_data_sets_stored(self.processed_dir,
+                                            fingerprint))
+
+        # A new model reuses the data sets and gets its own encoder
+        cached_data_sets = get_processed_data(image_paths,
+                                              self.model_files_dir,
+                                              'other_test',
+                                              self.processed_dir)
+        self.assertTrue(self.model_files_dir.joinpath(
+            'encoders', 'other_test', 'encoder.pkl').is_file())
+        for data_set, cached_data_set in zip(data_sets,
+                                             cached_data_sets):
+            np.testing.assert_array_equal(data_set, cached_data_set)
+
     def test_get_image_generator(self):
         # Run get_image_generator and verify outputs
         rotation_range = 30
@@ -147,6 +236,22 @@ class TestTrainUtils(unittest.TestCase):
                                val_accuracy=(1, 2),)
         plot_training(history, self.plot_dir)
 
+    def test_plot_throughput(self):
+        records = [dict(epoch=epoch,
+                        epoch_time=3.0,
+                        data_wait=1.0,
+                        compute=1.5,
+                        other=0.5,
+                        data_wait_fraction=0.4,
+                        samples_per_sec=40.0,
+                        peak_rss_mb=100.0)
+                   for epoch in (1, 2)]
+        report_path, plot_path = plot_throughput(records, self.plot_dir)
+
+        self.assertTrue(plot_path.is_file())
+        with report_path.open('r') as f:
+            self.assertEqual(json.load(f), records)
+
     def tearDown(self):
         # Delete the temporary directory its contents
         shutil.rmtree(self.tmp_dir)
@@ -2,6 +2,7 @@ import unittest
 from pathlib import Path
 import numpy as np
 
+from fruit_classifier.utils.image_utils import decode_image
 from fruit_classifier.utils.image_utils import open_image
 
 
@@ -26,6 +27,15 @@ class TestImageUtils(unittest.TestCase):
         self.open_image_function(self.jpg_image_file_name)
         self.open_image_function(self.png_image_file_name)
 
+    def test_decode_image(self):
+        for file in (self.jpg_image_file_name,
+                     self.png_image_file_name):
+            image = decode_image(file.read_bytes())
+            np.testing.assert_array_equal(image, open_image(file))
+
+        self.assertIsNone(decode_image(b'not an image'))
+        self.assertIsNone(decode_image(b''))
+
     def open_image_function(self, file):
         image = open_image(file)
 
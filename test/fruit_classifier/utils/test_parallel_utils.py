@@ -0,0 +1,26 @@
+import unittest
+from fruit_classifier.utils.parallel_utils import get_n_workers
+from fruit_classifier.utils.parallel_utils import parallel_map
+
+
+class TestParallelUtils(unittest.TestCase):
+
+    def test_get_n_workers(self):
+        self.assertEqual(get_n_workers(3), 3)
+        self.assertGreaterEqual(get_n_workers(None), 1)
+        self.assertGreaterEqual(get_n_workers(0), 1)
+
+    def test_parallel_map(self):
+        items = list(range(-50, 50))
+        expected = [abs(item) for item in items]
+
+        for n_workers in (1, 2):
+            results = parallel_map(abs,
+                                   items,
+                                   n_workers=n_workers,
+                                   chunk_size=7)
+            self.assertEqual(results, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
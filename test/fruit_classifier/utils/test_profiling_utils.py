@@ -0,0 +1,88 @@
+import unittest
+from fruit_classifier.utils.profiling_utils import LatencyHistogram
+from fruit_classifier.utils.profiling_utils import Profiler
+
+
+class TestProfilingUtils(unittest.TestCase):
+
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram(buckets=(0.01, 0.1, 1.0))
+        for seconds in (0.005, 0.05, 0.05, 0.5, 5.0):
+            histogram.observe(seconds)
+
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 5.605)
+        self.assertEqual(histogram.get_cumulative_counts(), [1, 3, 4])
+        quantiles = histogram.get_quantiles((0.0, 0.5, 1.0))
+        self.assertEqual(quantiles, {0.0: 0.005, 0.5: 0.05, 1.0: 5.0})
+
+    def test_empty_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.get_quantiles((0.5,)), {0.5: None})
+
+    def test_profiler(self):
+        profiler = Profiler(enabled=False)
+        with profiler.stage('decode'):
+            pass
+        self.assertEqual(profiler.get_summary(), dict())
+
+        profiler.enabled = True
+        for _ in range(3):
+            with profiler.stage('decode'):
+                pass
+        with profiler.stage('resize'):
+            pass
+
+        summary = profiler.get_summary()
+        self.assertEqual(set(summary), {'decode', 'resize'})
+        self.assertEqual(summary['decode']['count'], 3)
+        self.assertLessEqual(summary['decode']['p50'],
+                             summary['decode']['p99'])
+
+        # Failing stages are timed as well
+        with self.assertRaises(ValueError):
+            with profiler.stage('classify'):
+                raise ValueError
+        self.assertEqual(profiler.get_summary()['classify']['count'], 1)
+
+        profiler.reset()
+        self.assertEqual(profiler.get_summary(), dict())
+
+    def test_to_prometheus(self):
+        profiler = Profiler(enabled=True)
+        profiler.get_histogram('decode').observe(0.002)
+
+        name = 'fruit_classifier_stage_latency_seconds'
+        lines = profiler.to_prometheus().splitlines()
+
+        self.assertIn(f'# TYPE {name} histogram', lines)
+        self.assertIn(f'{name}_bucket{{stage="decode",le="0.001"}} 0',
+                      lines)
+        self.assertIn(f'{name}_bucket{{stage="decode",le="0.0025"}} 1',
+                      lines)
+        self.assertIn(f'{name}_bucket{{stage="decode",le="+Inf"}} 1', lines)
+        self.assertIn(f'{name}_count{{stage="decode"}} 1', lines)
+        self.assertIn(f'# TYPE {name}_quantiles summary', lines)
+        self.assertIn(f'{name}_quantiles{{stage="decode",quantile="0.99"}} '
+                      f'0.002',
+                      lines)
+
+    def test_to_prometheus_with_labels(self):
+        profiler = Profiler(enabled=True)
+        profiler.get_histogram('decode').observe(0.002)
+
+        name = 'fruit_classifier_stage_latency_seconds'
+        lines = profiler.to_prometheus(labels=dict(worker=42)).splitlines()
+
+        self.assertIn(f'{name}_bucket{{worker="42",stage="decode",'
+                      f'le="+Inf"}} 1',
+                      lines)
+        self.assertIn(f'{name}_count{{worker="42",stage="decode"}} 1',
+                      lines)
+        self.assertIn(f'{name}_quantiles{{worker="42",stage="decode",'
+                      f'quantile="0.99"}} 0.002',
+                      lines)
+
+
+if __name__ == '__main__':
+    unittest.main()